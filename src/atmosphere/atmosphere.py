@@ -2,6 +2,9 @@
 
 import numpy as np
 import os as os
+import bisect as bisect
+import database_cache.database_cache as database_cache
+import shared_table.shared_table as shared_table
 
 # 単位変換
 # ’read_atmosphere_file’でKey errorがあったときは下記の単位変換が正しいかチェックする
@@ -11,6 +14,9 @@ unit_convert ={'km':1.0, 'cm-3':1.e6, 'g/cm-3': 1.e3, 'K': 1.0}
 KEY_DATA   = 'Number_Data'
 KEY_ATM    = 'Number_Atmosphere'
 KEY_KN     = 'Knudsen_number'
+KEY_INTERP = 'Interpolator'
+KEY_COEFFICIENT = 'Spline_coefficient'
+KEY_PROFILE     = 'Solar_activity'
 
 KEY_Height = 'Height'
 KEY_N2     = 'N2'
@@ -26,14 +32,137 @@ DICT_DIAMETER_MOLECULAR = {KEY_N2: 3.75e-10, KEY_O2: 3.54e-10, KEY_N: 3.10e-10,
 
 def initial_settings_atmosphere(config):
 
-  atmosphere_dict = read_atmosphere_file(config)
+  # Table published by the Monte-Carlo driver (read-only views shared by the case processes): no parse and no spline
+  atmosphere_dict = shared_table.attach_table('atmosphere', get_key_shared(config))
+  if atmosphere_dict is not None :
+    coefficient     = atmosphere_dict.pop(KEY_COEFFICIENT)
+    atmosphere_dict = set_interpolator(config, atmosphere_dict, coefficient)
+    return atmosphere_dict
+
+  # Single profile (filename_atmosphere), or profiles of several solar activity levels (profile_list)
+  profile_list = get_profile_list(config)
+  if len(profile_list) == 0 :
+    atmosphere_dict = get_atmosphere_table(config, get_filename_atmosphere(config))
+  else :
+    atmosphere_dict = get_atmosphere_profile(config, profile_list)
 
-  atmosphere_dict = set_knudsen_number(config, atmosphere_dict)
+  atmosphere_dict = set_interpolator(config, atmosphere_dict)
 
   return atmosphere_dict 
 
 
-def read_atmosphere_file(config):
+def get_atmosphere_table(config, filename_atmosphere):
+
+  # Parsed table and Knudsen number are read from the binary cache (cache: flag_cache) while the source file
+  # and characteristic_length are unchanged
+  filename_cache  = database_cache.get_filename_cache(config, 'atmosphere', filename_atmosphere, [config['satellite']['characteristic_length']])
+  atmosphere_dict = database_cache.read_cache(filename_cache)
+
+  if atmosphere_dict is None :
+    atmosphere_dict = read_atmosphere_file(config, filename_atmosphere)
+
+    atmosphere_dict = set_knudsen_number(config, atmosphere_dict)
+
+    database_cache.write_cache(filename_cache, atmosphere_dict)
+
+  return atmosphere_dict
+
+
+def get_profile_list(config):
+
+  # [solar activity, filename] of the profiles in ascending order of solar activity (empty for a single profile)
+  profile_list = config['atmosphere'].get('profile_list', None) or []
+
+  return sorted( [ [float(profile[0]), str(profile[1])] for profile in profile_list ], key=lambda profile: profile[0] )
+
+
+def get_atmosphere_profile(config, profile_list):
+
+  # Profiles on the same altitude grid are stacked: Height (number_data), others (number_profile, number_data)
+  print('Reading atmosphere profiles...: ', len(profile_list), 'profiles')
+
+  directory_path = get_directory_atmosphere(config)
+  dict_list = []
+  for profile in profile_list:
+    print('--Solar activity:', profile[0])
+    dict_list.append( get_atmosphere_table(config, directory_path + '/' + profile[1]) )
+
+  solar_activity = np.array( [ profile[0] for profile in profile_list ] )
+  if len(profile_list) < 2 or np.any( np.diff(solar_activity) <= 0.0 ) :
+    print('Solar activity in profile_list of atmosphere must be different in two or more profiles.')
+    print('Program stopped.')
+    exit()
+
+  atmosphere_dict = {KEY_DATA: dict_list[0][KEY_DATA], KEY_ATM: dict_list[0][KEY_ATM], KEY_PROFILE: solar_activity}
+  for key in dict_list[0]:
+    if not isinstance(dict_list[0][key], np.ndarray) :
+      continue
+    for n in range(0, len(dict_list)):
+      if key not in dict_list[n] or dict_list[n][key].shape != dict_list[0][key].shape :
+        print('Variable', key, 'is not the same in the atmosphere profiles:', profile_list[n][1])
+        print('Program stopped.')
+        exit()
+    if key == KEY_Height :
+      for n in range(0, len(dict_list)):
+        if not np.array_equal(dict_list[n][key], dict_list[0][key]) :
+          print('Altitude grid is not the same in the atmosphere profiles:', profile_list[n][1])
+          print('Program stopped.')
+          exit()
+      atmosphere_dict[key] = np.array(dict_list[0][key])
+    else :
+      atmosphere_dict[key] = np.array( [ dict_list[n][key] for n in range(0, len(dict_list)) ] )
+
+  return atmosphere_dict
+
+
+def get_solar_activity(config):
+
+  # Solar activity of the case (list as density_factor, so that it can be dispersed by Monte-Carlo simulation)
+  solar_activity = config['atmosphere'].get('solar_activity', None)
+  if solar_activity is None :
+    print('solar_activity in atmosphere is necessary for profile_list.')
+    print('Program stopped.')
+    exit()
+  if isinstance(solar_activity, list) :
+    solar_activity = solar_activity[0]
+
+  return float(solar_activity)
+
+
+def get_interpolator(config, atmosphere_dict):
+
+  # Interpolator in altitude of the case
+  # --Multi-profile atmosphere: profile at the solar activity of the case (coefficients are blended once here)
+  interpolator = atmosphere_dict[KEY_INTERP]
+  if isinstance(interpolator, atmosphere_interpolator_profile) :
+    interpolator = interpolator.get_interpolator( get_solar_activity(config) )
+
+  return interpolator
+
+
+def get_key_shared(config):
+
+  # Parameters of the table to be checked by the case processes
+  profile_list = get_profile_list(config)
+  if len(profile_list) == 0 :
+    filename_list = [ os.path.realpath( get_filename_atmosphere(config) ) ]
+  else :
+    filename_list = [ [ profile[0], os.path.realpath( get_directory_atmosphere(config) + '/' + profile[1] ) ] for profile in profile_list ]
+
+  return [ filename_list, float(config['satellite']['characteristic_length']) ]
+
+
+def publish_atmosphere(config, atmosphere_dict, directory):
+
+  # Arrays of the table and the spline coefficients for the case processes (shared_table)
+  data_dict = { key: atmosphere_dict[key] for key in atmosphere_dict if key != KEY_INTERP }
+  data_dict[KEY_COEFFICIENT] = atmosphere_dict[KEY_INTERP].coefficient
+  shared_table.publish_table(directory, 'atmosphere', get_key_shared(config), data_dict)
+
+  return
+
+
+def get_directory_atmosphere(config):
 
   script_directory = os.path.dirname(os.path.realpath(__file__))
   if config['atmosphere']['directory_path_specify'] == 'auto' or config['atmosphere']['directory_path_specify'] == 'default':
@@ -43,7 +172,19 @@ def read_atmosphere_file(config):
   else :
     directory_path = script_directory + '/../../database/atmosphere' 
 
-  filename_tmp = directory_path + '/' + config['atmosphere']['filename_atmosphere']
+  return directory_path
+
+
+def get_filename_atmosphere(config):
+
+  return get_directory_atmosphere(config) + '/' + config['atmosphere']['filename_atmosphere']
+
+
+def read_atmosphere_file(config, filename_atmosphere=None):
+
+  if filename_atmosphere is None :
+    filename_atmosphere = get_filename_atmosphere(config)
+  filename_tmp = filename_atmosphere
   print('Reading atmosphere model...:', filename_tmp)
 
   # File open
@@ -96,11 +237,10 @@ def read_atmosphere_file(config):
   # 大気モデルデータの取得
   i_count = i_count + len(atmosphere_name) + 2
   num_array_tmp    = len(lines_strip) - i_count
-  atmosphere_model = np.zeros(num_atmosphere_var*num_array_tmp).reshape(num_atmosphere_var,num_array_tmp) 
-  for i in range(i_count, len(lines_strip) ):
-    words = lines_strip[i].split()
-    for j in range(0,num_atmosphere_var):
-      atmosphere_model[j,i-i_count] = float( words[j] )*unit_convert[atmosphere_unit[j]]
+  # --All rows are converted at once: (num_atmosphere_var, num_array_tmp)
+  words_list       = [ lines_strip[i].split()[0:num_atmosphere_var] for i in range(i_count, len(lines_strip)) ]
+  unit_array       = np.array( [ unit_convert[atmosphere_unit[j]] for j in range(0,num_atmosphere_var) ] )
+  atmosphere_model = np.ascontiguousarray( ( np.array(words_list, dtype=np.float64).reshape(num_array_tmp,num_atmosphere_var)*unit_array ).T )
 
 
   atmosphere_dict = {KEY_DATA:num_array_tmp, KEY_ATM:num_atmosphere_var}
@@ -131,8 +271,7 @@ def set_knudsen_number(config, atmosphere_dict):
     except KeyError as instance:
       continue
     # Calculate sum( nd*diamter^2 )
-    for n in range(0,num_data):
-      d2_nd_total[n] = d2_nd_total[n] + numb_density[n]*diamter**2
+    d2_nd_total = d2_nd_total + numb_density*diamter**2
   
   knudsen_number = 1.0/( np.sqrt(2.0)*np.pi*d2_nd_total*length)
   atmosphere_dict[KEY_KN] = knudsen_number
@@ -172,3 +311,239 @@ def get_atmosphere_property(altitude, altitude_atm, density_atm, temperature_atm
   return density, temperature, knudsen
 
 
+def set_interpolator(config, atmosphere_dict, coefficient=None):
+
+  # Spline coefficients are built only once here (or given by the shared table) and reused by the solver at every stage
+  print('Setting interpolator of atmosphere model...')
+
+  if KEY_PROFILE in atmosphere_dict :
+    interpolator = atmosphere_interpolator_profile(atmosphere_dict[KEY_PROFILE], atmosphere_dict[KEY_Height], atmosphere_dict[KEY_Mass_density],
+                                                   atmosphere_dict[KEY_Temperature_neutral], atmosphere_dict[KEY_KN], coefficient)
+  else :
+    interpolator = atmosphere_interpolator(atmosphere_dict[KEY_Height], atmosphere_dict[KEY_Mass_density], atmosphere_dict[KEY_Temperature_neutral], atmosphere_dict[KEY_KN], coefficient)
+  atmosphere_dict[KEY_INTERP] = interpolator
+
+  return atmosphere_dict
+
+
+def get_spline_coefficient(x_data, y_data):
+  #
+  # Cubic spline with not-a-knot end conditions (same as scipy.interpolate.interp1d, kind="cubic")
+  #
+  # x_data: (n) breakpoints in ascending order
+  # y_data: (n) or (n,m) values
+  # return: (4,n-1) or (4,n-1,m) coefficients, y = c0 + c1*dx + c2*dx^2 + c3*dx^3 with dx = x - x_data[i]
+
+  x_data = np.asarray(x_data, dtype=np.float64)
+  y_data = np.asarray(y_data, dtype=np.float64)
+  flag_vector = ( y_data.ndim == 1 )
+  if flag_vector :
+    y_data = y_data.reshape(-1,1)
+
+  num_data = len(x_data)
+  h        = np.diff(x_data)
+  slope    = np.diff(y_data, axis=0)/h[:,None]
+
+  # Second derivatives at breakpoints
+  matrix = np.zeros((num_data,num_data))
+  rhs    = np.zeros((num_data,y_data.shape[1]))
+  for i in range(1,num_data-1):
+    matrix[i,i-1] = h[i-1]
+    matrix[i,i]   = 2.0*(h[i-1] + h[i])
+    matrix[i,i+1] = h[i]
+    rhs[i,:]      = 6.0*(slope[i,:] - slope[i-1,:])
+  # --Not-a-knot: third derivative is continuous at the second and the second last breakpoints
+  matrix[0,0:3]    = [ h[1], -(h[0]+h[1]), h[0] ]
+  matrix[-1,-3:]   = [ h[-1], -(h[-2]+h[-1]), h[-2] ]
+  second_deriv = np.linalg.solve(matrix, rhs)
+
+  coefficient = np.zeros((4,num_data-1,y_data.shape[1]))
+  coefficient[0] = y_data[:-1,:]
+  coefficient[1] = slope - h[:,None]*(2.0*second_deriv[:-1,:] + second_deriv[1:,:])/6.0
+  coefficient[2] = 0.5*second_deriv[:-1,:]
+  coefficient[3] = (second_deriv[1:,:] - second_deriv[:-1,:])/(6.0*h[:,None])
+
+  if flag_vector :
+    coefficient = coefficient[:,:,0]
+
+  return coefficient
+
+
+class atmosphere_interpolator:
+  #
+  # Cubic interpolation of density, temperature and Knudsen number with respect to altitude (km)
+  # --Values are clamped to the end values outside of the table
+  # --Interval index is found in O(1) when the table is on a uniform grid, otherwise by bisection
+  #
+
+  def __init__(self, altitude_atm, density_atm, temperature_atm, knudsen_atm, coefficient=None):
+
+    altitude_atm = np.asarray(altitude_atm, dtype=np.float64)
+    value_atm    = np.stack([density_atm, temperature_atm, knudsen_atm], axis=1)
+
+    self.num_interval  = len(altitude_atm) - 1
+    self.altitude_atm  = altitude_atm
+    self.altitude_list = altitude_atm.tolist()
+    self.altitude_min  = self.altitude_list[0]
+    self.altitude_max  = self.altitude_list[-1]
+    self.value_min     = tuple( value_atm[0,:].tolist() )
+    self.value_max     = tuple( value_atm[-1,:].tolist() )
+
+    delta_altitude     = np.diff(altitude_atm)
+    self.flag_uniform  = bool( np.allclose(delta_altitude, delta_altitude[0], rtol=1.e-9, atol=0.0) )
+    self.inv_delta     = 1.0/delta_altitude[0]
+
+    # (4, num_interval, 3): polynomial order, interval, [density, temperature, knudsen]
+    if coefficient is None :
+      coefficient = get_spline_coefficient(altitude_atm, value_atm)
+    self.coefficient = coefficient
+
+    # Coefficients per interval as a flat tuple of python floats for the scalar routine
+    coef_tmp = np.transpose(self.coefficient, (1,2,0)).reshape(self.num_interval, 12)
+    self.coefficient_list = [ tuple(row) for row in coef_tmp.tolist() ]
+
+    return
+
+
+  def get_index(self, altitude):
+
+    if self.flag_uniform :
+      i = int( (altitude - self.altitude_min)*self.inv_delta )
+    else :
+      i = bisect.bisect_right(self.altitude_list, altitude) - 1
+    if i >= self.num_interval :
+      i = self.num_interval - 1
+    elif i < 0 :
+      i = 0
+
+    return i
+
+
+  def evaluate(self, altitude):
+
+    # Interpolate atmosphere data from altitude data of satellite
+
+    if altitude < self.altitude_min :
+      return self.value_min
+    elif altitude > self.altitude_max :
+      return self.value_max
+
+    i  = self.get_index(altitude)
+    dx = altitude - self.altitude_list[i]
+    d0, d1, d2, d3, t0, t1, t2, t3, k0, k1, k2, k3 = self.coefficient_list[i]
+
+    density     = d0 + dx*( d1 + dx*( d2 + dx*d3 ) )
+    temperature = t0 + dx*( t1 + dx*( t2 + dx*t3 ) )
+    knudsen     = k0 + dx*( k1 + dx*( k2 + dx*k3 ) )
+
+    return density, temperature, knudsen
+
+
+  def evaluate_array(self, altitude):
+
+    # Same as evaluate() for an array of altitude, returns arrays of density, temperature, knudsen
+
+    altitude = np.asarray(altitude, dtype=np.float64)
+    altitude_clip = np.clip(altitude, self.altitude_min, self.altitude_max)
+
+    if self.flag_uniform :
+      index = ( (altitude_clip - self.altitude_min)*self.inv_delta ).astype(np.int64)
+    else :
+      index = np.searchsorted(self.altitude_atm, altitude_clip, side='right') - 1
+    index = np.clip(index, 0, self.num_interval-1)
+
+    dx   = ( altitude_clip - self.altitude_atm[index] )[...,None]
+    coef = self.coefficient[:,index,:]
+    value = coef[0] + dx*( coef[1] + dx*( coef[2] + dx*coef[3] ) )
+
+    return value[...,0], value[...,1], value[...,2]
+
+
+class atmosphere_interpolator_profile:
+  #
+  # Interpolation in altitude (km) and solar activity of the profiles on the same altitude grid
+  # --Cubic spline in altitude (atmosphere_interpolator) of each profile, linear in solar activity
+  # --Values are clamped to the end profiles outside of the range of solar activity
+  # --The spline is linear in the data, so that a profile between two profiles is the spline of the blended data
+  #   (get_interpolator builds it once for the solar activity of a case, with the same cost per stage as a single profile)
+  #
+
+  def __init__(self, solar_activity, altitude_atm, density_atm, temperature_atm, knudsen_atm, coefficient=None):
+
+    self.solar_activity  = np.asarray(solar_activity, dtype=np.float64)
+    self.number_profile  = len(self.solar_activity)
+    self.altitude_atm    = np.asarray(altitude_atm, dtype=np.float64)
+    # (number_profile, number_data, 3): [density, temperature, knudsen]
+    self.value_atm       = np.stack([density_atm, temperature_atm, knudsen_atm], axis=2)
+    self.num_interval    = len(self.altitude_atm) - 1
+
+    # (number_profile, 4, num_interval, 3): profile, polynomial order, interval, [density, temperature, knudsen]
+    # --All profiles are solved at once as columns of the same system
+    if coefficient is None :
+      value_tmp   = np.transpose(self.value_atm, (1,0,2)).reshape(self.num_interval+1, self.number_profile*3)
+      coefficient = get_spline_coefficient(self.altitude_atm, value_tmp).reshape(4, self.num_interval, self.number_profile, 3)
+      coefficient = np.ascontiguousarray( np.transpose(coefficient, (2,0,1,3)) )
+    self.coefficient = coefficient
+
+    # Altitude grid (index of the interval) from the first profile
+    self.interpolator_grid = atmosphere_interpolator(self.altitude_atm, self.value_atm[0,:,0], self.value_atm[0,:,1], self.value_atm[0,:,2], self.coefficient[0])
+
+    return
+
+
+  def get_weight(self, solar_activity):
+
+    # Index of the lower profile and weight of the upper profile (arrays)
+    solar_activity = np.clip(np.asarray(solar_activity, dtype=np.float64), self.solar_activity[0], self.solar_activity[-1])
+    index  = np.clip( np.searchsorted(self.solar_activity, solar_activity, side='right') - 1, 0, self.number_profile-2 )
+    weight = ( solar_activity - self.solar_activity[index] )/( self.solar_activity[index+1] - self.solar_activity[index] )
+
+    return index, weight
+
+
+  def get_interpolator(self, solar_activity):
+
+    # Interpolator in altitude at a solar activity (atmosphere_interpolator)
+    index, weight = self.get_weight(solar_activity)
+    index  = int(index)
+    weight = float(weight)
+
+    value_tmp   = (1.0 - weight)*self.value_atm[index]   + weight*self.value_atm[index+1]
+    coefficient = (1.0 - weight)*self.coefficient[index] + weight*self.coefficient[index+1]
+    print('Atmosphere profile at solar activity:', solar_activity, ', between', self.solar_activity[index], 'and', self.solar_activity[index+1],
+          ', weight:', '{:.4f}'.format(weight))
+
+    return atmosphere_interpolator(self.altitude_atm, value_tmp[:,0], value_tmp[:,1], value_tmp[:,2], coefficient)
+
+
+  def evaluate(self, altitude, solar_activity):
+
+    # Lookup at an altitude and a solar activity (the solver uses get_interpolator for a constant solar activity)
+    density, temperature, knudsen = self.evaluate_array(np.array([altitude]), np.array([solar_activity]))
+
+    return float(density[0]), float(temperature[0]), float(knudsen[0])
+
+
+  def evaluate_array(self, altitude, solar_activity):
+
+    # Arrays of density, temperature, knudsen at arrays (N) of altitude and solar activity (e.g., members of an ensemble)
+    # --Same as get_interpolator(solar_activity[n]).evaluate_array(altitude[n]) for each n
+    altitude = np.asarray(altitude, dtype=np.float64)
+    grid     = self.interpolator_grid
+    altitude_clip = np.clip(altitude, grid.altitude_min, grid.altitude_max)
+
+    if grid.flag_uniform :
+      index_alt = ( (altitude_clip - grid.altitude_min)*grid.inv_delta ).astype(np.int64)
+    else :
+      index_alt = np.searchsorted(self.altitude_atm, altitude_clip, side='right') - 1
+    index_alt = np.clip(index_alt, 0, self.num_interval-1)
+
+    index, weight = self.get_weight( np.broadcast_to(solar_activity, altitude.shape) )
+
+    # (N, 4, 3) coefficients of the blended profiles
+    weight = weight[:,None,None]
+    coef   = (1.0 - weight)*self.coefficient[index,:,index_alt,:] + weight*self.coefficient[index+1,:,index_alt,:]
+    dx     = ( altitude_clip - self.altitude_atm[index_alt] )[:,None]
+    value  = coef[:,0] + dx*( coef[:,1] + dx*( coef[:,2] + dx*coef[:,3] ) )
+
+    return value[:,0], value[:,1], value[:,2]
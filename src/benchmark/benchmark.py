@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+
+# Benchmark of hot paths in Tacode
+# --Microbenchmarks: force, coordinate conversion, atmosphere and aerodynamic lookups, and output writers
+# --End-to-end: propagation of the bundled testcases with each time scheme
+# --Results are written to JSON with the machine information, and compared with a stored baseline
+
+import numpy as np
+import time as time
+import os as os
+import copy as copy
+import json as json
+import platform as platform
+import subprocess as subprocess
+import tempfile as tempfile
+import shutil as shutil
+import atmosphere.atmosphere as atmosphere
+import satellite.satellite as satellite
+import coordinate_system.coordinate_system as coordinate_system
+import force_term.force_term as force_term
+import solver.solver as solver
+import trajectory.trajectory as trajectory_module
+import trajectory_sink.trajectory_sink as trajectory_sink
+import progress.progress as progress
+import checkpoint.checkpoint as checkpoint
+from orbital.orbital import orbital
+
+# Number of stages per time step (4th stage Runge-Kutta method)
+number_stage_rk = 4
+
+tiny_value = 1.e-300
+
+# Dict key in config
+KEY_BENCHMARK = 'benchmark'
+
+# Default settings
+filename_output_default      = 'benchmark.json'
+number_sample_default        = 1000
+number_repeat_default        = 5
+number_repeat_testcase_default = 3
+testcase_list_default        = ['work_reentry', 'work']
+kind_time_scheme_list_default = ['runge_kutta', 'dormand_prince']
+threshold_regression_default = 0.10
+
+# Timing metrics compared with the baseline (keys of the result of each benchmark)
+suffix_metric_time = ('per_call', 'per_sample', 'wall_time')
+
+
+def argument(filename_default):
+
+  # Command line: -file config, -kind all/micro/end_to_end, -output JSON of the results,
+  # -baseline JSON to be compared with, -result JSON compared with the baseline without running the benchmarks
+  import argparse
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-file', action='store', type=str, default=filename_default)
+  parser.add_argument('-kind', action='store', type=str, default='all', choices=['all', 'micro', 'end_to_end'])
+  parser.add_argument('-output', action='store', type=str, default=None)
+  parser.add_argument('-baseline', action='store', type=str, default=None)
+  parser.add_argument('-result', action='store', type=str, default=None)
+  parser.add_argument('-threshold', action='store', type=float, default=None)
+  args = parser.parse_args()
+
+  return args
+
+
+def measure_time(function, arguments_list, number_repeat):
+
+  # Average elapsed time (s) per call over arguments_list repeated number_repeat times
+  # --The first call is excluded as warm-up (lazy imports etc.)
+  function(*arguments_list[0])
+  time_start = time.perf_counter()
+  for n in range(0, number_repeat):
+    for arguments in arguments_list:
+      function(*arguments)
+  time_elapsed = time.perf_counter() - time_start
+
+  return time_elapsed/float( number_repeat*len(arguments_list) )
+
+
+def benchmark_atmosphere(config, atmosphere_dict, number_sample=1000, number_repeat=5):
+
+  print('Benchmark: atmosphere lookup')
+
+  altitude_atm    = atmosphere_dict[atmosphere.KEY_Height]
+  density_atm     = atmosphere_dict[atmosphere.KEY_Mass_density]
+  temperature_atm = atmosphere_dict[atmosphere.KEY_Temperature_neutral]
+  knudsen_atm     = atmosphere_dict[atmosphere.KEY_KN]
+  interpolator    = atmosphere_dict[atmosphere.KEY_INTERP]
+  if atmosphere.KEY_PROFILE in atmosphere_dict :
+    # Multi-profile atmosphere: lookup in the first profile (same cost per call as that at the solar activity of a case)
+    print('--Multi-profile atmosphere: first profile')
+    density_atm     = density_atm[0]
+    temperature_atm = temperature_atm[0]
+    knudsen_atm     = knudsen_atm[0]
+    interpolator    = interpolator.interpolator_grid
+
+  altitude_sample = np.random.default_rng(0).uniform(altitude_atm[0], altitude_atm[-1], number_sample).tolist()
+
+  # Legacy routine building the splines at every call (repeated once only since it is slow)
+  arguments_legacy = [ (altitude, altitude_atm, density_atm, temperature_atm, knudsen_atm) for altitude in altitude_sample[0:max(1,number_sample//10)] ]
+  time_legacy = measure_time(atmosphere.get_atmosphere_property, arguments_legacy, 1)
+
+  # Prebuilt interpolator
+  arguments_table = [ (altitude,) for altitude in altitude_sample ]
+  time_table = measure_time(interpolator.evaluate, arguments_table, number_repeat)
+
+  # Discrepancy between both routines
+  discrepancy = 0.0
+  for arguments in arguments_legacy:
+    value_legacy = atmosphere.get_atmosphere_property(*arguments)
+    value_table  = interpolator.evaluate(arguments[0])
+    for m in range(0,3):
+      discrepancy = max(discrepancy, abs(float(value_legacy[m]) - value_table[m])/max(abs(float(value_legacy[m])), tiny_value) )
+
+  result = {'legacy_per_call': time_legacy, 'table_per_call': time_table,
+            'legacy_per_step': time_legacy*number_stage_rk, 'table_per_step': time_table*number_stage_rk,
+            'speedup': time_legacy/time_table, 'max_relative_discrepancy': discrepancy}
+
+  print('--Legacy (interp1d per call), per call (us):', '{:.3f}'.format(time_legacy*1.e6), ', per RK4 step (us):', '{:.3f}'.format(time_legacy*number_stage_rk*1.e6))
+  print('--Interpolator,               per call (us):', '{:.3f}'.format(time_table*1.e6),  ', per RK4 step (us):', '{:.3f}'.format(time_table*number_stage_rk*1.e6))
+  print('--Speedup:', '{:.1f}'.format(result['speedup']), ', Max. relative discrepancy:', '{:.3e}'.format(discrepancy))
+
+  return result
+
+
+def benchmark_aerodynamic(config, aerodynamic_dict, number_sample=1000, number_repeat=5):
+
+  print('Benchmark: aerodynamic coefficient lookup')
+
+  # Breakpoints of the table (those of all AoA blocks)
+  table       = aerodynamic_dict[satellite.KEY_TABLE]
+  knudsen_aer = table.knudsen_aer
+  cdmean_aer  = table.cdmean_aer
+
+  # Knudsen number spans decades: sampled uniformly in log scale with some points outside the table
+  knudsen_sample = np.exp( np.random.default_rng(0).uniform(np.log(knudsen_aer.min())-1.0, np.log(knudsen_aer.max())+1.0, number_sample) ).tolist()
+
+  arguments_legacy = [ (knudsen, knudsen_aer, cdmean_aer) for knudsen in knudsen_sample[0:max(1,number_sample//10)] ]
+  time_legacy = measure_time(satellite.get_aerodynamic_coefficient, arguments_legacy, 1)
+
+  arguments_table = [ (knudsen,) for knudsen in knudsen_sample ]
+  time_table = measure_time(table.evaluate, arguments_table, number_repeat)
+
+  discrepancy = 0.0
+  for arguments in arguments_legacy:
+    value_legacy = float( satellite.get_aerodynamic_coefficient(*arguments) )
+    value_table  = table.evaluate(arguments[0])
+    discrepancy  = max(discrepancy, abs(value_legacy - value_table)/max(abs(value_legacy), tiny_value) )
+
+  result = {'legacy_per_call': time_legacy, 'table_per_call': time_table,
+            'legacy_per_step': time_legacy*number_stage_rk, 'table_per_step': time_table*number_stage_rk,
+            'speedup': time_legacy/time_table, 'max_relative_discrepancy': discrepancy}
+
+  print('--Legacy (interp1d per call), per call (us):', '{:.3f}'.format(time_legacy*1.e6), ', per RK4 step (us):', '{:.3f}'.format(time_legacy*number_stage_rk*1.e6))
+  print('--Lookup table,               per call (us):', '{:.3f}'.format(time_table*1.e6),  ', per RK4 step (us):', '{:.3f}'.format(time_table*number_stage_rk*1.e6))
+  print('--Speedup:', '{:.1f}'.format(result['speedup']), ', Max. relative discrepancy:', '{:.3e}'.format(discrepancy))
+
+  return result
+
+
+def benchmark_force(config, number_sample=1000, number_repeat=5):
+
+  print('Benchmark: force evaluation')
+
+  # States around the planet at 100-400 km (velocity of about 7.5 km/s in random directions)
+  rng = np.random.default_rng(0)
+  coordinate_geodetic = np.column_stack( [ rng.uniform(-np.pi, np.pi, number_sample), rng.uniform(-0.5*np.pi, 0.5*np.pi, number_sample),
+                                           rng.uniform(100.e3, 400.e3, number_sample) ] )
+  coordinate_sample = coordinate_system.convert_geodetic_cartesian_array(config, coordinate_geodetic)
+  velocity_sample   = 7.5e3*rng.standard_normal( (number_sample,3) )/np.sqrt(3.0)
+  density_sample    = np.exp( rng.uniform(np.log(1.e-12), np.log(1.e-6), number_sample) )
+
+  mass_satellite = config['satellite']['mass']
+  area_satellite = config['satellite']['characteristic_area']
+  density_factor = config['initial_settings']['density_factor'][0]
+  cdmean         = config['satellite']['drag_coefficient']
+
+  # Legacy routine reading the planet constants from config at every call
+  force = force_term.force_initialsettings(config)
+  arguments_legacy = [ (config, coordinate_sample[n], velocity_sample[n], mass_satellite, area_satellite, cdmean, density_factor, density_sample[n], force)
+                       for n in range(0, max(1,number_sample//10)) ]
+  time_legacy = measure_time(force_term.force_routine, arguments_legacy, number_repeat)
+
+  # Bound force model (scalar, used by the solver)
+  force_model = force_term.force_model(config)
+  arguments_model = [ (coordinate_sample[n].tolist(), velocity_sample[n].tolist(), cdmean, density_sample[n]) for n in range(0, number_sample) ]
+  time_model = measure_time(force_model.acceleration, arguments_model, number_repeat)
+
+  # Arrays of all samples at once (ensemble)
+  time_array = measure_time(force_model.acceleration_array, [ (coordinate_sample, velocity_sample, cdmean, density_sample) ], number_repeat)/float(number_sample)
+
+  # Discrepancy between the legacy routine and the force model
+  discrepancy = 0.0
+  for arguments in arguments_legacy:
+    value_legacy = force_term.force_routine(*arguments)[0]
+    value_model  = np.array( force_model.acceleration(arguments[1].tolist(), arguments[2].tolist(), cdmean, arguments[7]) )
+    discrepancy  = max(discrepancy, np.linalg.norm(value_legacy - value_model)/max(np.linalg.norm(value_legacy), tiny_value) )
+
+  result = {'legacy_per_call': time_legacy, 'model_per_call': time_model, 'array_per_sample': time_array,
+            'speedup': time_legacy/time_model, 'max_relative_discrepancy': float(discrepancy)}
+
+  print('--Legacy (force_routine), per call (us):', '{:.3f}'.format(time_legacy*1.e6))
+  print('--Force model,            per call (us):', '{:.3f}'.format(time_model*1.e6))
+  print('--Force model (array),  per sample (us):', '{:.3f}'.format(time_array*1.e6))
+  print('--Speedup:', '{:.1f}'.format(result['speedup']), ', Max. relative discrepancy:', '{:.3e}'.format(discrepancy))
+
+  return result
+
+
+def benchmark_coordinate(config, number_sample=1000, number_repeat=5):
+
+  print('Benchmark: cartesian --> geodetic conversion')
+
+  rng = np.random.default_rng(0)
+  coordinate_geodetic = np.column_stack( [ rng.uniform(-np.pi, np.pi, number_sample), rng.uniform(-0.5*np.pi, 0.5*np.pi, number_sample),
+                                           rng.uniform(0.0, 400.e3, number_sample) ] )
+  coordinate_sample = coordinate_system.convert_geodetic_cartesian_array(config, coordinate_geodetic)
+
+  arguments_scalar = [ (config, coordinate_sample[n]) for n in range(0, number_sample) ]
+  time_scalar = measure_time(coordinate_system.convert_cartesian_geodetic, arguments_scalar, number_repeat)
+  time_array  = measure_time(coordinate_system.convert_cartesian_geodetic_array, [ (config, coordinate_sample) ], number_repeat)/float(number_sample)
+
+  # Round trip error of altitude (m)
+  altitude_error = np.abs( coordinate_system.convert_cartesian_geodetic_array(config, coordinate_sample)[:,2] - coordinate_geodetic[:,2] ).max()
+
+  result = {'scalar_per_call': time_scalar, 'array_per_sample': time_array, 'speedup': time_scalar/time_array,
+            'max_altitude_error': float(altitude_error)}
+
+  print('--Scalar,   per call (us):', '{:.3f}'.format(time_scalar*1.e6))
+  print('--Array,  per sample (us):', '{:.3f}'.format(time_array*1.e6))
+  print('--Speedup:', '{:.1f}'.format(result['speedup']), ', Max. altitude error of round trip (m):', '{:.3e}'.format(altitude_error))
+
+  return result
+
+
+def benchmark_output(config, number_sample=1000, number_repeat=5):
+
+  print('Benchmark: output writers')
+
+  # Synthetic trajectory of number_sample samples (circular orbit at 200 km)
+  time_sample  = np.arange(0, number_sample, dtype=np.float64)
+  angle_sample = 2.0*np.pi*time_sample/5300.0
+  coordinate_geodetic = np.column_stack( [ np.mod(angle_sample, 2.0*np.pi) - np.pi, 0.5*np.sin(angle_sample), np.full(number_sample, 200.e3) ] )
+  coordinate_cartesian = coordinate_system.convert_geodetic_cartesian_array(config, coordinate_geodetic)
+  velocity_polar       = np.column_stack( [ np.full(number_sample, 7.5e3), np.zeros(number_sample), np.zeros(number_sample) ] )
+  polar_coord          = coordinate_system.set_angle_polar_array(config, coordinate_cartesian)
+  velocity_cartesian   = coordinate_system.convert_polar_carteasian_array(config, velocity_polar, polar_coord[:,2], polar_coord[:,1])
+
+  trajectory = trajectory_module.trajectory_store(number_sample, None)
+  trajectory.extend(time_sample, coordinate_cartesian, velocity_cartesian, coordinate_geodetic, velocity_polar, 1.e-10, 800.0, 10.0)
+  coordinate_dict, velocity_dict, trajectory_dict = trajectory.get_dict()
+  index_global = np.arange(0, number_sample)
+
+  # Every sample is written by each writer
+  config_output = copy.deepcopy(config)
+  config_post   = config_output['post_process']
+  config_post['tecplot']['frequency_output'] = 1
+  config_post['kml']['frequency_output']     = 1
+  config_post['frequency_output_gpx']        = 1
+  sink_dict = {}
+  for key in ['tecplot', 'binary', 'kml', 'gpx']:
+    sink_dict[key] = trajectory_sink.load_sink(key)
+
+  directory_tmp = tempfile.mkdtemp(prefix='tacode_benchmark_')
+  config_post['directory_output'] = directory_tmp
+  result = {}
+  try :
+    for key in sink_dict:
+      time_list = []
+      for n in range(0, number_repeat):
+        time_start = time.perf_counter()
+        sink = sink_dict[key](config_output)
+        sink.write(index_global, coordinate_dict, velocity_dict, trajectory_dict)
+        sink.close()
+        time_list.append( time.perf_counter() - time_start )
+      result[key] = {'writer_per_sample': min(time_list)/float(number_sample)}
+      print('--'+key.ljust(8)+', per sample (us):', '{:.3f}'.format(result[key]['writer_per_sample']*1.e6))
+  finally :
+    shutil.rmtree(directory_tmp, ignore_errors=True)
+
+  return result
+
+
+def run_testcase(config, orbital_tmp):
+
+  # Same sequence as tacode.py, returns the wall time (s) of the setup and the time integration, and the final state
+  # --Steps: time steps (accepted steps for dormand_prince), iteration: stored samples of the uniform interval
+  time_start = time.perf_counter()
+  atmosphere_dict  = atmosphere.initial_settings_atmosphere(config)
+  aerodynamic_dict = satellite.initial_settings_satellite(config)
+  orbital_tmp.make_directory_output(config)
+  iteration, time_elapsed, trajectory = orbital_tmp.initial_settings(config)
+  trajectory.set_sink( trajectory_sink.get_sink_list(config) )
+  reporter     = progress.progress_reporter(config)
+  checkpointer = checkpoint.checkpoint_manager(config)
+  time_setup   = time.perf_counter()
+  iteration, trajectory = solver.solve_equation_motion(config, iteration, time_elapsed, trajectory, atmosphere_dict, aerodynamic_dict, reporter=reporter, checkpointer=checkpointer)
+  trajectory.close()
+  checkpointer.exit_signal()
+  time_end = time.perf_counter()
+
+  index_last = len(trajectory) - 1
+  coordinate_dict, velocity_dict, trajectory_dict = trajectory.get_dict(index_last, index_last+1)
+  result = {'wall_time': time_end - time_start, 'wall_time_integration': time_end - time_setup,
+            'iteration': int(iteration), 'number_sample': int(trajectory.get_number_sample()),
+            'number_step': int(reporter.number_step), 'number_force': int(reporter.number_force),
+            'time_final': float(trajectory_dict['time'][0]), 'altitude_final': float(coordinate_dict['geodetic'][0,2])}
+  time_integration = max(result['wall_time_integration'], tiny_value)
+  result['steps_per_second']             = result['number_step']/time_integration
+  result['force_evaluations_per_second'] = result['number_force']/time_integration
+  result['samples_per_second']           = result['iteration']/time_integration
+
+  return result
+
+
+def benchmark_testcase(config, number_repeat=1):
+
+  # End-to-end propagation of the testcases with each time scheme (outputs are written to a temporary directory)
+  config_benchmark = config.get(KEY_BENCHMARK, None) or {}
+  script_directory   = os.path.dirname(os.path.realpath(__file__))
+  directory_testcase = config_benchmark.get('directory_testcase', script_directory + '/../../testcase')
+  testcase_list         = config_benchmark.get('testcase_list', testcase_list_default)
+  kind_time_scheme_list = config_benchmark.get('kind_time_scheme_list', kind_time_scheme_list_default)
+
+  orbital_tmp = orbital()
+  result = {}
+  for testcase in testcase_list:
+    config_testcase = orbital_tmp.read_config_yaml(directory_testcase + '/' + testcase + '/config.yml')
+    for kind_time_scheme in kind_time_scheme_list:
+      name = testcase + '/' + kind_time_scheme
+      print('Benchmark: end-to-end,', name)
+
+      result_list = []
+      for n in range(0, number_repeat):
+        config_tmp = copy.deepcopy(config_testcase)
+        directory_tmp = tempfile.mkdtemp(prefix='tacode_benchmark_')
+        config_tmp['computational_setup']['flag_initial'] = True
+        config_tmp['time_integration']['kind_time_scheme'] = kind_time_scheme
+        config_tmp['post_process']['directory_output']    = directory_tmp + '/output_result'
+        config_tmp['restart_process']['directory_output'] = directory_tmp + '/output_restart'
+        config_tmp['progress'] = {'flag_quiet': True}
+        try :
+          result_list.append( run_testcase(config_tmp, orbital_tmp) )
+        finally :
+          shutil.rmtree(directory_tmp, ignore_errors=True)
+
+      # Fastest run
+      result[name] = min(result_list, key=lambda result_tmp: result_tmp['wall_time'])
+      print('--Wall time (s):', '{:.3f}'.format(result[name]['wall_time']), ', steps:', result[name]['number_step'],
+            ', steps/s:', '{:.1f}'.format(result[name]['steps_per_second']),
+            ', force evaluations/s:', '{:.1f}'.format(result[name]['force_evaluations_per_second']),
+            ', samples:', result[name]['iteration'])
+
+  return result
+
+
+def get_machine_info():
+
+  # Machine and software versions recorded with the results
+  machine_info = {'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+                  'node': platform.node(), 'cpu_count': os.cpu_count(),
+                  'python': platform.python_version(), 'numpy': np.__version__}
+
+  # Commit of the source (not available outside of git)
+  try :
+    process = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.realpath(__file__)),
+                             capture_output=True, text=True, timeout=10)
+    machine_info['commit'] = process.stdout.strip() if process.returncode == 0 else None
+  except Exception :
+    machine_info['commit'] = None
+
+  return machine_info
+
+
+def run_benchmark(config, kind_benchmark='all'):
+
+  # kind_benchmark: all, micro, or end_to_end
+  config_benchmark = config.get(KEY_BENCHMARK, None) or {}
+  number_sample = config_benchmark.get('number_sample', number_sample_default)
+  number_repeat = config_benchmark.get('number_repeat', number_repeat_default)
+
+  result_dict = {'machine': get_machine_info(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'micro': {}, 'end_to_end': {}}
+
+  if kind_benchmark in ['all', 'micro'] :
+    atmosphere_dict  = atmosphere.initial_settings_atmosphere(config)
+    aerodynamic_dict = satellite.initial_settings_satellite(config)
+    micro_dict = result_dict['micro']
+    micro_dict['force']       = benchmark_force(config, number_sample, number_repeat)
+    micro_dict['coordinate']  = benchmark_coordinate(config, number_sample, number_repeat)
+    micro_dict['atmosphere']  = benchmark_atmosphere(config, atmosphere_dict, number_sample, number_repeat)
+    micro_dict['aerodynamic'] = benchmark_aerodynamic(config, aerodynamic_dict, number_sample, number_repeat)
+    for key, result_tmp in benchmark_output(config, number_sample, number_repeat).items():
+      micro_dict['output_'+key] = result_tmp
+
+  if kind_benchmark in ['all', 'end_to_end'] :
+    result_dict['end_to_end'] = benchmark_testcase(config, config_benchmark.get('number_repeat_testcase', number_repeat_testcase_default))
+
+  return result_dict
+
+
+def write_result(filename, result_dict):
+
+  print('Writing benchmark results... ', filename)
+  with open(filename, 'w') as file:
+    json.dump(result_dict, file, indent=2, default=float)
+
+  return
+
+
+def read_result(filename):
+
+  try :
+    with open(filename) as file:
+      result_dict = json.load(file)
+  except Exception as e :
+    print('Benchmark results can not be read:', filename)
+    print(e)
+    print('Program stopped.')
+    exit()
+
+  return result_dict
+
+
+def compare_result(result_dict, baseline_dict, threshold_regression=threshold_regression_default):
+
+  # Ratio of the timing metrics (result/baseline) of the benchmarks in both, returns True when any ratio exceeds 1 + threshold
+  print('Comparing benchmark results with the baseline (regression: slower by more than '+'{:.1f}'.format(threshold_regression*100.0)+' %)')
+  machine_result   = result_dict.get('machine', {})
+  machine_baseline = baseline_dict.get('machine', {})
+  print('--Baseline:', baseline_dict.get('date'), ', commit:', machine_baseline.get('commit'))
+  print('--Result:  ', result_dict.get('date'), ', commit:', machine_result.get('commit'))
+  for key in ['platform', 'processor', 'python', 'numpy']:
+    if machine_result.get(key) != machine_baseline.get(key) :
+      print('--Warning: '+key+' differs from the baseline:', machine_baseline.get(key), '-->', machine_result.get(key))
+
+  flag_regression = False
+  print('Benchmark'.ljust(56), 'Baseline'.rjust(12), 'Result'.rjust(12), 'Ratio'.rjust(8))
+  for kind in ['micro', 'end_to_end']:
+    benchmark_result   = result_dict.get(kind, {})
+    benchmark_baseline = baseline_dict.get(kind, {})
+    for name in benchmark_result:
+      if not name in benchmark_baseline :
+        print(kind+': '+name, '(not in the baseline)')
+        continue
+      for metric in benchmark_result[name]:
+        if not metric.endswith(suffix_metric_time) or not metric in benchmark_baseline[name] :
+          continue
+        value_result   = benchmark_result[name][metric]
+        value_baseline = benchmark_baseline[name][metric]
+        ratio = value_result/max(value_baseline, tiny_value)
+        label = ''
+        if ratio > 1.0 + threshold_regression :
+          label = ' REGRESSION'
+          flag_regression = True
+        elif ratio < 1.0/(1.0 + threshold_regression) :
+          label = ' improved'
+        print( (kind+': '+name+': '+metric).ljust(56), '{:.4e}'.format(value_baseline).rjust(12), '{:.4e}'.format(value_result).rjust(12), '{:.3f}'.format(ratio).rjust(8) + label )
+
+  if flag_regression :
+    print('Regression found.')
+  else :
+    print('No regression.')
+
+  return flag_regression
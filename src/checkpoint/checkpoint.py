@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# Binary checkpoint of Tacode for restart
+
+import numpy as np
+import os as os
+import random as random
+import signal as signal
+
+# Dict key
+KEY_ITERATION    = 'iteration'
+KEY_TIME         = 'time_elapsed'
+KEY_SCHEME       = 'kind_time_scheme'
+KEY_COORDINATE   = 'coordinate'
+KEY_VELOCITY     = 'velocity'
+KEY_DENSITY      = 'density'
+KEY_TEMPERATURE  = 'temperature'
+KEY_KNUDSEN      = 'knudsen'
+KEY_STATE_SCHEME = 'state_scheme'
+# Global index of the sample (from the initial condition) for the outputs appended on restart
+KEY_SAMPLE       = 'index_sample'
+
+# Random number generators (random: Monte-Carlo dispersion, numpy: legacy global generator)
+KEY_RNG_VERSION       = 'rng_version'
+KEY_RNG_INTERNAL      = 'rng_internal'
+KEY_RNG_GAUSS         = 'rng_gauss'
+KEY_RNG_NUMPY_KEY     = 'rng_numpy_key'
+KEY_RNG_NUMPY_POS     = 'rng_numpy_pos'
+KEY_RNG_NUMPY_GAUSS   = 'rng_numpy_gauss'
+
+# Signals triggering a checkpoint
+signal_list = [signal.SIGTERM, signal.SIGINT]
+
+
+def get_filename_checkpoint(config, iteration):
+
+  # File name: file_restart, or file_restart with _(iteration) for flag_time_series
+  dir_restart      = config['restart_process']['directory_output']
+  file_restart     = config['restart_process']['file_restart']
+  flag_time_series = config['restart_process']['flag_time_series']
+  digid_step       = config['restart_process']['digid_step']
+
+  if flag_time_series :
+    file_name, file_ext = os.path.splitext(file_restart)
+    return dir_restart + '/' + file_name + '_' + str(iteration).zfill(digid_step) + file_ext
+  else :
+    return dir_restart + '/' + file_restart
+
+
+def get_state_rng():
+
+  state_dict = {}
+  version, internal, gauss = random.getstate()
+  state_dict[KEY_RNG_VERSION]  = version
+  state_dict[KEY_RNG_INTERNAL] = np.array(internal, dtype=np.int64)
+  state_dict[KEY_RNG_GAUSS]    = np.nan if gauss is None else gauss
+
+  state_numpy = np.random.get_state()
+  state_dict[KEY_RNG_NUMPY_KEY]   = state_numpy[1]
+  state_dict[KEY_RNG_NUMPY_POS]   = state_numpy[2]
+  state_dict[KEY_RNG_NUMPY_GAUSS] = np.array([state_numpy[3], state_numpy[4]])
+
+  return state_dict
+
+
+def set_state_rng(checkpoint_dict):
+
+  gauss = float(checkpoint_dict[KEY_RNG_GAUSS])
+  random.setstate( ( int(checkpoint_dict[KEY_RNG_VERSION]), tuple( int(value) for value in checkpoint_dict[KEY_RNG_INTERNAL] ),
+                     None if np.isnan(gauss) else gauss ) )
+  np.random.set_state( ( 'MT19937', checkpoint_dict[KEY_RNG_NUMPY_KEY], int(checkpoint_dict[KEY_RNG_NUMPY_POS]),
+                         int(checkpoint_dict[KEY_RNG_NUMPY_GAUSS][0]), float(checkpoint_dict[KEY_RNG_NUMPY_GAUSS][1]) ) )
+
+  return
+
+
+def write_checkpoint(config, checkpoint_dict):
+
+  # Written to a temporary file and renamed, so that a checkpoint is never left incomplete
+  filename_tmp = get_filename_checkpoint(config, checkpoint_dict[KEY_ITERATION])
+  filename_part = filename_tmp + '.tmp'
+
+  checkpoint_dict = dict(checkpoint_dict)
+  checkpoint_dict.update( get_state_rng() )
+  with open(filename_part, 'wb') as file:
+    np.savez(file, **checkpoint_dict)
+    file.flush()
+    os.fsync(file.fileno())
+  os.replace(filename_part, filename_tmp)
+
+  return filename_tmp
+
+
+def read_checkpoint(config):
+
+  # Checkpoint of restart_step for flag_time_series
+  filename_tmp = get_filename_checkpoint(config, config['restart_process']['restart_step'])
+  print('Reading restart data...:', filename_tmp)
+
+  if not os.path.exists(filename_tmp) :
+    print('Restart file is not found:', filename_tmp)
+    print('Program stopped.')
+    exit()
+
+  checkpoint_dict = {}
+  with np.load(filename_tmp, allow_pickle=False) as data:
+    for key in data.files:
+      checkpoint_dict[key] = data[key]
+  checkpoint_dict[KEY_ITERATION] = int(checkpoint_dict[KEY_ITERATION])
+  checkpoint_dict[KEY_TIME]      = float(checkpoint_dict[KEY_TIME])
+  checkpoint_dict[KEY_SCHEME]    = str(checkpoint_dict[KEY_SCHEME])
+  checkpoint_dict[KEY_SAMPLE]    = int( checkpoint_dict.get(KEY_SAMPLE, checkpoint_dict[KEY_ITERATION]) )
+  set_state_rng(checkpoint_dict)
+
+  return checkpoint_dict
+
+
+class checkpoint_manager:
+  #
+  # Periodic checkpoint every restart_process: frequency_output steps and checkpoint on SIGTERM/SIGINT
+  # --A signal only sets a flag, and the checkpoint is written at the end of the current step
+  # --The solver then stops, and the caller closes the outputs before exit_signal
+  #
+
+  def __init__(self, config):
+
+    config_restart = config['restart_process']
+    self.config           = config
+    self.flag_output      = config_restart.get('flag_output', True)
+    self.frequency_output = int( config_restart['frequency_output'] )
+    self.signal_received  = None
+    self.handler_previous = {}
+
+    return
+
+
+  def install_signal(self):
+
+    if not self.flag_output :
+      return
+    for signal_tmp in signal_list:
+      try :
+        self.handler_previous[signal_tmp] = signal.signal(signal_tmp, self.handle_signal)
+      except ValueError :
+        # Not in the main thread
+        pass
+
+    return
+
+
+  def restore_signal(self):
+
+    for signal_tmp in self.handler_previous:
+      signal.signal(signal_tmp, self.handler_previous[signal_tmp])
+    self.handler_previous = {}
+
+    return
+
+
+  def handle_signal(self, signum, frame):
+
+    self.signal_received = signum
+
+    return
+
+
+  def check(self, iteration_previous, iteration):
+
+    # True when a multiple of frequency_output is passed in this step or a signal is received
+    if not self.flag_output :
+      return False
+    if self.signal_received is not None :
+      return True
+    if self.frequency_output > 0 and iteration//self.frequency_output > iteration_previous//self.frequency_output :
+      return True
+
+    return False
+
+
+  def write(self, checkpoint_dict):
+
+    if not self.flag_output :
+      return
+    filename_tmp = write_checkpoint(self.config, checkpoint_dict)
+
+    if self.signal_received is not None :
+      print('Signal received:', self.signal_received, ', restart data written:', filename_tmp)
+
+    return
+
+
+  def exit_signal(self):
+
+    # Exit status 128+signal after the outputs are closed
+    if self.signal_received is not None :
+      print('Program stopped.')
+      exit(128+self.signal_received)
+
+    return
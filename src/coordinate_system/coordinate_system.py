@@ -55,6 +55,55 @@ def convert_cartesian_geodetic(config, cartesian_coord):
   return geodetic_coord
 
 
+def convert_cartesian_geodetic_array(config, cartesian_coord):
+  #
+  # Same as convert_cartesian_geodetic for (N,3) array of cartesian coordinates, returns (N,3) array
+  #
+  # carcoord_x,y,z: meter
+  # Longitude: Radius
+  # Latitude: Radius
+  # Altitude: meter
+
+  radius_equat_planet = config['planet']['radius']
+  ellipticity_planet  = config['planet']['ellipticity']
+
+  carcoord_x = cartesian_coord[:,0]
+  carcoord_y = cartesian_coord[:,1]
+  carcoord_z = cartesian_coord[:,2]
+
+  radius_proj = np.sqrt( carcoord_x**2 + carcoord_y**2 )
+  B_geo_tmp   = np.sign( carcoord_z ) * radius_equat_planet * (1.0 - ellipticity_planet)
+  E_geo_tmp   = ( (carcoord_z + B_geo_tmp)*B_geo_tmp/radius_equat_planet - radius_equat_planet )/radius_proj
+  F_geo_tmp   = ( (carcoord_z - B_geo_tmp)*B_geo_tmp/radius_equat_planet + radius_equat_planet )/radius_proj
+
+  P_geo_tmp   = 4.0*(E_geo_tmp*F_geo_tmp + 1.0)/3.0
+  Q_geo_tmp   = 2.0*(E_geo_tmp**2 - F_geo_tmp**2)
+  D_geo_tmp   = P_geo_tmp**3 + Q_geo_tmp**2
+
+  # Both branches are evaluated and selected by the sign of D (the unused branch may produce nan)
+  flag_positive = ( D_geo_tmp >= 0.0 )
+  with np.errstate(invalid='ignore', divide='ignore'):
+    S_geo_tmp   = np.sqrt( np.where(flag_positive, D_geo_tmp, 0.0) ) + Q_geo_tmp
+    S_geo_tmp   = np.sign(S_geo_tmp) * np.exp( np.log( np.abs(S_geo_tmp+tiny_value))/3.0 )
+    V_geo_pos   = - ( 2.0*Q_geo_tmp + (P_geo_tmp/(S_geo_tmp+tiny_value) - S_geo_tmp)**3 )/(3.0*P_geo_tmp+tiny_value)
+    P_geo_neg   = np.where(flag_positive, -1.0, P_geo_tmp)
+    V_geo_neg   = 2.0 * np.sqrt( -P_geo_neg ) * np.cos( np.arccos(Q_geo_tmp/np.sqrt( - P_geo_neg**3 )) / 3.0)
+  V_geo_tmp = np.where(flag_positive, V_geo_pos, V_geo_neg)
+
+  G_geo_tmp = 0.5*( E_geo_tmp + np.sqrt(E_geo_tmp**2 + V_geo_tmp) )
+  T_geo_tmp = np.sqrt( G_geo_tmp**2 + (F_geo_tmp - V_geo_tmp*G_geo_tmp)/(2.0*G_geo_tmp - E_geo_tmp )) - G_geo_tmp
+
+  geodetic_coord = np.empty_like(cartesian_coord, dtype=np.float64)
+# Longitude
+  geodetic_coord[:,0] = np.sign(carcoord_y) * np.arccos( carcoord_x / radius_proj )
+# Latitude
+  geodetic_coord[:,1] = np.arctan( (1.0 - T_geo_tmp**2)*radius_equat_planet / (2.0 * B_geo_tmp * T_geo_tmp + tiny_value ))
+# Altitude
+  geodetic_coord[:,2] = (radius_proj - radius_equat_planet * T_geo_tmp) * np.cos(geodetic_coord[:,1]) + (carcoord_z - B_geo_tmp) * np.sin(geodetic_coord[:,1])
+
+  return geodetic_coord
+
+
 def convert_geodetic_cartesian(config, geodetic_coord):
   #
   # Longitude, Latitude, Altitude coordinate (WGS84) --> Cartesian Coordinate
@@ -117,6 +166,80 @@ def convert_polar_carteasian(config,vec_input,longitude,latitude):
   return vec_res
 
 
+def convert_geodetic_cartesian_array(config, geodetic_coord):
+  #
+  # Same as convert_geodetic_cartesian for (N,3) array of geodetic coordinates, returns (N,3) array
+  #
+  
+  radius_equat_planet = config['planet']['radius']
+  ellipticity_planet  = config['planet']['ellipticity']
+
+  longitude = geodetic_coord[:,0]
+  latitude  = geodetic_coord[:,1]
+  altitude  = geodetic_coord[:,2]
+
+  eccentricity2  = ellipticity_planet*(2.0-ellipticity_planet)
+  altitude_geoid = radius_equat_planet / np.sqrt( 1.0 - eccentricity2 * np.sin( latitude )**2 )
+
+  cartesian_coord = np.empty_like(geodetic_coord, dtype=np.float64)
+  cartesian_coord[:,0] = ( altitude_geoid + altitude ) * np.cos( latitude ) * np.cos( longitude )
+  cartesian_coord[:,1] = ( altitude_geoid + altitude ) * np.cos( latitude ) * np.sin( longitude )
+  cartesian_coord[:,2] = ( altitude_geoid * (1.0 - eccentricity2 ) + altitude ) * np.sin( latitude )
+
+  return cartesian_coord
+
+
+def set_angle_polar_array(config, coord):
+
+  # Same as set_angle_polar for (N,3) array, returns (N,3) array of [radius, beta, alpha]
+  radius = np.sqrt( coord[:,0]**2 + coord[:,1]**2 + coord[:,2]**2 )
+
+  polar_coord = np.empty_like(coord, dtype=np.float64)
+  polar_coord[:,0] = radius
+  polar_coord[:,1] = np.arcsin( coord[:,2]/radius )
+  polar_coord[:,2] = np.arccos( coord[:,0]/np.sqrt( coord[:,0]**2 + coord[:,1]**2 )  ) * np.sign( coord[:,1] )
+
+  return polar_coord
+
+
+def get_rotation_matrix_polar(longitude, latitude):
+
+  # (N,3,3) rotation matrices from the cartesian to the polar components [経度、緯度、高度]
+  # --Same as rotation around z by longitude, around y by -latitude and exchange of axes (convert_carteasian_polar)
+  cos_long = np.cos(longitude)
+  sin_long = np.sin(longitude)
+  cos_lati = np.cos(latitude)
+  sin_lati = np.sin(latitude)
+
+  matrix = np.zeros( (len(cos_long),3,3) )
+  matrix[:,0,0] = -sin_long
+  matrix[:,0,1] =  cos_long
+  matrix[:,1,0] = -sin_lati*cos_long
+  matrix[:,1,1] = -sin_lati*sin_long
+  matrix[:,1,2] =  cos_lati
+  matrix[:,2,0] =  cos_lati*cos_long
+  matrix[:,2,1] =  cos_lati*sin_long
+  matrix[:,2,2] =  sin_lati
+
+  return matrix
+
+
+def convert_carteasian_polar_array(config,vec_input,longitude,latitude):
+
+  # Same as convert_carteasian_polar for (N,3) array of vectors and (N) arrays of angles
+  matrix = get_rotation_matrix_polar(longitude, latitude)
+
+  return np.einsum('nij,nj->ni', matrix, vec_input)
+
+
+def convert_polar_carteasian_array(config,vec_input,longitude,latitude):
+
+  # Same as convert_polar_carteasian for (N,3) array of vectors and (N) arrays of angles (transposed rotation)
+  matrix = get_rotation_matrix_polar(longitude, latitude)
+
+  return np.einsum('nji,nj->ni', matrix, vec_input)
+
+
 def convert_coordinate_rxyz(vec,angle_rot,axis):
   #
   # Coordinate rotation
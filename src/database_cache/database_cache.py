@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Binary cache of the parsed databases (atmosphere and aerodynamic tables)
+# --Columns of a table are stored as the rows of a float64 .npy (memory-mapped on load), other values in .json
+# --Key: hash of the source file and of the parameters used in the derived columns (e.g., characteristic_length);
+#   a new cache is written when the source or the parameters change, and the caches of a former source are removed
+# --Files are replaced atomically, so that the cases of Monte-Carlo simulation can read and write the same cache
+
+import numpy as np
+import os as os
+import glob as glob
+import hashlib as hashlib
+import json as json
+import tempfile as tempfile
+
+# Dict key in config
+KEY_CACHE = 'cache'
+
+# Version of the cache format (included in the key)
+VERSION_CACHE = 2
+
+# Length of the hashes in the filename
+length_key_source    = 16
+length_key_parameter = 8
+
+size_chunk_hash = 1 << 20
+
+
+def get_directory_cache(config):
+
+  config_cache = config.get(KEY_CACHE, None) or {}
+  script_directory = os.path.dirname(os.path.realpath(__file__))
+  if config_cache.get('directory_path_specify', 'default') == 'manual':
+    directory_path = config_cache['directory_cache']
+  else :
+    directory_path = script_directory + '/../../database/cache'
+
+  return directory_path
+
+
+def get_hash_file(filename):
+
+  hash_file = hashlib.sha256()
+  with open(filename, 'rb') as file:
+    for chunk in iter(lambda: file.read(size_chunk_hash), b''):
+      hash_file.update(chunk)
+
+  return hash_file.hexdigest()
+
+
+def get_filename_cache(config, kind, filename_source, parameter_list=[]):
+
+  # Path of the cache without extension (None when the cache is not used)
+  config_cache = config.get(KEY_CACHE, None) or {}
+  if not config_cache.get('flag_cache', False) or not os.path.exists(filename_source) :
+    return None
+
+  key_source    = get_hash_file(filename_source)[0:length_key_source]
+  key_parameter = hashlib.sha256( repr([VERSION_CACHE] + list(parameter_list)).encode() ).hexdigest()[0:length_key_parameter]
+  name_source   = os.path.splitext( os.path.basename(filename_source) )[0]
+
+  return get_directory_cache(config) + '/' + kind + '_' + name_source + '_' + key_source + '_' + key_parameter
+
+
+def read_cache(filename_cache):
+
+  # Dict of the table (None when there is no cache)
+  if filename_cache is None or not os.path.exists(filename_cache + '.json') :
+    return None
+
+  try :
+    with open(filename_cache + '.json') as file:
+      meta_dict = json.load(file)
+    data_array = np.load(filename_cache + '.npy', mmap_mode='r')
+    name_list  = meta_dict['array']
+    if data_array.ndim != 2 or data_array.shape[0] != len(name_list) :
+      raise ValueError('Shape of cache: ' + str(data_array.shape))
+  except (OSError, ValueError, KeyError) as instance:
+    print('--Cache is not read and is written again:', instance)
+    return None
+
+  print('--Reading cache...:', filename_cache + '.npy')
+  data_dict = dict(meta_dict['scalar'])
+  for m in range(0, len(name_list)):
+    data_dict[ name_list[m] ] = data_array[m]
+
+  return data_dict
+
+
+def write_cache(filename_cache, data_dict):
+
+  # Arrays of the same length in data_dict are stored in .npy, the others (int, float, str) in .json
+  if filename_cache is None :
+    return
+
+  name_list   = [ key for key in data_dict if isinstance(data_dict[key], np.ndarray) ]
+  scalar_dict = { key: data_dict[key] for key in data_dict if key not in name_list }
+  meta_dict   = {'version': VERSION_CACHE, 'array': name_list, 'scalar': scalar_dict}
+
+  directory_cache = os.path.dirname(filename_cache)
+  try :
+    os.makedirs(directory_cache, exist_ok=True)
+    data_array = np.array( [ data_dict[key] for key in name_list ], dtype=np.float64 )
+    # .json is written last, since a cache is read only when .json exists
+    write_file_atomic(filename_cache + '.npy', lambda file: np.save(file, data_array, allow_pickle=False), 'wb')
+    write_file_atomic(filename_cache + '.json', lambda file: json.dump(meta_dict, file, indent=2), 'w')
+  except (OSError, TypeError, ValueError) as instance:
+    print('--Cache is not written:', instance)
+    return
+
+  print('--Writing cache...:', filename_cache + '.npy')
+
+  # Caches of a former source file (the same kind and name, another hash)
+  prefix, key_source, key_parameter = filename_cache.rsplit('_', 2)
+  for filename in glob.glob(prefix + '_*_*.json') + glob.glob(prefix + '_*_*.npy'):
+    prefix_tmp, key_source_tmp, key_parameter_tmp = os.path.splitext(filename)[0].rsplit('_', 2)
+    if prefix_tmp == prefix and key_source_tmp != key_source :
+      try :
+        os.remove(filename)
+      except OSError :
+        pass
+
+  return
+
+
+def write_file_atomic(filename, function_write, mode):
+
+  descriptor, filename_tmp = tempfile.mkstemp(dir=os.path.dirname(filename), prefix='.tmp_')
+  try :
+    with os.fdopen(descriptor, mode) as file:
+      function_write(file)
+    os.replace(filename_tmp, filename)
+  except BaseException :
+    if os.path.exists(filename_tmp) :
+      os.remove(filename_tmp)
+    raise
+
+  return
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+# Event detection of Tacode: impact, altitude and Knudsen number crossings, and maximum dynamic pressure
+# --Sign changes of the event functions are bracketed between two integration steps,
+#   and the event time is refined by Brent's method on the cubic Hermite interpolant of the step
+
+import numpy as np
+import coordinate_system.coordinate_system as coordinate_system
+import trajectory_sink.trajectory_sink as trajectory_sink
+from orbital.orbital import orbital
+
+# Dict key in config
+KEY_EVENT = 'event'
+
+# Event names
+EVENT_IMPACT       = 'impact'
+EVENT_ALTITUDE     = 'altitude'
+EVENT_KNUDSEN      = 'knudsen'
+EVENT_PRESSURE_MAX = 'dynamic_pressure_max'
+
+tolerance_time_default = 1.e-6
+number_iteration_max   = 100
+golden_ratio           = 0.5*(3.0 - np.sqrt(5.0))
+tiny_value             = 1.e-300
+
+newline_code = '\n'
+blank_code   = ' '
+
+
+def find_root_brent(function, a, b, fa, fb, tolerance):
+
+  # Zero of function in [a, b] with fa*fb <= 0 (Brent-Dekker: bisection, secant and inverse quadratic interpolation)
+  if fa == 0.0 :
+    return a
+  if fb == 0.0 :
+    return b
+  c, fc = a, fa
+  d = e = b - a
+  for n in range(0, number_iteration_max):
+    if fb*fc > 0.0 :
+      c, fc = a, fa
+      d = e = b - a
+    if abs(fc) < abs(fb) :
+      a, b, c    = b, c, b
+      fa, fb, fc = fb, fc, fb
+    tol = 2.0*np.finfo(float).eps*abs(b) + 0.5*tolerance
+    m   = 0.5*(c - b)
+    if abs(m) <= tol or fb == 0.0 :
+      return b
+    if abs(e) >= tol and abs(fa) > abs(fb) :
+      s = fb/fa
+      if a == c :
+        # Secant
+        p = 2.0*m*s
+        q = 1.0 - s
+      else :
+        # Inverse quadratic interpolation
+        q = fa/fc
+        r = fb/fc
+        p = s*( 2.0*m*q*(q - r) - (b - a)*(r - 1.0) )
+        q = (q - 1.0)*(r - 1.0)*(s - 1.0)
+      if p > 0.0 :
+        q = -q
+      else :
+        p = -p
+      if 2.0*p < min( 3.0*m*q - abs(tol*q), abs(e*q) ) :
+        e = d
+        d = p/q
+      else :
+        d = e = m
+    else :
+      # Bisection
+      d = e = m
+    a, fa = b, fb
+    b = b + ( d if abs(d) > tol else np.copysign(tol, m) )
+    fb = function(b)
+
+  return b
+
+
+def find_maximum_brent(function, a, b, tolerance):
+
+  # Maximum of function in [a, b] (Brent: golden section search and parabolic interpolation)
+  x = w = v = a + golden_ratio*(b - a)
+  fx = fw = fv = -function(x)
+  d = e = 0.0
+  for n in range(0, number_iteration_max):
+    xm   = 0.5*(a + b)
+    tol1 = np.sqrt(np.finfo(float).eps)*abs(x) + tolerance/3.0
+    tol2 = 2.0*tol1
+    if abs(x - xm) <= tol2 - 0.5*(b - a) :
+      break
+    flag_golden = True
+    if abs(e) > tol1 :
+      # Parabola through x, w and v
+      r = (x - w)*(fx - fv)
+      q = (x - v)*(fx - fw)
+      p = (x - v)*q - (x - w)*r
+      q = 2.0*(q - r)
+      if q > 0.0 :
+        p = -p
+      q = abs(q)
+      if abs(p) < abs(0.5*q*e) and p > q*(a - x) and p < q*(b - x) :
+        e = d
+        d = p/q
+        u = x + d
+        if u - a < tol2 or b - u < tol2 :
+          d = np.copysign(tol1, xm - x)
+        flag_golden = False
+    if flag_golden :
+      e = (a - x) if x >= xm else (b - x)
+      d = golden_ratio*e
+    u  = x + ( d if abs(d) >= tol1 else np.copysign(tol1, d) )
+    fu = -function(u)
+    if fu <= fx :
+      if u >= x :
+        a = x
+      else :
+        b = x
+      v, w, x    = w, x, u
+      fv, fw, fx = fw, fx, fu
+    else :
+      if u < x :
+        a = u
+      else :
+        b = u
+      if fu <= fw or w == x :
+        v, w   = w, u
+        fv, fw = fw, fu
+      elif fu <= fv or v == x or v == w :
+        v, fv = u, fu
+
+  return x
+
+
+def interpolate_hermite(sample_0, sample_1, time_tmp):
+
+  # State at time_tmp by the cubic Hermite interpolant of the state y and its derivative f at the ends of a step
+  delta = sample_1['time'] - sample_0['time']
+  theta = (time_tmp - sample_0['time'])/delta
+  h00 = (1.0 + 2.0*theta)*(1.0 - theta)**2
+  h10 = theta*(1.0 - theta)**2
+  h01 = theta**2*(3.0 - 2.0*theta)
+  h11 = theta**2*(theta - 1.0)
+
+  return h00*sample_0['y'] + h10*delta*sample_0['f'] + h01*sample_1['y'] + h11*delta*sample_1['f']
+
+
+class event_detector:
+  #
+  # Event functions are evaluated at the end of every integration step (check)
+  # --Altitude thresholds and impact: geodetic altitude - threshold
+  # --Knudsen number thresholds: log(Kn) - log(threshold)
+  # --Maximum dynamic pressure: bracketed by three samples, refined by Brent's maximization
+  #   (local maxima lower than the maximum already found are not written)
+  # --Impact is terminal: check returns the time and state at impact, and the step is cut there
+  # --Events are written to event: filename_output (in post_process: directory_output) as they are found,
+  #   with event: flag_output (detection and the cut at impact do not depend on it)
+  #
+
+  def __init__(self, config, get_stage_property, force_model):
+
+    config_event = config.get(KEY_EVENT, None) or {}
+    self.flag_detection     = config_event.get('flag_detection', False)
+    self.flag_output        = config_event.get('flag_output', True)
+    self.config             = config
+    self.get_stage_property = get_stage_property
+    self.force_model        = force_model
+    self.tolerance_time     = float( config_event.get('tolerance_time', tolerance_time_default) )
+    self.flag_pressure_max  = config_event.get('flag_dynamic_pressure_max', False)
+    self.filename           = config['post_process']['directory_output'] + '/' + config_event.get('filename_output', 'events.dat')
+
+    # Event functions: name and threshold
+    # --Altitude in m, Knudsen number in log
+    self.function_list = [ (EVENT_IMPACT, EVENT_ALTITUDE, 0.0) ]
+    for altitude in config_event.get('altitude_threshold', None) or [] :
+      self.function_list.append( (EVENT_ALTITUDE+'_'+str(altitude)+'km', EVENT_ALTITUDE, float(altitude)*orbital.km2m) )
+    for knudsen in config_event.get('knudsen_threshold', None) or [] :
+      self.function_list.append( (EVENT_KNUDSEN+'_'+str(knudsen), EVENT_KNUDSEN, np.log(float(knudsen))) )
+
+    self.sample_list  = []
+    self.number_event = 0
+    self.pressure_max = 0.0
+    self.file         = None
+
+    return
+
+
+  def get_sample(self, time_tmp, y_tmp, f_tmp=None):
+
+    # Event function values, dynamic pressure and state at time_tmp
+    coord_geod, density, temperature, knudsen, cdmean = self.get_stage_property(y_tmp[0:3])
+    value_list = []
+    for name, kind, threshold in self.function_list:
+      if kind == EVENT_ALTITUDE :
+        value_list.append( coord_geod[2] - threshold )
+      else :
+        value_list.append( np.log( max(knudsen, tiny_value) ) - threshold )
+    pressure = 0.5*density*np.dot(y_tmp[3:6], y_tmp[3:6])
+
+    return {'time': time_tmp, 'y': np.array(y_tmp, dtype=np.float64), 'f': f_tmp, 'value': np.array(value_list), 'pressure': pressure,
+            'property': (coord_geod, density, temperature, knudsen)}
+
+
+  def get_derivative(self, sample):
+
+    # dy/dt at the sample (evaluated only when an event is bracketed, unless given by the time scheme)
+    if sample['f'] is None :
+      y_tmp = sample['y']
+      coord_geod, density, temperature, knudsen, cdmean = self.get_stage_property(y_tmp[0:3])
+      force_total = self.force_model.acceleration(y_tmp[0:3].tolist(), y_tmp[3:6].tolist(), cdmean, density)
+      sample['f'] = np.array( [ y_tmp[3], y_tmp[4], y_tmp[5], force_total[0], force_total[1], force_total[2] ] )
+
+    return sample['f']
+
+
+  def interpolate(self, time_tmp):
+
+    # State at time_tmp in the last two steps
+    if len(self.sample_list) == 3 and time_tmp < self.sample_list[1]['time'] :
+      sample_0, sample_1 = self.sample_list[0], self.sample_list[1]
+    else :
+      sample_0, sample_1 = self.sample_list[-2], self.sample_list[-1]
+    self.get_derivative(sample_0)
+    self.get_derivative(sample_1)
+
+    return interpolate_hermite(sample_0, sample_1, time_tmp)
+
+
+  def initialize(self, time_tmp, y_tmp, f_tmp=None, flag_restart=False):
+
+    if not self.flag_detection :
+      return
+    self.sample_list = [ self.get_sample(time_tmp, y_tmp, f_tmp) ]
+    if not self.flag_output :
+      return
+
+    # Restart: events up to time_tmp are kept (header: 2 lines), and the maximum dynamic pressure is read from them
+    if flag_restart :
+      number_row = trajectory_sink.truncate_restart(self.filename, 2, check_row=lambda line: float( line.split()[1] ) <= time_tmp)
+      if number_row is not None :
+        with open(self.filename, 'r') as file:
+          for line in file.readlines()[2:]:
+            if line.split()[0] == EVENT_PRESSURE_MAX :
+              self.pressure_max = max( self.pressure_max, float( line.split()[-1] ) )
+        self.file = open(self.filename, 'a')
+        return
+
+    self.file = open(self.filename, 'w')
+    self.file.write('# Events: Tacode' + newline_code)
+    self.file.write('Variables = Event,' + ','.join(orbital.variable_tecplot) + ',DynPres[Pa]' + newline_code)
+    self.file.flush()
+
+    return
+
+
+  def check(self, time_tmp, y_tmp, f_tmp=None):
+
+    # Events in the step ending at time_tmp
+    # --Returns (time, state) of impact, or None
+    if not self.flag_detection :
+      return None
+
+    sample_0 = self.sample_list[-1]
+    sample_1 = self.get_sample(time_tmp, y_tmp, f_tmp)
+    self.sample_list = self.sample_list[-2:] + [sample_1]
+
+    event_list = []
+    for m in np.flatnonzero( sample_0['value']*sample_1['value'] <= 0.0 ):
+      name, kind, threshold = self.function_list[m]
+      if sample_0['value'][m] == 0.0 :
+        # Counted at the previous step
+        continue
+      flag_increase = sample_1['value'][m] > sample_0['value'][m]
+      if name == EVENT_IMPACT :
+        if flag_increase :
+          continue
+      elif kind == EVENT_ALTITUDE :
+        name = name + ( '_ascending' if flag_increase else '_descending' )
+      else :
+        name = name + ( '_increasing' if flag_increase else '_decreasing' )
+      function = lambda t: self.get_sample( t, self.interpolate(t) )['value'][m]
+      time_event = find_root_brent(function, sample_0['time'], sample_1['time'], sample_0['value'][m], sample_1['value'][m], self.tolerance_time)
+      event_list.append( (time_event, name) )
+
+    # Maximum dynamic pressure between the first and last of three samples
+    if self.flag_pressure_max and len(self.sample_list) == 3 :
+      pressure_list = [ sample['pressure'] for sample in self.sample_list ]
+      if pressure_list[1] > pressure_list[0] and pressure_list[1] >= pressure_list[2] and pressure_list[1] > self.pressure_max :
+        function = lambda t: self.get_sample( t, self.interpolate(t) )['pressure']
+        time_event = find_maximum_brent(function, self.sample_list[0]['time'], self.sample_list[2]['time'], self.tolerance_time)
+        event_list.append( (time_event, EVENT_PRESSURE_MAX) )
+
+    # Events up to impact in order of time
+    state_impact = None
+    for time_event, name in sorted(event_list):
+      y_event = self.interpolate(time_event)
+      self.write_event(name, time_event, y_event)
+      if name == EVENT_PRESSURE_MAX :
+        self.pressure_max = max( self.pressure_max, self.get_sample(time_event, y_event)['pressure'] )
+      if name == EVENT_IMPACT :
+        state_impact = (time_event, y_event)
+        break
+
+    return state_impact
+
+
+  def write_event(self, name, time_tmp, y_tmp):
+
+    # Same columns as the Tecplot output and dynamic pressure
+    sample = self.get_sample(time_tmp, y_tmp)
+    coord_geod, density, temperature, knudsen = sample['property']
+    if self.file is not None :
+      coord_polar = coordinate_system.set_angle_polar(self.config, y_tmp[0:3])
+      veloc_polar = coordinate_system.convert_carteasian_polar(self.config, y_tmp[3:6], coord_polar[2], coord_polar[1])
+      coordinate_dict = {'cartesian': y_tmp[0:3].reshape(1,3), 'geodetic': np.reshape(coord_geod, (1,3))}
+      velocity_dict   = {'polar': np.reshape(veloc_polar, (1,3))}
+      trajectory_dict = {'time': np.array([time_tmp]), 'density': np.array([density]), 'temperature': np.array([temperature]), 'knudsen': np.array([knudsen])}
+      variable_array  = trajectory_sink.get_tecplot_variable(np.zeros(1, dtype=np.int64), coordinate_dict, velocity_dict, trajectory_dict, 1)
+      self.file.write( name + blank_code + blank_code.join( [ '%.16e' % value for value in variable_array[0] ] ) + blank_code + '%.16e' % sample['pressure'] + newline_code )
+      self.file.flush()
+    self.number_event += 1
+    print('Event:', name, ', time (s):', '{:.6f}'.format(time_tmp), ', altitude (km):', '{:.6f}'.format(coord_geod[2]*orbital.m2km))
+
+    return
+
+
+  def close(self):
+
+    if self.file is not None :
+      self.file.close()
+      self.file = None
+      print('Events written:', self.number_event, ', file:', self.filename)
+
+    return
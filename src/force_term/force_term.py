@@ -4,7 +4,9 @@
 # Date: 2022/05/23
 
 import numpy as np
+import math as math
 from orbital.orbital import orbital
+import satellite.satellite as satellite
 
 
 def force_initialsettings(config):
@@ -14,7 +16,30 @@ def force_initialsettings(config):
   return force
 
 
-def force_routine(config, coordinate, velocity, mass_satellite, area_satellite, cdmean_aerodynamic, density_factor, density, force):
+def get_direction_lift(x, y, z, vx, vy, vz):
+
+  # Unit vectors of lift and side force (None for the flow parallel to the radial direction)
+  # --Lift: radial direction (r/|r|) perpendicular to the velocity relative to the atmosphere U
+  # --Side force: U/|U| x lift, so that (drag, side force, lift) are right-handed axes
+  speed  = math.sqrt( vx*vx + vy*vy + vz*vz )
+  radius = math.sqrt( x*x + y*y + z*z )
+  if speed == 0.0 or radius == 0.0 :
+    return None
+  ux, uy, uz = vx/speed, vy/speed, vz/speed
+  rx, ry, rz = x/radius, y/radius, z/radius
+
+  dot = rx*ux + ry*uy + rz*uz
+  lx, ly, lz = rx - dot*ux, ry - dot*uy, rz - dot*uz
+  norm_lift  = math.sqrt( lx*lx + ly*ly + lz*lz )
+  if norm_lift == 0.0 :
+    return None
+  lx, ly, lz = lx/norm_lift, ly/norm_lift, lz/norm_lift
+
+  return lx, ly, lz, uy*lz - uz*ly, uz*lx - ux*lz, ux*ly - uy*lx
+
+
+def force_routine(config, coordinate, velocity, mass_satellite, area_satellite, cdmean_aerodynamic, density_factor, density, force,
+                  side_aerodynamic=0.0, lift_aerodynamic=0.0):
   
   potential_factor     = config['planet']['potential_factor']
   radius_equat_planet  = config['planet']['radius']
@@ -82,6 +107,13 @@ def force_routine(config, coordinate, velocity, mass_satellite, area_satellite,
   force[4,1] = -fact_aero * velocity[1]
   force[4,2] = -fact_aero * velocity[2]
 
+  # Side force and lift (F = 1/2 rho U^2 * direction)
+  if side_aerodynamic != 0.0 or lift_aerodynamic != 0.0 :
+    direction = get_direction_lift(*[ float(v) for v in coordinate ], *[ float(v) for v in velocity ])
+    if direction is not None :
+      fact_lift  = 0.50*density_factor*density*velocity_mag**2*area_satellite/mass_satellite
+      force[4,:] = force[4,:] + fact_lift*( lift_aerodynamic*np.array(direction[0:3]) + side_aerodynamic*np.array(direction[3:6]) )
+
 
   #print(force[1,:],force[2,:],force[3,:])
 
@@ -91,3 +123,258 @@ def force_routine(config, coordinate, velocity, mass_satellite, area_satellite,
 
   return force
 
+
+class force_model:
+  #
+  # Same force terms as force_routine with the planet constants bound once from config
+  # --acceleration(): total acceleration (m/s2) as a tuple of floats, the kernel called at every stage
+  # --acceleration_component(): per-component array as force_routine, 0:total, 1:gravity, 2:Coriolis, 3:centrifugal, 4:aerodynamic
+  # --acceleration_array(): total acceleration for (N,3) arrays of coordinate and velocity (ensemble)
+  # --With satellite: flag_lift, the aerodynamic coefficient is the tuple (drag, side force, lift) of aerodynamic_table.evaluate_vector,
+  #   and acceleration() is acceleration_lift()
+  #
+
+  def __init__(self, config):
+
+    potential_factor = config['planet']['potential_factor']
+
+    self.radius_equat   = config['planet']['radius']
+    self.gm_planet      = config['planet']['gravitational_constant']*config['planet']['mass']
+    self.rotation_rate  = config['planet']['rotation_rate']
+    self.rotation_rate2 = self.rotation_rate**2
+    self.coriolis_fact  = 2.0*self.rotation_rate
+
+    self.J2  = potential_factor['J2']
+    self.J22 = potential_factor['J22']
+    self.J3  = potential_factor['J3']
+    self.J4  = potential_factor['J4']
+    labd22   = potential_factor['Lambda22']*orbital.deg2rad
+    self.sin_2labd22 = math.sin( 2.0*labd22 )
+    self.cos_2labd22 = math.cos( 2.0*labd22 )
+
+    self.set_satellite_property(config['satellite']['mass'], config['satellite']['characteristic_area'], config['initial_settings']['density_factor'][0])
+
+    # Lift and side force
+    self.flag_lift = satellite.get_flag_lift(config)
+    if self.flag_lift :
+      self.acceleration = self.acceleration_lift
+
+    return
+
+
+  def set_satellite_property(self, mass_satellite, area_satellite, density_factor):
+
+    # Aerodynamic acceleration = - aero_fact * rho * CD * |U| * U
+    self.mass_satellite = mass_satellite
+    self.area_satellite = area_satellite
+    self.density_factor = density_factor
+    self.aero_fact      = 0.50*density_factor*area_satellite/mass_satellite
+
+    return
+
+
+  def acceleration_gravity(self, x, y, z):
+
+    radius2   = x*x + y*y + z*z
+    radius    = math.sqrt( radius2 )
+    radius_xy = math.sqrt( x*x + y*y )
+
+    ae_r  = self.radius_equat/radius    # a_e/r
+    ae_r2 = ae_r*ae_r
+    ae_r3 = ae_r2*ae_r
+    ae_r4 = ae_r2*ae_r2
+    gm_r2 = self.gm_planet/radius2      # G*M_e/r2
+
+    sin_beta  = z/radius
+    cos_beta  = radius_xy/radius
+    sin_beta2 = sin_beta*sin_beta
+
+    # Longitude from x/y directly
+    if radius_xy > 0.0 :
+      cos_labd = x/radius_xy
+      sin_labd = y/radius_xy
+    else :
+      cos_labd = 1.0
+      sin_labd = 0.0
+    sin_2labd = 2.0*sin_labd*cos_labd
+    cos_2labd = cos_labd*cos_labd - sin_labd*sin_labd
+    sin_2labd_labd22 = sin_2labd*self.cos_2labd22 + cos_2labd*self.sin_2labd22
+    cos_2labd_labd22 = cos_2labd*self.cos_2labd22 - sin_2labd*self.sin_2labd22
+
+    J2_term  = ae_r2*self.J2
+    J22_term = ae_r2*self.J22*cos_2labd_labd22
+    J3_term  = ae_r3*self.J3
+    J4_term  = ae_r4*self.J4
+
+    force_g_r = gm_r2 * (- 1.0                                                            \
+                         + 1.5    *J2_term *( 3.0*sin_beta2 -  1.0 )                      \
+                         + 9.0    *J22_term*( cos_beta*cos_beta )                         \
+                         + 2.0    *J3_term *( 5.0*sin_beta2 -  3.0 )*sin_beta             \
+                         + 5.0/8.0*J4_term *( (35.0*sin_beta2 - 30.0)*sin_beta2 + 3.0 )   \
+                        )
+    force_g_a = gm_r2 * (  6.0    *ae_r2*self.J22*cos_beta*sin_2labd_labd22 )
+    force_g_b = gm_r2 * ( - 3.0   *J2_term *( sin_beta*cos_beta )                         \
+                          + 6.0   *J22_term*( sin_beta*cos_beta )                         \
+                          - 0.5   *J3_term *( 15.0*sin_beta2 -  3.0 )*cos_beta            \
+                          - 0.5   *J4_term *( 35.0*sin_beta2 - 15.0 )*sin_beta*cos_beta   \
+                        )
+
+    force_g_h = force_g_r*cos_beta - force_g_b*sin_beta
+
+    return force_g_h*cos_labd - force_g_a*sin_labd, force_g_h*sin_labd + force_g_a*cos_labd, force_g_r*sin_beta + force_g_b*cos_beta
+
+
+  def acceleration(self, coordinate, velocity, cdmean_aerodynamic, density):
+
+    # coordinate, velocity: sequences of three floats (e.g., ndarray.tolist())
+    x, y, z    = coordinate
+    vx, vy, vz = velocity
+
+    # Gravitational force
+    gx, gy, gz = self.acceleration_gravity(x, y, z)
+
+    # Aerodynamic (Fx = 1/2 rho U^2 * Ux/U)
+    fact_aero = self.aero_fact*density*cdmean_aerodynamic*math.sqrt( vx*vx + vy*vy + vz*vz )
+
+    # Total: gravity + Coriolis + centrifugal + aerodynamic
+    ax = gx + self.coriolis_fact*vy + self.rotation_rate2*x - fact_aero*vx
+    ay = gy - self.coriolis_fact*vx + self.rotation_rate2*y - fact_aero*vy
+    az = gz                                                 - fact_aero*vz
+
+    return ax, ay, az
+
+
+  def acceleration_lift(self, coordinate, velocity, coefficient_aerodynamic, density):
+
+    # Same as acceleration() with side force and lift, coefficient_aerodynamic: (drag, side force, lift)
+    cdmean, side, lift = coefficient_aerodynamic
+    ax, ay, az = force_model.acceleration(self, coordinate, velocity, cdmean, density)
+    if side == 0.0 and lift == 0.0 :
+      return ax, ay, az
+
+    x, y, z    = coordinate
+    vx, vy, vz = velocity
+    direction  = get_direction_lift(x, y, z, vx, vy, vz)
+    if direction is None :
+      return ax, ay, az
+    lx, ly, lz, sx, sy, sz = direction
+
+    fact_lift = self.aero_fact*density*( vx*vx + vy*vy + vz*vz )
+
+    return ax + fact_lift*( lift*lx + side*sx ), ay + fact_lift*( lift*ly + side*sy ), az + fact_lift*( lift*lz + side*sz )
+
+
+  def acceleration_component(self, coordinate, velocity, cdmean_aerodynamic, density):
+
+    x, y, z    = [ float(v) for v in coordinate ]
+    vx, vy, vz = [ float(v) for v in velocity ]
+    side = lift = 0.0
+    if isinstance(cdmean_aerodynamic, tuple) :
+      cdmean_aerodynamic, side, lift = cdmean_aerodynamic
+
+    force = np.zeros(5*3).reshape(5,3)
+    force[1,:] = self.acceleration_gravity(x, y, z)
+    force[2,:] = [ self.coriolis_fact*vy, -self.coriolis_fact*vx, 0.0 ]
+    force[3,:] = [ self.rotation_rate2*x, self.rotation_rate2*y, 0.0 ]
+    fact_aero  = self.aero_fact*density*cdmean_aerodynamic*math.sqrt( vx*vx + vy*vy + vz*vz )
+    force[4,:] = [ -fact_aero*vx, -fact_aero*vy, -fact_aero*vz ]
+    direction  = get_direction_lift(x, y, z, vx, vy, vz)
+    if direction is not None and ( side != 0.0 or lift != 0.0 ) :
+      fact_lift  = self.aero_fact*density*( vx*vx + vy*vy + vz*vz )
+      force[4,:] = force[4,:] + fact_lift*( lift*np.array(direction[0:3]) + side*np.array(direction[3:6]) )
+    force[0,:] = force[1,:] + force[2,:] + force[3,:] + force[4,:]
+
+    return force
+
+
+  def acceleration_array(self, coordinate, velocity, cdmean_aerodynamic, density, aero_fact=None, side_aerodynamic=None, lift_aerodynamic=None):
+
+    # coordinate, velocity: (N,3) arrays, cdmean_aerodynamic, density, aero_fact: (N) arrays or scalars
+    # aero_fact: 0.5*density_factor*area/mass of each member (default: the bound satellite)
+    # side_aerodynamic, lift_aerodynamic: side force and lift coefficients (default: drag only)
+    if aero_fact is None :
+      aero_fact = self.aero_fact
+
+    x  = coordinate[:,0]
+    y  = coordinate[:,1]
+    z  = coordinate[:,2]
+    vx = velocity[:,0]
+    vy = velocity[:,1]
+    vz = velocity[:,2]
+
+    radius2   = x*x + y*y + z*z
+    radius    = np.sqrt( radius2 )
+    radius_xy = np.sqrt( x*x + y*y )
+
+    ae_r  = self.radius_equat/radius
+    ae_r2 = ae_r*ae_r
+    ae_r3 = ae_r2*ae_r
+    ae_r4 = ae_r2*ae_r2
+    gm_r2 = self.gm_planet/radius2
+
+    sin_beta  = z/radius
+    cos_beta  = radius_xy/radius
+    sin_beta2 = sin_beta*sin_beta
+
+    flag_axis = ( radius_xy > 0.0 )
+    radius_xy_safe = np.where(flag_axis, radius_xy, 1.0)
+    cos_labd  = np.where(flag_axis, x/radius_xy_safe, 1.0)
+    sin_labd  = np.where(flag_axis, y/radius_xy_safe, 0.0)
+    sin_2labd = 2.0*sin_labd*cos_labd
+    cos_2labd = cos_labd*cos_labd - sin_labd*sin_labd
+    sin_2labd_labd22 = sin_2labd*self.cos_2labd22 + cos_2labd*self.sin_2labd22
+    cos_2labd_labd22 = cos_2labd*self.cos_2labd22 - sin_2labd*self.sin_2labd22
+
+    J2_term  = ae_r2*self.J2
+    J22_term = ae_r2*self.J22*cos_2labd_labd22
+    J3_term  = ae_r3*self.J3
+    J4_term  = ae_r4*self.J4
+
+    force_g_r = gm_r2 * (- 1.0                                                            \
+                         + 1.5    *J2_term *( 3.0*sin_beta2 -  1.0 )                      \
+                         + 9.0    *J22_term*( cos_beta*cos_beta )                         \
+                         + 2.0    *J3_term *( 5.0*sin_beta2 -  3.0 )*sin_beta             \
+                         + 5.0/8.0*J4_term *( (35.0*sin_beta2 - 30.0)*sin_beta2 + 3.0 )   \
+                        )
+    force_g_a = gm_r2 * (  6.0    *ae_r2*self.J22*cos_beta*sin_2labd_labd22 )
+    force_g_b = gm_r2 * ( - 3.0   *J2_term *( sin_beta*cos_beta )                         \
+                          + 6.0   *J22_term*( sin_beta*cos_beta )                         \
+                          - 0.5   *J3_term *( 15.0*sin_beta2 -  3.0 )*cos_beta            \
+                          - 0.5   *J4_term *( 35.0*sin_beta2 - 15.0 )*sin_beta*cos_beta   \
+                        )
+    force_g_h = force_g_r*cos_beta - force_g_b*sin_beta
+
+    fact_aero = aero_fact*density*cdmean_aerodynamic*np.sqrt( vx*vx + vy*vy + vz*vz )
+
+    acceleration = np.empty_like(coordinate, dtype=np.float64)
+    acceleration[:,0] = force_g_h*cos_labd - force_g_a*sin_labd + self.coriolis_fact*vy + self.rotation_rate2*x - fact_aero*vx
+    acceleration[:,1] = force_g_h*sin_labd + force_g_a*cos_labd - self.coriolis_fact*vx + self.rotation_rate2*y - fact_aero*vy
+    acceleration[:,2] = force_g_r*sin_beta + force_g_b*cos_beta                                                 - fact_aero*vz
+
+    if side_aerodynamic is not None or lift_aerodynamic is not None :
+      acceleration += self.acceleration_lift_array(coordinate, velocity, side_aerodynamic, lift_aerodynamic, density, aero_fact)
+
+    return acceleration
+
+
+  def acceleration_lift_array(self, coordinate, velocity, side_aerodynamic, lift_aerodynamic, density, aero_fact):
+
+    # (N,3) acceleration of side force and lift (directions as get_direction_lift, zero where they are not defined)
+    side_aerodynamic = 0.0 if side_aerodynamic is None else side_aerodynamic
+    lift_aerodynamic = 0.0 if lift_aerodynamic is None else lift_aerodynamic
+
+    speed2 = np.einsum('ij,ij->i', velocity, velocity)
+    speed  = np.sqrt(speed2)
+    radius = np.linalg.norm(coordinate, axis=1)
+    direction_flow   = velocity/np.where(speed > 0.0, speed, 1.0)[:,None]
+    direction_radial = coordinate/np.where(radius > 0.0, radius, 1.0)[:,None]
+
+    direction_lift = direction_radial - np.einsum('ij,ij->i', direction_radial, direction_flow)[:,None]*direction_flow
+    norm_lift      = np.linalg.norm(direction_lift, axis=1)
+    flag_defined   = ( speed > 0.0 ) & ( norm_lift > 0.0 )
+    direction_lift = direction_lift/np.where(flag_defined, norm_lift, 1.0)[:,None]
+    direction_side = np.cross(direction_flow, direction_lift)
+
+    fact_lift = np.where(flag_defined, aero_fact*density*speed2, 0.0)
+
+    return fact_lift[:,None]*( np.asarray(lift_aerodynamic)[...,None]*direction_lift + np.asarray(side_aerodynamic)[...,None]*direction_side )
@@ -3,9 +3,6 @@
 # Author: Y.Takahashi, Hokkaido University
 # Date: 2022/03/31
 
-import matplotlib
-#matplotlib.use('Agg')
-#import matplotlib.pyplot as plt
 import numpy as np
 
 
@@ -19,6 +16,8 @@ class general:
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('-file', action='store', type=str, default=filename_default)
+    # Import time of each module (read from sys.argv before the imports, see profiler.import_profiler)
+    parser.add_argument('--profile-startup', action='store_true', dest='profile_startup')
     args = parser.parse_args()
     return args
 
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+
+# Orbit-averaged lifetime propagation of Tacode
+# --Mean orbital elements [a, e, i, RAAN, argument of perigee, mean anomaly] in the inertial frame
+#   (coincident with the planet-fixed frame at time zero) are integrated by RK4 with steps of several revolutions
+# --Drag: Gauss's equations for a and e averaged over number_node points per revolution (density at the geodetic altitude,
+#   velocity relative to the co-rotating atmosphere)
+# --J2: secular rates of RAAN, argument of perigee and mean anomaly
+# --Mean elements are the osculating elements averaged over one revolution of the J2 problem (numerical averaging):
+#   the short-period J2 variation is removed from the initial state and added back at the handoff
+
+import numpy as np
+import atmosphere.atmosphere as atmosphere
+import coordinate_system.coordinate_system as coordinate_system
+import force_term.force_term as force_term
+import satellite.satellite as satellite
+import progress.progress as progress
+from orbital.orbital import orbital
+import trajectory.trajectory as trajectory_module
+
+# Dict key in config
+KEY_LIFETIME = 'lifetime'
+
+# Index of the elements
+INDEX_A     = 0
+INDEX_E     = 1
+INDEX_I     = 2
+INDEX_RAAN  = 3
+INDEX_ARGP  = 4
+INDEX_M     = 5
+
+# Default settings
+altitude_handoff_default        = 150.0
+number_node_default             = 36
+number_revolution_step_default  = 10
+altitude_change_maximum_default = 1.0
+second2day   = 1.0/86400.0
+eccentricity_minimum = 1.e-10
+# Averaging over one revolution: RK4 steps per revolution and fixed-point iterations of the inverse (mean --> osculating)
+number_step_average      = 360
+number_iteration_average = 4
+
+variable_lifetime = ['Time[s]','Time[day]','A[km]','Ecc','Inc[deg.]','Raan[deg.]','Argp[deg.]','Mean[deg.]','AltiMin[km]','AltiMax[km]']
+
+newline_code = '\n'
+blank_code   = ' '
+
+header_progress = 'Time elapsed (day):, Semi-major axis (km), Eccentricity, Perigee altitude (km)'
+
+
+def get_element(gm_planet, coord, veloc):
+
+  # Osculating elements [a, e, i, RAAN, argp, M] of an inertial state
+  h_vector = np.cross(coord, veloc)
+  e_vector = np.cross(veloc, h_vector)/gm_planet - coord/np.linalg.norm(coord)
+  semimajor = 1.0/( 2.0/np.linalg.norm(coord) - np.dot(veloc, veloc)/gm_planet )
+  n_hat, m_hat, h_hat = get_frame_node(h_vector)
+  arg_latitude = np.arctan2( np.dot(coord, m_hat), np.dot(coord, n_hat) )
+
+  return get_element_vector(semimajor, e_vector, h_vector, arg_latitude)
+
+
+def get_frame_node(h_vector):
+
+  # Unit vectors to the ascending node and 90 deg. ahead in the orbital plane (node along x for equatorial orbit)
+  h_hat = h_vector/np.linalg.norm(h_vector)
+  n_vector = np.array( [-h_hat[1], h_hat[0], 0.0] )
+  n_norm   = np.linalg.norm(n_vector)
+  if n_norm > 0.0 :
+    n_hat = n_vector/n_norm
+  else :
+    n_hat = np.array([1.0, 0.0, 0.0])
+
+  return n_hat, np.cross(h_hat, n_hat), h_hat
+
+
+def get_element_vector(semimajor, e_vector, h_vector, arg_latitude):
+
+  # Elements from a, eccentricity vector, angular momentum (direction) and argument of latitude (true)
+  n_hat, m_hat, h_hat = get_frame_node(h_vector)
+  e_node = np.array( [np.dot(e_vector, n_hat), np.dot(e_vector, m_hat)] )
+  eccentricity = np.linalg.norm(e_node)
+  inclination  = np.arccos( np.clip(h_hat[2], -1.0, 1.0) )
+  raan         = np.arctan2(n_hat[1], n_hat[0])
+
+  # Argument of perigee (zero for circular orbit)
+  if eccentricity > eccentricity_minimum :
+    arg_perigee = np.arctan2(e_node[1], e_node[0])
+  else :
+    arg_perigee = 0.0
+  anomaly_true = arg_latitude - arg_perigee
+  anomaly_ecc  = 2.0*np.arctan2( np.sqrt(1.0-eccentricity)*np.sin(0.5*anomaly_true), np.sqrt(1.0+eccentricity)*np.cos(0.5*anomaly_true) )
+  anomaly_mean = anomaly_ecc - eccentricity*np.sin(anomaly_ecc)
+
+  return np.array( [semimajor, eccentricity, inclination, raan, arg_perigee, anomaly_mean] )
+
+
+def get_state(gm_planet, element, anomaly_ecc):
+
+  # Inertial states (N,3) at eccentric anomalies (N)
+  semimajor, eccentricity, inclination, raan, arg_perigee = element[0:5]
+  anomaly_ecc = np.atleast_1d(anomaly_ecc)
+  cos_e = np.cos(anomaly_ecc)
+  sin_e = np.sin(anomaly_ecc)
+  eta   = np.sqrt(1.0 - eccentricity**2)
+  radius = semimajor*(1.0 - eccentricity*cos_e)
+
+  # Perifocal frame
+  coord_p = np.stack( [ semimajor*(cos_e - eccentricity), semimajor*eta*sin_e ], axis=1 )
+  veloc_p = np.sqrt(gm_planet*semimajor)/radius[:,None]*np.stack( [ -sin_e, eta*cos_e ], axis=1 )
+
+  # Perifocal --> inertial (first two columns of R3(-RAAN) R1(-i) R3(-argp))
+  cos_o, sin_o = np.cos(raan), np.sin(raan)
+  cos_w, sin_w = np.cos(arg_perigee), np.sin(arg_perigee)
+  cos_i, sin_i = np.cos(inclination), np.sin(inclination)
+  rotation = np.array( [ [ cos_o*cos_w - sin_o*sin_w*cos_i, -cos_o*sin_w - sin_o*cos_w*cos_i ],
+                         [ sin_o*cos_w + cos_o*sin_w*cos_i, -sin_o*sin_w + cos_o*cos_w*cos_i ],
+                         [ sin_w*sin_i,                      cos_w*sin_i                     ] ] )
+
+  return coord_p @ rotation.T, veloc_p @ rotation.T, radius
+
+
+def solve_kepler(anomaly_mean, eccentricity):
+
+  # Eccentric anomaly by Newton's method
+  anomaly_ecc = anomaly_mean + eccentricity*np.sin(anomaly_mean)
+  for n in range(0, 50):
+    delta = ( anomaly_ecc - eccentricity*np.sin(anomaly_ecc) - anomaly_mean )/( 1.0 - eccentricity*np.cos(anomaly_ecc) )
+    anomaly_ecc = anomaly_ecc - delta
+    if abs(delta) < 1.e-14 :
+      break
+
+  return anomaly_ecc
+
+
+def get_state_element(gm_planet, element):
+
+  # Inertial state of the elements at the mean anomaly
+  anomaly_ecc = solve_kepler( np.mod(element[INDEX_M], 2.0*np.pi), element[INDEX_E] )
+  coord, veloc, radius = get_state(gm_planet, element, anomaly_ecc)
+
+  return coord[0], veloc[0]
+
+
+def get_acceleration_j2(gm_planet, j2_factor, coord):
+
+  # Two-body and J2 acceleration in the inertial frame
+  radius2 = np.dot(coord, coord)
+  radius  = np.sqrt(radius2)
+  factor_z = 5.0*coord[2]**2/radius2
+  factor   = 1.5*gm_planet*j2_factor/radius**5
+
+  return -gm_planet/radius**3*coord + factor*coord*np.array( [factor_z - 1.0, factor_z - 1.0, factor_z - 3.0] )
+
+
+def get_element_mean(gm_planet, j2_factor, coord, veloc):
+
+  # Mean elements: osculating elements averaged over one revolution centred at the state (J2 problem, RK4)
+  # --a, eccentricity vector, angular momentum and argument of latitude (unwrapped) are averaged (trapezoidal rule),
+  #   so that circular and equatorial orbits are not singular
+  semimajor  = get_element(gm_planet, coord, veloc)[INDEX_A]
+  delta_time = 2.0*np.pi*np.sqrt(semimajor**3/gm_planet)/number_step_average
+  number_half = number_step_average//2
+
+  state_list = [ (coord, veloc) ]
+  for direction in [-1.0, 1.0]:
+    coord_tmp, veloc_tmp = coord, veloc
+    dt = direction*delta_time
+    for n in range(0, number_half):
+      k1_r = veloc_tmp;                   k1_v = get_acceleration_j2(gm_planet, j2_factor, coord_tmp)
+      k2_r = veloc_tmp + 0.5*dt*k1_v;     k2_v = get_acceleration_j2(gm_planet, j2_factor, coord_tmp + 0.5*dt*k1_r)
+      k3_r = veloc_tmp + 0.5*dt*k2_v;     k3_v = get_acceleration_j2(gm_planet, j2_factor, coord_tmp + 0.5*dt*k2_r)
+      k4_r = veloc_tmp + dt*k3_v;         k4_v = get_acceleration_j2(gm_planet, j2_factor, coord_tmp + dt*k3_r)
+      coord_tmp = coord_tmp + dt*( k1_r + 2.0*k2_r + 2.0*k3_r + k4_r )/6.0
+      veloc_tmp = veloc_tmp + dt*( k1_v + 2.0*k2_v + 2.0*k3_v + k4_v )/6.0
+      if direction < 0.0 :
+        state_list.insert(0, (coord_tmp, veloc_tmp))
+      else :
+        state_list.append( (coord_tmp, veloc_tmp) )
+
+  semimajor_list = []
+  e_vector_list  = []
+  h_vector_list  = []
+  latitude_list  = []
+  for coord_tmp, veloc_tmp in state_list:
+    element_tmp = get_element(gm_planet, coord_tmp, veloc_tmp)
+    h_vector = np.cross(coord_tmp, veloc_tmp)
+    semimajor_list.append( element_tmp[INDEX_A] )
+    e_vector_list.append( np.cross(veloc_tmp, h_vector)/gm_planet - coord_tmp/np.linalg.norm(coord_tmp) )
+    h_vector_list.append( h_vector/np.linalg.norm(h_vector) )
+    latitude_list.append( element_tmp[INDEX_ARGP] + element_tmp[INDEX_M] )
+
+  weight = np.full(len(state_list), 1.0/number_step_average)
+  weight[0]  = 0.5*weight[0]
+  weight[-1] = 0.5*weight[-1]
+  semimajor_mean = np.dot( weight, semimajor_list )
+  e_vector_mean  = np.dot( weight, e_vector_list )
+  h_vector_mean  = np.dot( weight, h_vector_list )
+  latitude_mean  = np.dot( weight, np.unwrap(latitude_list) )
+
+  # Mean argument of latitude (argp + M) --> mean anomaly
+  element = get_element_vector(semimajor_mean, e_vector_mean, h_vector_mean, 0.0)
+  element[INDEX_M] = latitude_mean - element[INDEX_ARGP]
+
+  return element
+
+
+def get_state_osculating(gm_planet, j2_factor, element):
+
+  # Osculating inertial state whose mean elements are element (fixed-point iteration on the state)
+  coord_mean, veloc_mean = get_state_element(gm_planet, element)
+  coord, veloc = coord_mean.copy(), veloc_mean.copy()
+  for n in range(0, number_iteration_average):
+    coord_tmp, veloc_tmp = get_state_element( gm_planet, get_element_mean(gm_planet, j2_factor, coord, veloc) )
+    coord = coord + ( coord_mean - coord_tmp )
+    veloc = veloc + ( veloc_mean - veloc_tmp )
+
+  return coord, veloc
+
+
+class lifetime_model:
+  #
+  # Rates of the mean elements averaged over one revolution
+  #
+
+  def __init__(self, config, atmosphere_dict, aerodynamic_dict):
+
+    config_lifetime = config[KEY_LIFETIME]
+    self.config      = config
+    self.number_node = int( config_lifetime.get('number_node', number_node_default) )
+
+    force_model = force_term.force_model(config)
+    self.gm_planet     = force_model.gm_planet
+    self.radius_equat  = force_model.radius_equat
+    self.j2_factor     = force_model.J2*force_model.radius_equat**2
+    self.rotation_rate = force_model.rotation_rate
+    self.aero_fact     = force_model.aero_fact
+
+    # Atmosphere model
+    self.kind_atmosphere_model = config['atmosphere']['kind_atmosphere_model']
+    if self.kind_atmosphere_model == 'fileread' :
+      self.atmosphere_interp = atmosphere.get_interpolator(config, atmosphere_dict)
+    else :
+      self.density_atmosphere = config['atmosphere']['density']
+
+    # Aerodynamic model
+    self.kind_aerodynamic_model = config['satellite']['kind_aerodynamic_model']
+    if self.kind_aerodynamic_model == 'fileread' :
+      self.aerodynamic_lookup = satellite.get_table(config, aerodynamic_dict)
+    else :
+      self.cdmean_aerodynamic = config['satellite']['drag_coefficient']
+
+    # Eccentric anomaly of the nodes (midpoint rule, weighted by dM/dE)
+    self.anomaly_node = 2.0*np.pi*( np.arange(0, self.number_node) + 0.5 )/self.number_node
+
+    return
+
+
+  def get_rate(self, element):
+
+    # d(element)/dt and the minimum/maximum geodetic altitudes (m) of the nodes
+    semimajor, eccentricity, inclination = element[0:3]
+    gm_planet = self.gm_planet
+    motion    = np.sqrt( gm_planet/semimajor**3 )
+
+    # Drag averaged over the nodes
+    coord, veloc, radius = get_state(gm_planet, element, self.anomaly_node)
+    altitude = coordinate_system.convert_cartesian_geodetic_array(self.config, coord)[:,2]
+    if self.kind_atmosphere_model == 'fileread' :
+      density, temperature, knudsen = self.atmosphere_interp.evaluate_array(altitude*orbital.m2km)
+    else :
+      density = np.full(self.number_node, self.density_atmosphere)
+      knudsen = np.zeros(self.number_node)
+    if self.kind_aerodynamic_model == 'fileread' :
+      cdmean = self.aerodynamic_lookup.evaluate_array(knudsen)
+    else :
+      cdmean = self.cdmean_aerodynamic
+
+    veloc_rel = veloc - self.rotation_rate*np.stack( [ -coord[:,1], coord[:,0], np.zeros(self.number_node) ], axis=1 )
+    force     = -( self.aero_fact*density*cdmean*np.linalg.norm(veloc_rel, axis=1) )[:,None]*veloc_rel
+    weight    = ( 1.0 - eccentricity*np.cos(self.anomaly_node) )/self.number_node
+
+    # --Gauss's equations: da/dt = 2a^2/mu (v.f), de/dt = e_hat.(2(v.f)r - (r.f)v - (r.v)f)/mu
+    veloc_force = np.sum(veloc*force, axis=1)
+    coord_force = np.sum(coord*force, axis=1)
+    coord_veloc = np.sum(coord*veloc, axis=1)
+    rate_a = 2.0*semimajor**2/gm_planet*np.dot(weight, veloc_force)
+    rate_e_vector = np.dot( weight, 2.0*veloc_force[:,None]*coord - coord_force[:,None]*veloc - coord_veloc[:,None]*force )/gm_planet
+    # --Direction of perigee (E = 0)
+    coord_perigee, veloc_perigee, radius_perigee = get_state(gm_planet, element, 0.0)
+    rate_e = np.dot( rate_e_vector, coord_perigee[0]/radius_perigee[0] )
+
+    # J2 secular rates
+    factor_j2 = 0.75*motion*self.j2_factor/( semimajor*(1.0 - eccentricity**2) )**2
+    cos_i     = np.cos(inclination)
+    rate_raan = -2.0*factor_j2*cos_i
+    rate_argp = factor_j2*(5.0*cos_i**2 - 1.0)
+    rate_mean = motion + factor_j2*np.sqrt(1.0 - eccentricity**2)*(3.0*cos_i**2 - 1.0)
+
+    rate = np.array( [rate_a, rate_e, 0.0, rate_raan, rate_argp, rate_mean] )
+
+    return rate, altitude.min(), altitude.max()
+
+
+def solve_lifetime(config, iteration, time_elapsed, trajectory, atmosphere_dict, aerodynamic_dict):
+  #
+  # Lifetime phase from the initial state in the trajectory until the perigee altitude falls below altitude_handoff
+  # --Returns the trajectory with the handoff state, and True when the handoff altitude is reached
+  #
+
+  config_lifetime  = config[KEY_LIFETIME]
+  altitude_handoff = config_lifetime.get('altitude_handoff', altitude_handoff_default)*orbital.km2m
+  time_maximum     = config_lifetime['time_maximum']
+  number_revolution_step  = config_lifetime.get('number_revolution_step', number_revolution_step_default)
+  altitude_change_maximum = config_lifetime.get('altitude_change_maximum', altitude_change_maximum_default)*orbital.km2m
+
+  print( 'Start calculation of orbit-averaged lifetime...' )
+
+  model     = lifetime_model(config, atmosphere_dict, aerodynamic_dict)
+  gm_planet = model.gm_planet
+  reporter  = progress.progress_reporter(config)
+
+  # Initial state: planet-fixed --> inertial (frames coincide at time zero)
+  index_last = len(trajectory) - 1
+  coord_tmp = trajectory.get(trajectory_module.KEY_COORDINATE_CARTESIAN)[index_last].copy()
+  veloc_tmp = trajectory.get(trajectory_module.KEY_VELOCITY_CARTESIAN)[index_last] + model.rotation_rate*np.array( [-coord_tmp[1], coord_tmp[0], 0.0] )
+  rotation_angle = model.rotation_rate*time_elapsed
+  coord_tmp = rotate_z(coord_tmp,  rotation_angle)
+  veloc_tmp = rotate_z(veloc_tmp,  rotation_angle)
+
+  # Mean elements
+  element = get_element_mean(gm_planet, model.j2_factor, coord_tmp, veloc_tmp)
+
+  reporter.print_header(header_progress)
+  number_step = 0
+  time_start  = time_elapsed
+  row_list    = []
+  flag_handoff = False
+  while time_elapsed - time_start < time_maximum :
+
+    # RK4 on the mean elements
+    rate_1, altitude_min, altitude_max = model.get_rate(element)
+    row_list.append( get_row(time_elapsed, element, altitude_min, altitude_max) )
+    if altitude_min <= altitude_handoff :
+      flag_handoff = True
+      break
+    if reporter.check_output() :
+      print('{:.3f}'.format(time_elapsed*second2day)+', '+'{:.3f}'.format(element[INDEX_A]*orbital.m2km)+', '+'{:.6f}'.format(element[INDEX_E])+', '+'{:.3f}'.format(altitude_min*orbital.m2km))
+
+    # --number_revolution_step revolutions, shortened by the decay of a per step and the remaining time
+    period     = 2.0*np.pi/rate_1[INDEX_M]
+    delta_time = number_revolution_step*period
+    if rate_1[INDEX_A] < 0.0 :
+      delta_time = min( delta_time, altitude_change_maximum/abs(rate_1[INDEX_A]) )
+    delta_time = min( delta_time, time_start + time_maximum - time_elapsed )
+
+    rate_2 = model.get_rate(element + 0.5*delta_time*rate_1)[0]
+    rate_3 = model.get_rate(element + 0.5*delta_time*rate_2)[0]
+    rate_4 = model.get_rate(element + delta_time*rate_3)[0]
+    element = element + delta_time*( rate_1 + 2.0*rate_2 + 2.0*rate_3 + rate_4 )/6.0
+    element[INDEX_E] = max( element[INDEX_E], 0.0 )
+
+    time_elapsed = time_elapsed + delta_time
+    number_step += 1
+    reporter.count(1, 4*model.number_node)
+
+  print('Lifetime phase: time (day):', '{:.3f}'.format( (time_elapsed - time_start)*second2day ), ', steps:', number_step,
+        ', perigee altitude (km):', '{:.3f}'.format(row_list[-1][8]))
+  reporter.print_summary('Lifetime integration')
+  output_lifetime(config, row_list)
+
+  if not flag_handoff :
+    print('Handoff altitude is not reached in time_maximum of lifetime.')
+    return iteration, time_elapsed, trajectory, flag_handoff
+
+  # Handoff state: mean elements --> osculating inertial state --> planet-fixed state
+  coord_tmp, veloc_tmp = get_state_osculating(gm_planet, model.j2_factor, element)
+  rotation_angle = model.rotation_rate*time_elapsed
+  coord_tmp = rotate_z(coord_tmp, -rotation_angle)
+  veloc_tmp = rotate_z(veloc_tmp, -rotation_angle) - model.rotation_rate*np.array( [-coord_tmp[1], coord_tmp[0], 0.0] )
+
+  print('Handoff to the time integration: time (s):', '{:.3f}'.format(time_elapsed))
+
+  coordinate_cartesian = coord_tmp.reshape(1,3)
+  velocity_cartesian   = veloc_tmp.reshape(1,3)
+  coordinate_geodetic  = coordinate_system.convert_cartesian_geodetic_array(config, coordinate_cartesian)
+  polar_coord          = coordinate_system.set_angle_polar_array(config, coordinate_cartesian)
+  velocity_polar       = coordinate_system.convert_carteasian_polar_array(config, velocity_cartesian, polar_coord[:,2], polar_coord[:,1])
+
+  trajectory = trajectory_module.trajectory_store(1024, config)
+  trajectory.extend([time_elapsed], coordinate_cartesian, velocity_cartesian, coordinate_geodetic, velocity_polar, np.nan, np.nan, np.nan)
+
+  return iteration, time_elapsed, trajectory, flag_handoff
+
+
+def rotate_z(vector, angle):
+
+  # Rotation of a vector about the z-axis by angle
+  cos_a, sin_a = np.cos(angle), np.sin(angle)
+
+  return np.array( [ cos_a*vector[0] - sin_a*vector[1], sin_a*vector[0] + cos_a*vector[1], vector[2] ] )
+
+
+def get_row(time_elapsed, element, altitude_min, altitude_max):
+
+  return [ time_elapsed, time_elapsed*second2day, element[INDEX_A]*orbital.m2km, element[INDEX_E],
+           element[INDEX_I]*orbital.rad2deg, np.mod(element[INDEX_RAAN], 2.0*np.pi)*orbital.rad2deg,
+           np.mod(element[INDEX_ARGP], 2.0*np.pi)*orbital.rad2deg, np.mod(element[INDEX_M], 2.0*np.pi)*orbital.rad2deg,
+           altitude_min*orbital.m2km, altitude_max*orbital.m2km ]
+
+
+def output_lifetime(config, row_list):
+
+  # Mean elements at each step (Tecplot)
+  filename_tmp = config['post_process']['directory_output'] + '/' + config[KEY_LIFETIME].get('filename_output', 'lifetime.dat')
+  print('Writing lifetime file... ', filename_tmp)
+
+  format_row = blank_code.join( ['%.16e']*len(variable_lifetime) ) + newline_code
+  file = open(filename_tmp, 'w')
+  file.write('# Lifetime data: Tacode' + newline_code)
+  file.write('Variables = ' + ','.join(variable_lifetime) + newline_code)
+  file.write('zone t=lifetime i= '+str(len(row_list))+' f=point' + newline_code)
+  file.write( (format_row*len(row_list)) % tuple( value for row in row_list for value in row ) )
+  file.close()
+
+  return
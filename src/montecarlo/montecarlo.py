@@ -4,6 +4,8 @@ import numpy as np
 import os as os
 import shutil as shutil
 import random as random
+import copy as copy
+import re as re
 from orbital.orbital import orbital
 
 
@@ -40,10 +42,27 @@ class montecarlo(orbital):
     self.root_dir   = os.getcwd()
     self.cmd_home = os.path.dirname(os.path.realpath(__file__)) + '/..'
 
+    # Execution kind
+    # --inprocess: each case is solved in this process with shared tables
+    # --ensemble: all cases are integrated together in this process
+    # --subprocess: tacode.py is launched in each case directory
+    self.kind_execution  = config['montecarlo'].get('kind_execution', 'inprocess')
+    self.filename_result = config['montecarlo'].get('filename_result', 'result_montecarlo.dat')
+    # Output of each case (inprocess): tecplot, kml, gpx, restart, log
+    self.output_case     = config['montecarlo'].get('output_case', [])
+
     # Counter
     self.iter = 1
 
-    self.process_list = []
+    # Cases waiting for execution (subprocess)
+    self.case_list = []
+
+    # Tables shared by the case processes (subprocess), None: each case builds its tables
+    self.flag_shared_table      = config['montecarlo'].get('flag_shared_table', True)
+    self.directory_shared_table = None
+
+    # Aerodynamic coefficients of each case drawn from the standard deviations of the aerodynamic table
+    self.flag_aerodynamic_sdv = config['montecarlo'].get('flag_aerodynamic_sdv', False)
 
     # Result file
     #self.result_dir       = config['montecarlo']['result_dir']
@@ -59,7 +78,8 @@ class montecarlo(orbital):
 
   def rewrite_control(self,filename,txt_indentified,ele_indentified,txt_replaced):
     # 
-    # txt_indentifiedの文字列を含む行を抽出し、その(ele_indentified)列目要素を置換する。
+    # txt_indentifiedをキーとする行 ("txt_indentified:") を抽出し、その(ele_indentified)列目要素を置換する。
+    # コメントや他のキーにtxt_indentifiedの文字列が含まれていても対象としない
     # 何度もファイル開閉をするのは問題かもしれない
 
     for m in range(0,ele_indentified):
@@ -71,22 +91,24 @@ class montecarlo(orbital):
       lines_strip = [line.strip() for line in lines]
 
       # 置換する行を特定する
-      # i_line    = [i for i, line in enumerate(lines_strip) if txt_indentified in line]
-      line_both        = [(i, line) for i, line in enumerate(lines_strip) if txt_indentified in line]
-      i_line, str_line = list(zip(*line_both))
+      i_line = [i for i, line in enumerate(lines_strip) if re.match( re.escape(txt_indentified) + r'\s*:', line )]
+      if len(i_line) == 0 :
+        print('Variable is not found in control file:', txt_indentified, filename)
+        print('Program stopped.')
+        exit()
 
       # 抽出した行をスペース・タブで分割する。そのele_indentified列目を置換し、line_replacedというstr型に戻す。
-      words = lines_strip[i_line[0]+m+1].split()
+      i_replaced = i_line[0]+m+1
+      words = lines_strip[i_replaced].split()
       # Replace (words[0]に該当する'-'は置換しない、その次のwords[1]を置換する)
       words[1] = txt_replaced[m]
       # インデントを考慮して新しい行を構築
       line_replaced  = ' '.join(words)
 
-      # 行を置換
-      # lines_newはリストになることに注意。そのため、'',joinでstr型に戻す
-      lines_updated = [item.replace( lines_strip[i_line[0]+m+1], line_replaced ) for item in lines]
+      # 行を置換 (同じ値の他の行は置換しない)
+      lines[i_replaced] = lines[i_replaced].replace( lines_strip[i_replaced], line_replaced )
 
-      str_lines_new = ''.join(lines_updated)
+      str_lines_new = ''.join(lines)
 
       # Update the file
       with open(filename, mode="w") as f:
@@ -95,30 +117,100 @@ class montecarlo(orbital):
     return
 
 
-  def run_tacode(self,config):
+  def run_tacode(self, case_dict):
     import subprocess
-    # Tacodeの実行
-
-    num_iteration = config['montecarlo']['number_iteration']
-    maximum_number_execution = config['montecarlo']['maximum_number_execution']
-    
-    # 計算ディレクトリに移動、実行、元ディレクトリに戻る
-    os.chdir( self.work_dir_case )
-    #subprocess.call('pwd')
+    import shared_table.shared_table as shared_table
+    # Tacodeの実行 (ケースディレクトリで実行し、プロセスを返す)
 
     # Get relative path
-    current_path  = os.getcwd()
-    relative_path = os.path.relpath(self.cmd_home, current_path)
-    
-    # Run Tacode
-    process = subprocess.Popen([self.cmd_tacode, relative_path])
-    self.process_list.append(process)
-    if self.iter%maximum_number_execution == 0 or self.iter == num_iteration:
-      for subprocess in self.process_list:
-        subprocess.wait()
-      self.process_list = []
+    relative_path = os.path.relpath(self.cmd_home, os.path.abspath(case_dict['directory']))
+
+    # Directory of the shared tables is passed by the environment variable
+    env = dict(os.environ)
+    if self.directory_shared_table is not None :
+      env[shared_table.ENV_SHARED_TABLE] = self.directory_shared_table
+
+    # Run Tacode (in a new session so that the shell and python can be killed together)
+    process = subprocess.Popen([self.cmd_tacode, relative_path], cwd=case_dict['directory'], start_new_session=True, env=env)
+
+    return process
+
 
-    os.chdir( self.root_dir )
+  def run_scheduler(self, config):
+    import time as time
+    import signal as signal
+    # 待ち行列のケースを常にmaximum_number_execution個のプロセスで実行する。
+    # いずれかのプロセスが終了した時点で次のケースを開始する (バッチごとの待ち合わせはしない)
+
+    maximum_number_execution = config['montecarlo']['maximum_number_execution']
+    timeout_case   = config['montecarlo'].get('timeout_case', 0.0)          # s, 0: no limit
+    number_retry   = config['montecarlo'].get('number_retry', 0)
+    kind_ordering  = config['montecarlo'].get('kind_ordering', 'sequential') # sequential or longest_first
+    interval_poll  = 0.05
+
+    case_queue = list(self.case_list)
+    if kind_ordering == 'longest_first' :
+      # Higher initial altitude is expected to take longer
+      case_queue.sort(key=lambda case_dict: case_dict['altitude'], reverse=True)
+    elif kind_ordering != 'sequential' :
+      print('kind_ordering in config is incorrect.')
+      print('Program stopped.')
+      exit()
+
+    print('Running', len(case_queue), 'cases with', maximum_number_execution, 'processes')
+
+    time_start   = time.perf_counter()
+    time_busy    = 0.0
+    case_running = []
+    case_done    = []
+    case_failed  = []
+    while len(case_queue) > 0 or len(case_running) > 0 :
+
+      # Start cases on free workers
+      while len(case_queue) > 0 and len(case_running) < maximum_number_execution :
+        case_dict = case_queue.pop(0)
+        print('--Start case:', case_dict['directory'])
+        case_dict['process']    = self.run_tacode(case_dict)
+        case_dict['time_start'] = time.perf_counter()
+        case_running.append(case_dict)
+
+      time.sleep(interval_poll)
+
+      # Check running cases
+      for case_dict in list(case_running):
+        return_code  = case_dict['process'].poll()
+        time_elapsed = time.perf_counter() - case_dict['time_start']
+        if return_code is None :
+          if timeout_case > 0.0 and time_elapsed > timeout_case :
+            os.killpg(case_dict['process'].pid, signal.SIGKILL)
+            case_dict['process'].wait()
+            print('--Timeout of case:', case_dict['directory'], ', Elapsed time (s):', '{:.1f}'.format(time_elapsed))
+            return_code = 'timeout'
+          else :
+            continue
+
+        case_running.remove(case_dict)
+        time_busy += time_elapsed
+        if return_code == 0 :
+          print('--End case:', case_dict['directory'], ', Elapsed time (s):', '{:.1f}'.format(time_elapsed))
+          case_done.append(case_dict)
+        elif case_dict['retry'] < number_retry :
+          case_dict['retry'] += 1
+          print('--Retry case:', case_dict['directory'], ', Return code:', return_code, ', Retry:', case_dict['retry'])
+          case_queue.insert(0, case_dict)
+        else :
+          print('--Failed case:', case_dict['directory'], ', Return code:', return_code)
+          case_failed.append(case_dict)
+
+    time_wall = time.perf_counter() - time_start
+
+    # Summary
+    throughput  = float(len(case_done))/max(time_wall, interval_poll)*60.0
+    utilization = time_busy/max(time_wall*maximum_number_execution, interval_poll)*100.0
+    print('Completed cases:', len(case_done), ', Failed cases:', len(case_failed), ', Wall time (s):', '{:.1f}'.format(time_wall))
+    print('Throughput (cases/min):', '{:.2f}'.format(throughput), ', Core utilization (%):', '{:.1f}'.format(utilization))
+    for case_dict in case_failed:
+      print('--Failed:', case_dict['directory'])
 
     return
 
@@ -168,10 +260,13 @@ class montecarlo(orbital):
       print('Variable:',var_name_ctl,'in',var_root_ctl, ',Default:',var_default, ',With dispersion:',txt_replaced)
       self.rewrite_control(filename_ctl, txt_indentified, ele_indentified, txt_replaced)
 
-    # Tacodeの実行
-    print('--Start Tacode')
-    self.run_tacode(config)
-    print('--End Tacode')
+    if self.flag_aerodynamic_sdv :
+      self.rewrite_control(filename_ctl, 'aerodynamic_sdv_factor', 1, [ str( self.get_aerodynamic_sdv_factor() ) ])
+
+    # Tacodeの実行はrun_schedulerで行う
+    config_case = self.read_config_yaml(filename_ctl)
+    case_dict   = {'directory': self.work_dir_case, 'altitude': config_case['initial_settings']['coordinate'][2], 'retry': 0}
+    self.case_list.append(case_dict)
 
     # Trajectoryファイルの読み込みと誤差評価
     #print('--Postprocess based on results')
@@ -184,9 +279,323 @@ class montecarlo(orbital):
     return #error
   
 
+  def set_dispersion(self, config, config_case):
+    # config_case (Tacodeのコントロールファイルの辞書) にconfigのtarget_variableの分散を与える。
+    # 乱数の順番はf_tacodeと同じ
+
+    var_montecarlo = config['montecarlo']['target_variable']
+    for n in range(0, len(var_montecarlo)):
+      var_name_ctl   = var_montecarlo[n][0]
+      var_root_ctl   = var_montecarlo[n][1]
+      var_dispersion = var_montecarlo[n][2]
+
+      var_default = config[var_root_ctl][var_name_ctl]
+
+      if isinstance(var_default, list) :
+        var_replaced = []
+        for m in range(0,len(var_default)):
+          var_replaced.append( var_default[m]*(1.0+(random.random()-0.50)*var_dispersion) )
+      else :
+        var_replaced = var_default*(1.0+(random.random()-0.50)*var_dispersion)
+
+      print('Variable:',var_name_ctl,'in',var_root_ctl, ',Default:',var_default, ',With dispersion:',var_replaced)
+      config_case[var_root_ctl][var_name_ctl] = var_replaced
+
+    if self.flag_aerodynamic_sdv :
+      config_case['satellite']['aerodynamic_sdv_factor'] = [ self.get_aerodynamic_sdv_factor() ]
+
+    return config_case
+
+
+  def get_aerodynamic_sdv_factor(self):
+    # 空力係数の標準偏差に掛ける係数 (標準正規分布), 空力係数 = 平均 + 係数 * 標準偏差
+
+    sdv_factor = random.gauss(0.0, 1.0)
+    print('Variable: aerodynamic_sdv_factor in satellite, Standard normal:', sdv_factor)
+
+    return sdv_factor
+
+
+  def check_dispersion_table(self, config):
+    # 大気・空力テーブルに関わる変数に分散を与える場合はケースごとにテーブルを作り直す
+
+    var_table = [('characteristic_length','satellite'), ('filename_atmosphere','atmosphere'), ('filename_aerodynamic','satellite')]
+
+    flag_table_case = False
+    for var_montecarlo in config['montecarlo']['target_variable']:
+      if (var_montecarlo[0], var_montecarlo[1]) in var_table :
+        flag_table_case = True
+
+    return flag_table_case
+
+
+  def set_output_case(self, config_case):
+    # 各ケースの出力は output_case で指定されたものだけをケースディレクトリに書き出す
+
+    config_case['post_process']['directory_output']    = self.work_dir_case + '/' + config_case['post_process']['directory_output']
+    config_case['restart_process']['directory_output'] = self.work_dir_case + '/' + config_case['restart_process']['directory_output']
+
+    config_case['post_process']['tecplot']['flag_output'] = ( 'tecplot' in self.output_case )
+    config_case['post_process']['kml']['flag_output']     = ( 'kml' in self.output_case )
+    config_case['post_process']['flag_output_gpx']        = ( 'gpx' in self.output_case )
+    config_case['post_process'].setdefault('statistics', {'filename_output': 'statistics.dat'})
+    config_case['post_process']['statistics']['flag_output'] = ( 'statistics' in self.output_case )
+    config_case['restart_process']['flag_output']         = ( 'restart' in self.output_case )
+    # イベントの検出 (衝突時刻での打ち切り) は行い, ファイル出力は events が指定された場合のみ
+    if config_case.get('event', None) :
+      config_case['event']['flag_output'] = ( 'events' in self.output_case )
+
+    return config_case
+
+
+  def get_table_template(self, config_tacode):
+    import atmosphere.atmosphere as atmosphere
+    import satellite.satellite as satellite
+    # 大気・空力テーブルをテンプレートディレクトリで作成する (相対パスをsubprocessのケースと同じにするため)
+
+    directory_root = os.getcwd()
+    os.chdir(self.work_dir_template)
+    try :
+      atmosphere_dict  = atmosphere.initial_settings_atmosphere(config_tacode)
+      aerodynamic_dict = satellite.initial_settings_satellite(config_tacode)
+    finally :
+      os.chdir(directory_root)
+
+    return atmosphere_dict, aerodynamic_dict
+
+
+  def publish_table_subprocess(self, config):
+    import atmosphere.atmosphere as atmosphere
+    import satellite.satellite as satellite
+    # 大気・空力テーブルを一度だけ作成し、各ケースのプロセスが読み取り専用でマップするファイルに書き出す
+
+    if not self.flag_shared_table or self.check_dispersion_table(config) :
+      return
+
+    # Tables are built in the template directory, so that relative paths in the control file are the same as in the cases
+    directory_shared = os.path.abspath(self.work_dir + '/shared_table')
+    directory_root   = os.getcwd()
+    os.chdir(self.work_dir_template)
+    try :
+      config_tacode    = self.read_config_yaml(self.filename_control_tacode)
+      atmosphere_dict  = atmosphere.initial_settings_atmosphere(config_tacode)
+      aerodynamic_dict = satellite.initial_settings_satellite(config_tacode)
+      atmosphere.publish_atmosphere(config_tacode, atmosphere_dict, directory_shared)
+      satellite.publish_aerodynamic(config_tacode, aerodynamic_dict, directory_shared)
+    finally :
+      os.chdir(directory_root)
+
+    self.directory_shared_table = directory_shared
+
+    return
+
+
+  def montecarlo_routine_inprocess(self,config):
+    # 各ケースをこのプロセス内で順に解く (copytree, コントロールファイルの書き換え, subprocessは行わない)
+    import contextlib as contextlib
+    import solver.solver as solver
+    import trajectory_sink.trajectory_sink as trajectory_sink
+    import profiler.profiler as profiler_module
+    import checkpoint.checkpoint as checkpoint
+
+    num_iteration = config['montecarlo']['number_iteration']
+
+    # Control file of Tacode in the template
+    config_tacode = self.read_config_yaml(self.work_dir_template+'/'+self.filename_control_tacode)
+
+    # Sum of the profiles of the cases (profile: flag_profile)
+    profiler_total = profiler_module.stage_profiler(config_tacode, number_case=0)
+
+    # Tables are shared by all cases unless their parameters are dispersed
+    flag_table_case = self.check_dispersion_table(config)
+    if not flag_table_case :
+      atmosphere_dict, aerodynamic_dict = self.get_table_template(config_tacode)
+
+    result_list = {'time': [], 'cartesian': [], 'velocity': [], 'density': [], 'temperature': [], 'knudsen': [], 'flag_ground': []}
+    for n in range(0,num_iteration):
+
+      print('Iteration: ', self.iter)
+
+      number_padded      = '{0:04d}'.format(self.iter)
+      self.work_dir_case = self.work_dir+'/'+self.case_dir+number_padded
+
+      # Dispersion on a copy of the control file in memory
+      config_case = self.set_dispersion(config, copy.deepcopy(config_tacode))
+      config_case = self.set_output_case(config_case)
+      if len(self.output_case) > 0 :
+        print('--Case directory: ', self.work_dir_case)
+        self.make_directory(self.work_dir_case)
+        self.make_directory_output(config_case)
+
+      # Log of Tacode is written only when requested
+      if 'log' in self.output_case :
+        file_log = open(self.work_dir_case+'/log_tacode', 'w')
+      else :
+        file_log = open(os.devnull, 'w')
+
+      print('--Start Tacode')
+      with contextlib.redirect_stdout(file_log):
+        if flag_table_case :
+          atmosphere_dict, aerodynamic_dict = self.get_table_template(config_case)
+
+        iteration, time_elapsed, trajectory = orbital.initial_settings(self, config_case)
+
+        trajectory.set_sink( trajectory_sink.get_sink_list(config_case) )
+        profiler = profiler_module.stage_profiler(config_case)
+        profiler.wrap_sink(trajectory)
+        profiler.start()
+        checkpointer = checkpoint.checkpoint_manager(config_case)
+        iteration, trajectory = solver.solve_equation_motion(config_case, iteration, time_elapsed, trajectory, atmosphere_dict, aerodynamic_dict, profiler, checkpointer=checkpointer)
+        trajectory.close()
+        profiler.stop()
+        if profiler.flag_profile :
+          profiler.print_table()
+          profiler_total.merge( profiler.get_dict() )
+      file_log.close()
+      print('--End Tacode')
+
+      # SIGTERM/SIGINT: the case is closed with its restart data, and the driver stops
+      checkpointer.exit_signal()
+
+      # Final state (latest sample)
+      index_last = len(trajectory) - 1
+      coordinate_dict, velocity_dict, trajectory_dict = trajectory.get_dict(index_last, index_last+1)
+      result_list['time'].append( trajectory_dict['time'][0] )
+      result_list['cartesian'].append( coordinate_dict['cartesian'][0] )
+      result_list['velocity'].append( velocity_dict['cartesian'][0] )
+      result_list['density'].append( trajectory_dict['density'][0] )
+      result_list['temperature'].append( trajectory_dict['temperature'][0] )
+      result_list['knudsen'].append( trajectory_dict['knudsen'][0] )
+      result_list['flag_ground'].append( coordinate_dict['geodetic'][0][2] <= 0.0 )
+
+      self.iter += 1
+
+    result_dict = {}
+    for key in result_list:
+      result_dict[key] = np.array( result_list[key] )
+    self.output_result_montecarlo(config_tacode, result_dict)
+    self.output_profile_montecarlo(profiler_total)
+
+    return
+
+
+  def output_profile_montecarlo(self, profiler_total):
+
+    # Profiles summed over the cases: table, and JSON in work_dir
+    if not profiler_total.flag_profile :
+      return
+
+    profiler_total.print_table('Profile of time integration (sum of Monte-Carlo cases)')
+    if profiler_total.filename_output :
+      profiler_total.write_json(self.work_dir + '/' + profiler_total.filename_output)
+
+    return
+
+
+  def collect_profile_subprocess(self):
+    import json as json
+    import profiler.profiler as profiler_module
+    # 各ケースディレクトリに書き出されたプロファイル(JSON)を合計する
+
+    config_tacode  = self.read_config_yaml(self.work_dir_template+'/'+self.filename_control_tacode)
+    profiler_total = profiler_module.stage_profiler(config_tacode, number_case=0)
+    if not profiler_total.flag_profile or not profiler_total.filename_output :
+      return
+
+    for case_dict in self.case_list:
+      filename_tmp = case_dict['directory'] + '/' + config_tacode['post_process']['directory_output'] + '/' + profiler_total.filename_output
+      if not os.path.isfile(filename_tmp) :
+        print('--Profile is not found:', filename_tmp)
+        continue
+      with open(filename_tmp) as file:
+        profiler_total.merge( json.load(file) )
+
+    self.output_profile_montecarlo(profiler_total)
+
+    return
+
+
+  def montecarlo_routine_ensemble(self,config):
+    # 全ケースを一つのプロセスで(N,3)配列として同時に積分する
+    import atmosphere.atmosphere as atmosphere
+    import satellite.satellite as satellite
+    import solver.solver as solver
+
+    num_iteration = config['montecarlo']['number_iteration']
+
+    # Control file of Tacode in the template
+    config_tacode = self.read_config_yaml(self.work_dir_template+'/'+self.filename_control_tacode)
+
+    # Dispersion of each case
+    coordinate_init = []
+    velocity_init   = []
+    satellite_dict  = {satellite.KEY_MASS: [], satellite.KEY_AREA: [], satellite.KEY_DRAG: [], solver.KEY_DENSITY_FACTOR: [], solver.KEY_SOLAR_ACTIVITY: [],
+                       satellite.KEY_AOA: [], satellite.KEY_SDV: []}
+    for n in range(0,num_iteration):
+      print('Iteration: ', self.iter)
+      config_case = self.set_dispersion(config, copy.deepcopy(config_tacode))
+      coordinate_init.append( config_case['initial_settings']['coordinate'] )
+      velocity_init.append( config_case['initial_settings']['velocity'] )
+      satellite_dict[satellite.KEY_MASS].append( config_case['satellite']['mass'] )
+      satellite_dict[satellite.KEY_AREA].append( config_case['satellite']['characteristic_area'] )
+      satellite_dict[satellite.KEY_DRAG].append( config_case['satellite']['drag_coefficient'] )
+      satellite_dict[solver.KEY_DENSITY_FACTOR].append( config_case['initial_settings']['density_factor'][0] )
+      if len( atmosphere.get_profile_list(config_case) ) > 0 :
+        satellite_dict[solver.KEY_SOLAR_ACTIVITY].append( atmosphere.get_solar_activity(config_case) )
+      satellite_dict[satellite.KEY_AOA].append( satellite.get_angle_of_attack(config_case) )
+      satellite_dict[satellite.KEY_SDV].append( satellite.get_sdv_factor(config_case) )
+      self.iter += 1
+
+    # Tables are shared by all cases
+    atmosphere_dict, aerodynamic_dict = self.get_table_template(config_tacode)
+
+    coordinate_cart, velocity_cart = self.initial_settings_ensemble(config_tacode, coordinate_init, velocity_init)
+
+    ensemble_dict = solver.solve_equation_motion_ensemble(config_tacode, coordinate_cart, velocity_cart, satellite_dict, atmosphere_dict, aerodynamic_dict)
+
+    self.output_result_montecarlo(config_tacode, ensemble_dict)
+
+    return
+
+
+  def output_result_montecarlo(self, config, ensemble_dict):
+    import coordinate_system.coordinate_system as coordinate_system
+
+    coordinate_cart = ensemble_dict['cartesian']
+    velocity_cart   = ensemble_dict['velocity']
+
+    coordinate_geod = coordinate_system.convert_cartesian_geodetic_array(config, coordinate_cart)
+    polar_coord     = coordinate_system.set_angle_polar_array(config, coordinate_cart)
+    velocity_pola   = coordinate_system.convert_carteasian_polar_array(config, velocity_cart, polar_coord[:,2], polar_coord[:,1])
+
+    result = np.column_stack( [ np.arange(1,len(coordinate_cart)+1), ensemble_dict['time'],
+                                coordinate_geod*self.unit_convert_geoditic, velocity_pola, np.linalg.norm(velocity_pola, axis=1),
+                                ensemble_dict['density'], ensemble_dict['temperature'], ensemble_dict['knudsen'], ensemble_dict['flag_ground'] ] )
+
+    filename_tmp = self.work_dir + '/' + self.filename_result
+    print('Writing result of Monte-Carlo cases... ', filename_tmp)
+    header = 'Final state of Monte-Carlo cases: Tacode' + self.newline_code \
+           + 'Variables = Case,Time[s],Long[deg.],Lati[deg.],Alti[km],Upl[m/s],Vpl[m/s],Wpl[m/s],VelplAbs[m/s],Dens[kg/m3],Temp[K],Kn,Ground'
+    np.savetxt(filename_tmp, result, fmt='%.10e', header=header, comments='# ')
+
+    return
+
+
   def montecarlo_routine(self,config):
 
-    for n in range(0,config['montecarlo']['number_iteration']):
-      self.f_tacode(config)
+    if self.kind_execution == 'inprocess' :
+      self.montecarlo_routine_inprocess(config)
+    elif self.kind_execution == 'ensemble' :
+      self.montecarlo_routine_ensemble(config)
+    elif self.kind_execution == 'subprocess' :
+      self.publish_table_subprocess(config)
+      for n in range(0,config['montecarlo']['number_iteration']):
+        self.f_tacode(config)
+      self.run_scheduler(config)
+      self.collect_profile_subprocess()
+    else :
+      print('kind_execution in config is incorrect.')
+      print('Program stopped.')
+      exit()
 
-    return
\ No newline at end of file
+    return
@@ -4,6 +4,8 @@ import numpy as np
 import os as os
 from general.general import general
 import coordinate_system.coordinate_system as coordinate_system
+from trajectory.trajectory import trajectory_store
+import checkpoint.checkpoint as checkpoint
 
 class orbital(general):
 
@@ -30,6 +32,9 @@ class orbital(general):
   newline_code='\n'
   blank_code=' '
 
+  # Tecplot output (trajectory_sink)
+  variable_tecplot = ['Time[s]','X[km]','Y[km]','Z[km]','Long[deg.]','Lati[deg.]','Alti[km]','Upl[m/s]','Vpl[m/s]','Wpl[m/s]','VelplAbs[m/s]','Dens[kg/m3]','Temp[K]','Kn']
+
   def __init__(self):
     print("Calling class: orbital")
 
@@ -66,7 +71,6 @@ class orbital(general):
     print('Setting initial conditions')
 
     flag_initial = config['computational_setup']['flag_initial']
-    timestep     = config['time_integration']['timestep_constant']
 
     # Initial start
     if flag_initial :
@@ -85,178 +89,66 @@ class orbital(general):
       # Initial velocity
       veloc_init = np.array( config['initial_settings']['velocity'] )
 
-      coordinate_geodetic = [coord_init]
-      velocity_polar      = [veloc_init]
+      # Initial coordinate and velocity are given by those in geodetic coordinte
+      # Those values are converted to in cartesian coordinate
+      coordinate_geodetic = coord_init.reshape(1,3)
+      velocity_polar      = veloc_init.reshape(1,3)
+      coordinate_cartesian, velocity_cartesian = self.convert_initial_cartesian(config, coordinate_geodetic, velocity_polar)
+
+      # Trajectory properties are set by the solver
+      property_list   = [np.nan, np.nan, np.nan]
+      checkpoint_dict = None
 
     else :
       print('--from restart file')
 
-      print('Restart routine is Not implemented in this version.')
-      print('Please check: flag_initial.')
-      print('Program stopped')
-      exit()
+      # Latest state in the checkpoint (history is not replayed, and the outputs are appended from its sample)
+      checkpoint_dict = checkpoint.read_checkpoint(config)
+      iteration    = checkpoint_dict[checkpoint.KEY_ITERATION]
+      time_elapsed = checkpoint_dict[checkpoint.KEY_TIME]
 
-      coordinate_geodetic = []
-      velocity_polar      = []
+      coordinate_cartesian = checkpoint_dict[checkpoint.KEY_COORDINATE].reshape(1,3)
+      velocity_cartesian   = checkpoint_dict[checkpoint.KEY_VELOCITY].reshape(1,3)
+      coordinate_geodetic  = coordinate_system.convert_cartesian_geodetic_array(config, coordinate_cartesian)
+      polar_coord          = coordinate_system.set_angle_polar_array(config, coordinate_cartesian)
+      velocity_polar       = coordinate_system.convert_carteasian_polar_array(config, velocity_cartesian, polar_coord[:,2], polar_coord[:,1])
 
-      iteration, time_elapsed, coordinate_geodetic, velocity_geodetic = self.read_restart(config, coordinate_geodetic, velocity_polar)
+      property_list = [ checkpoint_dict[checkpoint.KEY_DENSITY], checkpoint_dict[checkpoint.KEY_TEMPERATURE], checkpoint_dict[checkpoint.KEY_KNUDSEN] ]
 
     print('--Iteration: ',iteration)
 
-    
-    # Reconstruction
-    coordinate_cartesian = []
-    coordinate_polar     = []
-    velocity_cartesian   = []
-    #time_elapsed         = []
-    for n in range(0,iteration+1):
-      # Initial (restart) coordinate and velocity are given by those in geodetic coordinte
-      # Those values are converted to in cartesian coordinate
-      cartesian_coord_tmp = coordinate_system.convert_geodetic_cartesian(config, coordinate_geodetic[n])
-      coordinate_cartesian.append( np.array( cartesian_coord_tmp ) )
-
-      # Set parameters in polar coordinate from cartesian coordinate
-      # polar_coord: [radius, 極座標における緯度(beta), 極座標における経度(alpha)]
-      polar_coord_tmp = coordinate_system.set_angle_polar(config, cartesian_coord_tmp)
-      coordinate_polar.append( np.array( polar_coord_tmp) )
-
-      # Velocity
-      longitude = polar_coord_tmp[2]
-      latitude  = polar_coord_tmp[1]
-      cartesian_veloc_tmp = coordinate_system.convert_polar_carteasian(config, velocity_polar[n] ,longitude, latitude)
-      velocity_cartesian.append( np.array( cartesian_veloc_tmp) )
-
-      # Time 
-      #time_elapsed.append(n*timestep)
-
-    coordinate_dict = {'geodetic': coordinate_geodetic, 'cartesian':coordinate_cartesian, 'polar':coordinate_polar}
-    velocity_dict   = {'cartesian': velocity_cartesian, 'polar':velocity_polar}
-    
+    trajectory = trajectory_store(1024, config)
+    trajectory.extend([time_elapsed], coordinate_cartesian, velocity_cartesian, coordinate_geodetic, velocity_polar, *property_list)
+    trajectory.checkpoint_dict = checkpoint_dict
+    if checkpoint_dict is not None :
+      trajectory.index_start = checkpoint_dict[checkpoint.KEY_SAMPLE]
 
-    # Trajectory properties
-    density_trajectory     = []
-    temperature_trajectory = []
-    knudsen_trajectory     = []
-    #for n in range(0,iteration+1):
+    return iteration, time_elapsed, trajectory
 
-    trajectory_dict = {'density':  density_trajectory, 'temperature': temperature_trajectory, 'knudsen': knudsen_trajectory}
 
-    return iteration, time_elapsed, coordinate_dict, velocity_dict, trajectory_dict
+  def initial_settings_ensemble(self, config, coordinate_init, velocity_init):
 
+    # Initial coordinate (N,3) in the geodetic coordinate: 0:Long.(deg) 1: Lat.(deg), 2:Alt.(km), velocity (N,3) in the polar coordinate
+    # --Same conversion as initial_settings for all members at once, returns (N,3) arrays in cartesian coordinate
+    coordinate_geodetic = np.multiply( np.array(coordinate_init, dtype=np.float64), self.unit_convert_geoditic_inv )
+    velocity_polar      = np.array(velocity_init, dtype=np.float64)
 
-  def output_restart(self, config, iteration, time_elapsed, coordinate, velocity):
+    return self.convert_initial_cartesian(config, coordinate_geodetic, velocity_polar)
 
-    dir_restart      = config['restart_process']['directory_output']
-    file_restart     = config['restart_process']['file_restart']
-    flag_time_series = config['restart_process']['flag_time_series']   # --True: stored individually as time series, False: stored by overwriting
-    digid_step       = config['restart_process']['digid_step']
-
-    if flag_time_series :
-      addfile = '_'+str(iteration).zfill(digid_step)
-      filename_tmp = dir_restart + '/' + self.split_file(file_restart,addfile,'.')
-    else :
-      filename_tmp = dir_restart + '/' + file_restart
-
-    print('Writing restart data...:',filename_tmp)
-    
-    # File open  
-    file = open(filename_tmp, "w")
-    file.write('# Restart data (ECEF, cartesian system)' + self.newline_code)
-    file.write('# Iteration, Elapsed time' + self.newline_code)
-    file.write('# '+ str(iteration) + self.blank_code + str(time_elapsed) + self.newline_code)
-    for n in range(0,iteration):
-      str_coord = str(coordinate[n][0])+ self.blank_code +str(coordinate[n][1]) + self.blank_code + str(coordinate[n][2]) 
-      vel_coord = str(velocity[n][0])  + self.blank_code +str(velocity[n][1])   + self.blank_code + str(velocity[n][2]) 
-      file.write( str_coord + self.blank_code + vel_coord + self.newline_code)
-    file.close()
-
-    return
 
+  def convert_initial_cartesian(self, config, coordinate_geodetic, velocity_polar):
 
-  def read_restart(self, config, coordinate, velocity):
+    # Geodetic coordinate (N,3) and polar velocity (N,3) --> cartesian coordinate and velocity (N,3)
+    coordinate_cartesian = coordinate_system.convert_geodetic_cartesian_array(config, coordinate_geodetic)
 
-    dir_restart      = config['restart_process']['directory_output']
-    file_restart     = config['restart_process']['file_restart']
-    flag_time_series = config['restart_process']['flag_time_series']   # --True: stored individually as time series, False: stored by overwriting
-    digid_step       = config['restart_process']['digid_step']
-    restart_step     = config['restart_process']['restart_step']
-
-    if flag_time_series :
-      addfile = '_s'+str(restart_step).zfill(digid_step)
-      filename_tmp = dir_restart + '/' + self.split_file(file_restart,addfile,'.')
-    else :
-      filename_tmp = dir_restart + '/' + file_restart
-    
-    # Open file
-    with open(filename_tmp) as f:
-      lines = f.readlines()
-    # リストとして取得 
-    lines_strip = [line.strip() for line in lines]
-    # Iteration 
-    words = lines_strip[2].split()
-    iteration    = int(words[1])
-    time_elapsed = float(words[2])
-
-    # Reading data
-    for n in range(3,len(lines_strip )):
-      words = lines_strip[n].split()
-      coordinate.append( float(words[0]), float(words[1]), float(words[2]) )
-      velocity.append( float(words[3]), float(words[4]), float(words[5]) )
-    
-    f.close()
-
-    return iteration, time_elapsed, coordinate, velocity
-
-
-  def output_tecplot(self, config, iteration, time_elapsed, coordinate_dict, velocity_dict, trajectory_dict):
-
-    if config['post_process']['tecplot']['flag_output'] :
-
-      # Position and velocity
-      coordinate_cart = coordinate_dict['cartesian']
-      coordinate_geod = coordinate_dict['geodetic']
-      velocity_cart   = velocity_dict['cartesian']
-      velocity_pola   = velocity_dict['polar']
-
-      # Trajectory properties
-      density_traj     = trajectory_dict['density']
-      temperature_traj = trajectory_dict['temperature']
-      knudsen_traj     = trajectory_dict['knudsen']
-
-      # Config,
-      filename_tmp = config['post_process']['directory_output'] + '/' + config['post_process']['tecplot']['filename_output']
-      dt = config['time_integration']['timestep_constant']
-      frequency_output = config['post_process']['tecplot']['frequency_output']
-
-      # Output
-      print('Writing Tecplot file... ', filename_tmp)
-      file = open(filename_tmp, "w")
-      file.write('# Tecplot data: Tacode' + self.newline_code)
-      file.write('Variables = Time[s],X[km],Y[km],Z[km],Long[deg.],Lati[deg.],Alti[km],Upl[m/s],Vpl[m/s],Wpl[m/s],VelplAbs[m/s],Dens[kg/m3],Temp[K],Kn' + self.newline_code)
-      file.write('zone t=time i= '+str(iteration/frequency_output)+' f=point' + self.newline_code )
-      for n in range(0,iteration):
-        if n%frequency_output == 0 :
-          time_tmp = float(n)*dt
-          velo_abs = np.linalg.norm(velocity_pola)
-          str_time = str( time_tmp ) + self.blank_code
-          str_coord_cart = ''
-          str_coord_geod = ''
-          str_veloc_pola = ''
-          for m in range(0,3):
-            str_coord_cart = str_coord_cart + str(coordinate_cart[n][m]*self.m2km)   + self.blank_code 
-            str_coord_geod = str_coord_geod + str(coordinate_geod[n][m]*self.unit_convert_geoditic[m]) + self.blank_code 
-            str_veloc_pola = str_veloc_pola + str(velocity_pola[n][m]) + self.blank_code 
-          #str_coord_cart = str(coordinate_cart[n][0]*self.m2km)   + self.blank_code +str(coordinate_cart[n][1]*self.m2km)    + self.blank_code + str(coordinate_cart[n][2]*self.m2km) 
-          #str_coord_geod = str(coordinate_geod[n][0]*self.rad2deg)+ self.blank_code +str(coordinate_geod[n][1]*self.rad2deg) + self.blank_code + str(coordinate_geod[n][2]*self.m2km) 
-          #str_veloc_pola = str(velocity_pola[n][0])               + self.blank_code +str(velocity_pola[n][1])                + self.blank_code + str(velocity_pola[n][2]) + str(velo_abs)
-          str_veloc_pola = str_veloc_pola + str(np.linalg.norm(velocity_pola[n])) + self.blank_code
-          str_traj       = str(density_traj[n]) + self.blank_code + str(temperature_traj[n]) + self.blank_code + str(knudsen_traj[n]) 
-          #
-          file.write( str_time  + str_coord_cart + str_coord_geod + str_veloc_pola + str_traj + self.newline_code)
-      file.close()
-
-    return
+    # Set parameters in polar coordinate from cartesian coordinate
+    # polar_coord: [radius, 極座標における緯度(beta), 極座標における経度(alpha)]
+    polar_coord = coordinate_system.set_angle_polar_array(config, coordinate_cartesian)
+    longitude = polar_coord[:,2]
+    latitude  = polar_coord[:,1]
+    velocity_cartesian   = coordinate_system.convert_polar_carteasian_array(config, velocity_polar, longitude, latitude)
 
+    return coordinate_cartesian, velocity_cartesian
 
 
   def routine_postprocess(self, config, iteration, meshnode_dict, meshelem_dict, metrics_dict, gas_property_dict, var_primitiv):
@@ -4,6 +4,11 @@
 # Date: 2022/05/31
 
 import numpy as np
+import io as io
+import shutil as shutil
+import tempfile as tempfile
+import zipfile as zipfile
+import trajectory_sink.trajectory_sink as trajectory_sink
 
 gpx_standard_year   = 2015
 gpx_standard_month  = 1
@@ -15,7 +20,7 @@ gpx_standard_second = 0
 gpx_case_name = 'Satellite_trajectory'
 
 gpx_xml = '<?xml version="1.0" encoding="UTF-8"?>'
-gpx_header = '<gpx xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="http://www.topografix.com/GPX/1/0" xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd">'
+gpx_header = '<gpx xmlns="http://www.topografix.com/GPX/1/1" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd" version="1.1" creator="Tacode">'
 gpx_footer = '</gpx>'
 
 gpx_trk_s = '<trk>'
@@ -32,142 +37,258 @@ gpx_trkpt_2 = '" lon="'
 gpx_trkpt_3 = '"><ele>'
 gpx_trkpt_4 = '</ele><time>'
 gpx_trkpt_5 = '</time></trkpt>'
+gpx_trkpt_format = gpx_trkpt_1 + '%.9f' + gpx_trkpt_2 + '%.9f' + gpx_trkpt_3 + '%.1f' + gpx_trkpt_4 + '%s' + gpx_trkpt_5
 
-newline_code ='\n'
-
-rad2deg = 180.0/np.pi
-
+kml_xml    = '<?xml version="1.0" encoding="UTF-8"?>'
+kml_header = '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">'
+kml_footer = '</kml>'
+kml_style_id = 'trajectory'
 
-def output_routine(config, iteration, coordinate_dict, velocity_dict):
+# KML color (aabbggrr) of the names in simplekml.Color
+kml_color_dict = {'white': 'ffffffff', 'black': 'ff000000', 'red': 'ff0000ff', 'green': 'ff008000', 'blue': 'ffff0000',
+                  'yellow': 'ff00ffff', 'cyan': 'ffffff00', 'magenta': 'ffff00ff', 'orange': 'ff00a5ff', 'gray': 'ff808080'}
+kml_color_default = 'ffffffff'
 
-  if config['post_process']['flag_output_gpx'] :
-    output_gpx(config, iteration, coordinate_dict, velocity_dict)
-
-  if config['post_process']['kml']['flag_output'] :
-    output_kml(config, iteration, coordinate_dict, velocity_dict)
-
-  return
+# Number of points formatted at once in the streaming writers
+number_chunk_output = 100000
 
+newline_code ='\n'
 
-def output_kml(config, iteration, coordinate_dict, velocity_dict):
+rad2deg = 180.0/np.pi
 
-  import simplekml as simplekml
 
-  coordinate_geod = coordinate_dict['geodetic']
+def get_time_iso(config, time_output):
 
-  config_kml           = config['post_process']['kml']
-  filename_tmp         = config['post_process']['directory_output'] + '/' + config_kml['filename_output']
-  linestyle_color_kml  = config_kml['linestyle_color']
-  linestyle_width_kml  = config_kml['linestyle_width']
-  extrude_kml          = config_kml['extrude']
-  frequency_output_kml = config_kml['frequency_output']
+  # ISO-8601 UTC time strings of epoch (post_process: time_epoch) + elapsed time (s)
+  time_epoch_default = '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}'.format(gpx_standard_year, gpx_standard_month, gpx_standard_day,
+                                                                          gpx_standard_hour, gpx_standard_minute, gpx_standard_second)
+  time_epoch = config['post_process'].get('time_epoch', time_epoch_default)
+  if hasattr(time_epoch, 'isoformat') :
+    # --Date or timestamp parsed by YAML (converted to UTC)
+    if getattr(time_epoch, 'tzinfo', None) is not None :
+      time_epoch = ( time_epoch - time_epoch.utcoffset() ).replace(tzinfo=None)
+    time_epoch = time_epoch.isoformat()
+  time_epoch = np.datetime64( str(time_epoch).rstrip('Z'), 'ms' )
+  time_iso   = np.datetime_as_string( time_epoch + np.round( np.asarray(time_output)*1.e3 ).astype('timedelta64[ms]'), unit='ms' )
 
-  dt = config['time_integration']['timestep_constant']
+  return np.char.add(time_iso, 'Z')
 
 
-  print('Writing KML file... ', filename_tmp)
+def get_color_kml(color):
 
-  gps_linestrings = []
-  for n in range(0,iteration):
-    if n%frequency_output_kml == 0 :
-      time_tmp = float(n)*dt
-      lat_tmp = coordinate_geod[n][1]*rad2deg
-      lon_tmp = coordinate_geod[n][0]*rad2deg
-      alt_tmp = int(coordinate_geod[n][2])
-      gps_linestrings.append( [str(time_tmp), str(lon_tmp), str(lat_tmp), str(alt_tmp), str(linestyle_color_kml)] )
+  # simplekml.Color.*** (former config) or aabbggrr
+  color = str(color)
+  if color.startswith('simplekml.Color.') :
+    return kml_color_dict.get( color.split('.')[-1], kml_color_default )
+  elif len(color) == 8 :
+    return color
+  else :
+    return kml_color_dict.get( color, kml_color_default )
 
-  kml = simplekml.Kml()
 
-  for linestring in gps_linestrings:
-#    ls = kml.newlinestring(name=unicode(linestring[0], 'utf-8'))
-    ls = kml.newlinestring(name='Time_'+linestring[0])
-    ls.style.linestyle.color = linestring[4]
-    ls.style.linestyle.width = linestyle_width_kml
-    ls.extrude = extrude_kml
-    ls.altitudemode = simplekml.AltitudeMode.absolute
-    ls.coords = [(float(linestring[1]), float(linestring[2]), float(linestring[3]))]
+def write_chunk(file, format_point, value_list):
 
-  kml.save(filename_tmp)
+  # Points of (N) arrays in value_list are formatted by one operation per chunk (columns may differ in type)
+  number_point = len(value_list[0])
+  for n in range(0, number_point, number_chunk_output):
+    column_list = [ np.asarray( value[n:n+number_chunk_output] ).tolist() for value in value_list ]
+    file.write( (format_point*len(column_list[0])) % tuple( value for point in zip(*column_list) for value in point ) )
 
   return
 
 
-def output_gpx(config, iteration, coordinate_dict, velocity_dict):
-
-  import gpxpy as gpxpy
+class kml_sink:
+  #
+  # Streaming KML writer: one style and one LineString of all output points (or LineStrings of number_point_linestring points)
+  # --Points are written as the chunks of the trajectory arrive (every frequency_output sample)
+  # --flag_track: time-stamped gx:Track is added (when and coord are kept in temporary files until close)
+  # --KMZ is written in the same pass when filename_output ends with .kmz
+  # --Restart: points from index_start are written to a new file with the suffix of index_start
+  #
 
-  if config['post_process']['flag_output_gpx'] :
+  def __init__(self, config, index_start=0):
 
-    coordinate_geod = coordinate_dict['geodetic']
-
-    filename_tmp = config['post_process']['directory_output'] + '/' + config['post_process']['filename_output_gpx']
+    config_kml = config['post_process']['kml']
+    self.config           = config
+    self.filename         = trajectory_sink.get_filename_restart( config, config['post_process']['directory_output'] + '/' + config_kml['filename_output'], index_start )
+    self.frequency_output = config_kml['frequency_output']
+    self.extrude          = config_kml['extrude']
+    self.number_point_linestring = config_kml.get('number_point_linestring', 0)
+    self.flag_track              = config_kml.get('flag_track', False)
+    if self.number_point_linestring <= 1 :
+      self.number_point_linestring = np.iinfo(np.int64).max
 
-    gpx_file = open(filename_tmp, 'w')
+    # Number of points written, LineString being written and the last point (start point of the next LineString)
+    self.number_point    = 0
+    self.flag_linestring = False
+    self.point_last      = None
 
-    gpx = gpxpy.gpx.GPX()
+    print('Writing KML file... ', self.filename)
 
-    # Create first track in our GPX:
-    gpx_track = gpxpy.gpx.GPXTrack()
-    gpx.tracks.append(gpx_track)
+    if self.filename.endswith('.kmz') :
+      self.file_kmz = zipfile.ZipFile(self.filename, 'w', compression=zipfile.ZIP_DEFLATED)
+      self.file = io.TextIOWrapper( self.file_kmz.open('doc.kml', 'w'), encoding='utf-8' )
+    else :
+      self.file_kmz = None
+      self.file = open(self.filename, 'w', encoding='utf-8')
 
-    # Time
-    #time_set = datetime(2018,1,1,0,0)   # (1)initial date
-    #gps_delta = timedelta(seconds=1)    # (2)gps period: 1s
+    if self.flag_track :
+      self.file_when  = tempfile.TemporaryFile('w+', encoding='utf-8')
+      self.file_coord = tempfile.TemporaryFile('w+', encoding='utf-8')
 
-    # Create first segment in our GPX track:
-    gpx_segment = gpxpy.gpx.GPXTrackSegment()
-    gpx_track.segments.append(gpx_segment)
+    # --Header and shared style
+    file = self.file
+    file.write( kml_xml + newline_code )
+    file.write( kml_header + newline_code )
+    file.write( '<Document>' + newline_code )
+    file.write( '<name>' + gpx_case_name + '</name>' + newline_code )
+    file.write( '<Style id="' + kml_style_id + '"><LineStyle><color>' + get_color_kml( config_kml['linestyle_color'] ) + '</color><width>' + str(config_kml['linestyle_width']) + '</width></LineStyle></Style>' + newline_code )
 
-    # Create points:
-    for n in range(0,iteration):
-      lat_tmp = coordinate_geod[n][1]*rad2deg
-      lon_tmp = coordinate_geod[n][0]*rad2deg
-      alt_tmp = int(coordinate_geod[n][2])
-      gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(lat_tmp, lon_tmp, elevation=alt_tmp)) 
+    return
 
-    #gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(2.1234, 5.1234, elevation=1234))
-    #gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(2.1235, 5.1235, elevation=1235))
-    #gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(2.1236, 5.1236, elevation=1236))
 
-    # You can add routes and waypoints, too...
-    #print('Created GPX:', gpx.to_xml())
-    gpx_file.write(gpx.to_xml())
-    gpx_file.close()
-
-  return
-
-
-def output_gpx_native(config, iteration, coordinate_dict, velocity_dict):
-
-  if config['post_process']['flag_output_gpx'] :
+  def write(self, index_global, coordinate_dict, velocity_dict, trajectory_dict):
 
+    index_output = np.flatnonzero( index_global % self.frequency_output == 0 )
     coordinate_geod = coordinate_dict['geodetic']
-
-    filename_tmp = config['post_process']['directory_output'] + '/' + config['post_process']['filename_output_gpx']
-    print( 'Writing GPX file... ', filename_tmp )
-    file = open(filename_tmp, "w")
+    lon_tmp  = coordinate_geod[index_output,0]*rad2deg
+    lat_tmp  = coordinate_geod[index_output,1]*rad2deg
+    alt_tmp  = coordinate_geod[index_output,2]
+    time_tmp = trajectory_dict['time'][index_output]
+    number_chunk = len(index_output)
+
+    # --LineStrings (neighboring LineStrings share the end point)
+    file = self.file
+    n = 0
+    while n < number_chunk :
+      if not self.flag_linestring :
+        time_start = self.point_last[3] if self.point_last is not None else time_tmp[n]
+        file.write( '<Placemark>' + newline_code )
+        file.write( '<name>Time_' + str(time_start) + '</name>' + newline_code )
+        file.write( '<styleUrl>#' + kml_style_id + '</styleUrl>' + newline_code )
+        file.write( '<LineString><extrude>' + str(self.extrude) + '</extrude><altitudeMode>absolute</altitudeMode><coordinates>' + newline_code )
+        if self.point_last is not None :
+          write_chunk( file, '%.9f,%.9f,%.1f' + newline_code, [ [value] for value in self.point_last[0:3] ] )
+        self.flag_linestring = True
+
+      # Points up to the end point of this LineString (number of point: multiple of number_point_linestring)
+      number_end = max( -( -self.number_point//self.number_point_linestring ), 1 )*self.number_point_linestring
+      number_write = int( min(number_end - self.number_point + 1, number_chunk - n) )
+      index_chunk  = slice(n, n+number_write)
+      write_chunk( file, '%.9f,%.9f,%.1f' + newline_code, [lon_tmp[index_chunk], lat_tmp[index_chunk], alt_tmp[index_chunk]] )
+      n += number_write
+      self.number_point += number_write
+      self.point_last = (lon_tmp[n-1], lat_tmp[n-1], alt_tmp[n-1], time_tmp[n-1])
+
+      if self.number_point - 1 == number_end :
+        self.close_linestring()
+
+    # --Time-stamped track
+    if self.flag_track :
+      write_chunk( self.file_when, '<when>%s</when>' + newline_code, [ get_time_iso(self.config, time_tmp) ] )
+      write_chunk( self.file_coord, '<gx:coord>%.9f %.9f %.1f</gx:coord>' + newline_code, [lon_tmp, lat_tmp, alt_tmp] )
+
+    file.flush()
+
+    return
+
+
+  def close_linestring(self):
+
+    self.file.write( '</coordinates></LineString>' + newline_code )
+    self.file.write( '</Placemark>' + newline_code )
+    self.flag_linestring = False
+
+    return
+
+
+  def close(self):
+
+    if self.flag_linestring :
+      self.close_linestring()
+
+    file = self.file
+    if self.flag_track :
+      file.write( '<Placemark>' + newline_code )
+      file.write( '<name>Track</name>' + newline_code )
+      file.write( '<styleUrl>#' + kml_style_id + '</styleUrl>' + newline_code )
+      file.write( '<gx:Track><altitudeMode>absolute</altitudeMode>' + newline_code )
+      for file_tmp in [self.file_when, self.file_coord]:
+        file_tmp.seek(0)
+        shutil.copyfileobj(file_tmp, file)
+        file_tmp.close()
+      file.write( '</gx:Track>' + newline_code )
+      file.write( '</Placemark>' + newline_code )
+
+    file.write( '</Document>' + newline_code )
+    file.write( kml_footer + newline_code )
+    file.close()
+    if self.file_kmz is not None :
+      self.file_kmz.close()
+
+    return
+
+
+class gpx_sink:
+  #
+  # Streaming GPX writer: track points are formatted from the array columns of each chunk of the trajectory
+  # --Time: ISO-8601 of post_process: time_epoch + elapsed time
+  # --frequency_output_gpx: every N-th sample is written (decimation)
+  # --Restart: track points before index_start are kept, and the footer is written again at close
+  #
+
+  def __init__(self, config, index_start=0):
+
+    self.config   = config
+    self.filename = config['post_process']['directory_output'] + '/' + config['post_process']['filename_output_gpx']
+    self.frequency_output = config['post_process'].get('frequency_output_gpx', 1)
+
+    # --Header: 6 lines
+    if index_start > 0 :
+      number_row = trajectory_sink.truncate_restart( self.filename, 6, -( -index_start//self.frequency_output ),
+                                                     lambda line: line.startswith( gpx_trkpt_1.encode() ) )
+      if number_row is not None :
+        print( 'Appending GPX file... ', self.filename )
+        self.file = open(self.filename, "a", encoding='utf-8')
+        return
+
+    print( 'Writing GPX file... ', self.filename )
+    self.file = open(self.filename, "w", encoding='utf-8')
 
     # --Header
+    file = self.file
     file.write( gpx_xml    + newline_code )
     file.write( gpx_header + newline_code )
     file.write( gpx_trk_s  + newline_code )
     file.write( gpx_name_s + gpx_case_name+gpx_name_e + newline_code )
     file.write( gpx_number_s + '1' + gpx_number_e + newline_code )
     file.write( gpx_trkseg_s  + newline_code )
+    file.flush()
 
-    for n in range(0,iteration):
-      lat_tmp = coordinate_geod[n][1]*rad2deg
-      lon_tmp = coordinate_geod[n][0]*rad2deg
-      alt_tmp = coordinate_geod[n][2]
-      gpx_tmp = gpx_trkpt_1 + str(lat_tmp) + gpx_trkpt_2 + str(lon_tmp) +  gpx_trkpt_3 + str(alt_tmp) + gpx_trkpt_4 + '2015-01-01T00:00:' + str(n) + 'Z' + gpx_trkpt_5
-      file.write(gpx_tmp + newline_code)
+    return
 
-    file.write( gpx_trkseg_e + newline_code )
-    file.write( gpx_trk_e + newline_code )
-    file.write( gpx_footer )
 
-  return 
+  def write(self, index_global, coordinate_dict, velocity_dict, trajectory_dict):
+
+    # --Track points
+    index_output = np.flatnonzero( index_global % self.frequency_output == 0 )
+    coordinate_geod = coordinate_dict['geodetic']
+    lat_tmp  = coordinate_geod[index_output,1]*rad2deg
+    lon_tmp  = coordinate_geod[index_output,0]*rad2deg
+    alt_tmp  = coordinate_geod[index_output,2]
+    time_iso = get_time_iso( self.config, trajectory_dict['time'][index_output] )
+    write_chunk( self.file, gpx_trkpt_format + newline_code, [lat_tmp, lon_tmp, alt_tmp, time_iso] )
+    self.file.flush()
+
+    return
 
 
+  def close(self):
 
+    file = self.file
+    file.write( gpx_trkseg_e + newline_code )
+    file.write( gpx_trk_e + newline_code )
+    file.write( gpx_footer + newline_code )
+    file.close()
 
+    return
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+# Timing and counts of the phases of the time integration
+# --Functions called in the step loop are replaced by timed wrappers (the functions themselves are used when disabled,
+#   so that there is no overhead)
+# --Time of each phase is exclusive: time of the wrapped functions called inside (e.g., output writers called by
+#   the trajectory store) is counted in their own phase
+# --Time not in any phase (e.g., Dormand-Prince stages and step control) is shown as Others
+#
+# Import time of each module at the start of the program (--profile-startup)
+# --Only light standard modules are imported here, since this module is imported before the others
+
+import sys as sys
+import time as time
+import json as json
+
+# Dict key in config
+KEY_PROFILE = 'profile'
+
+# Phases
+KEY_GEODETIC    = 'Geodetic conversion'
+KEY_ATMOSPHERE  = 'Atmosphere lookup'
+KEY_AERODYNAMIC = 'CD lookup'
+KEY_FORCE       = 'Force evaluation'
+KEY_UPDATE      = 'Time scheme update'
+KEY_CONVERSION  = 'Post-step conversion'
+KEY_STORE       = 'Trajectory store'
+KEY_LOGGING     = 'Logging'
+KEY_EVENT       = 'Event detection'
+KEY_CHECKPOINT  = 'Checkpoint'
+KEY_OTHERS      = 'Others'
+PREFIX_OUTPUT   = 'Output: '
+
+LIST_PHASE = [KEY_GEODETIC, KEY_ATMOSPHERE, KEY_AERODYNAMIC, KEY_FORCE, KEY_UPDATE, KEY_CONVERSION, KEY_STORE, KEY_LOGGING, KEY_EVENT, KEY_CHECKPOINT]
+
+filename_output_default = 'profile.json'
+
+# Option of the import time (read from sys.argv before the imports)
+OPTION_STARTUP = '--profile-startup'
+
+# Number of modules in the table of the import time
+number_module_startup = 20
+
+
+class stage_profiler:
+  #
+  # Profile of one run (or the sum of several runs by merge)
+  # --wrap(): timed wrapper of a function for a phase
+  # --wrap_sink(): timed write and close of the output writers of the trajectory
+  # --start()/stop(): wall time of the run
+  #
+
+  def __init__(self, config=None, number_case=1):
+
+    # number_case: 0 for the sum of the runs by merge
+    config_profile = {}
+    if config is not None :
+      config_profile = config.get(KEY_PROFILE, None) or {}
+    self.flag_profile    = config_profile.get('flag_profile', False)
+    self.filename_output = config_profile.get('filename_output', filename_output_default)
+
+    self.time_dict  = {}
+    self.count_dict = {}
+    for key in LIST_PHASE:
+      self.time_dict[key]  = 0.0
+      self.count_dict[key] = 0
+    self.time_wall   = 0.0
+    self.number_case = number_case
+    self.time_start  = None
+
+    # Time of the wrapped functions called inside the current one
+    self.time_child = 0.0
+
+    return
+
+
+  def wrap(self, key, function):
+
+    if not self.flag_profile :
+      return function
+
+    self.time_dict.setdefault(key, 0.0)
+    self.count_dict.setdefault(key, 0)
+    perf_counter = time.perf_counter
+
+    def function_timed(*args, **kwargs):
+      time_child_outer = self.time_child
+      self.time_child  = 0.0
+      time_start = perf_counter()
+      value = function(*args, **kwargs)
+      time_elapsed = perf_counter() - time_start
+      self.time_dict[key]  += time_elapsed - self.time_child
+      self.count_dict[key] += 1
+      self.time_child = time_child_outer + time_elapsed
+      return value
+
+    return function_timed
+
+
+  def wrap_sink(self, trajectory):
+
+    # Output writers set to the trajectory (set_sink)
+    if not self.flag_profile :
+      return
+
+    for sink in trajectory.sink_list:
+      key = PREFIX_OUTPUT + type(sink).__name__
+      sink.write = self.wrap(key, sink.write)
+      sink.close = self.wrap(key, sink.close)
+
+    return
+
+
+  def start(self):
+
+    self.time_start = time.perf_counter()
+
+    return
+
+
+  def stop(self):
+
+    if self.time_start is not None :
+      self.time_wall += time.perf_counter() - self.time_start
+      self.time_start = None
+
+    return
+
+
+  def get_dict(self):
+
+    # Time (s) and calls of each phase, Others: wall time not in any phase
+    phase_dict = {}
+    for key in self.time_dict:
+      phase_dict[key] = {'time': self.time_dict[key], 'count': self.count_dict[key]}
+    phase_dict[KEY_OTHERS] = {'time': max( self.time_wall - sum(self.time_dict.values()), 0.0 ), 'count': 0}
+
+    return {'number_case': self.number_case, 'wall_time': self.time_wall, 'phase': phase_dict}
+
+
+  def merge(self, profile_dict):
+
+    # Sum of the profiles (profile_dict: get_dict() of another run, or its JSON)
+    self.number_case += profile_dict.get('number_case', 1)
+    self.time_wall   += profile_dict['wall_time']
+    for key, value in profile_dict['phase'].items():
+      if key == KEY_OTHERS :
+        continue
+      self.time_dict[key]  = self.time_dict.get(key, 0.0) + value['time']
+      self.count_dict[key] = self.count_dict.get(key, 0) + value['count']
+
+    return
+
+
+  def print_table(self, label='Profile of time integration'):
+
+    profile_dict = self.get_dict()
+    time_wall    = max(profile_dict['wall_time'], 1.e-12)
+    print(label+': cases:', profile_dict['number_case'], ', wall time (s):', '{:.3f}'.format(profile_dict['wall_time']))
+    print('--'+'Phase'.ljust(32), 'Calls'.rjust(12), 'Time (s)'.rjust(12), 'Per call (us)'.rjust(14), 'Share (%)'.rjust(10))
+    for key, value in profile_dict['phase'].items():
+      if value['count'] == 0 and value['time'] == 0.0 :
+        continue
+      if value['count'] > 0 :
+        time_call = '{:.3f}'.format(value['time']/value['count']*1.e6)
+      else :
+        time_call = '-'
+      print('--'+key.ljust(32), str(value['count']).rjust(12), '{:.4f}'.format(value['time']).rjust(12), time_call.rjust(14),
+            '{:.1f}'.format(value['time']/time_wall*100.0).rjust(10))
+
+    return
+
+
+  def write_json(self, filename):
+
+    print('Writing profile... ', filename)
+    with open(filename, 'w') as file:
+      json.dump(self.get_dict(), file, indent=2)
+
+    return
+
+
+  def output(self, config):
+
+    # Table, and JSON in post_process: directory_output (filename_output: empty for the table only)
+    if not self.flag_profile :
+      return
+
+    self.stop()
+    self.print_table()
+    if self.filename_output :
+      self.write_json(config['post_process']['directory_output'] + '/' + self.filename_output)
+
+    return
+
+
+class import_profiler:
+  #
+  # Import time of the modules loaded after the start (similar to python -X importtime)
+  # --This finder at the head of sys.meta_path finds the module by the other finders and times its execution
+  # --Self time excludes the modules imported inside, cumulative time includes them
+  #
+
+  def __init__(self, flag_profile=False):
+
+    self.flag_profile = flag_profile
+    self.time_dict    = {}
+    self.time_child   = 0.0
+    self.time_start   = time.perf_counter()
+
+    if flag_profile :
+      sys.meta_path.insert(0, self)
+
+    return
+
+
+  def find_spec(self, fullname, path=None, target=None):
+
+    for finder in sys.meta_path:
+      if finder is self or not hasattr(finder, 'find_spec') :
+        continue
+      spec = finder.find_spec(fullname, path, target)
+      if spec is not None :
+        break
+    else :
+      return None
+
+    # Loaders shared as classes (built-in and frozen modules) are not wrapped
+    loader = spec.loader
+    if loader is None or isinstance(loader, type) or not hasattr(loader, 'exec_module') :
+      return spec
+
+    exec_module  = loader.exec_module
+    perf_counter = time.perf_counter
+
+    def exec_module_timed(module):
+      time_child_outer = self.time_child
+      self.time_child  = 0.0
+      time_start = perf_counter()
+      try :
+        exec_module(module)
+      finally :
+        time_elapsed = perf_counter() - time_start
+        self.time_dict[fullname] = [time_elapsed - self.time_child, time_elapsed]
+        self.time_child = time_child_outer + time_elapsed
+
+    loader.exec_module = exec_module_timed
+
+    return spec
+
+
+  def output(self):
+
+    # Table of the modules with the longest self time, and the time by top-level package
+    if not self.flag_profile :
+      return
+
+    if self in sys.meta_path :
+      sys.meta_path.remove(self)
+
+    time_wall = time.perf_counter() - self.time_start
+    package_dict = {}
+    for key, value in self.time_dict.items():
+      package = key.split('.')[0]
+      package_dict[package] = package_dict.get(package, 0.0) + value[0]
+
+    print('Startup import time: modules:', len(self.time_dict), ', imports (s):', '{:.3f}'.format(sum(package_dict.values())),
+          ', wall time (s):', '{:.3f}'.format(time_wall))
+    print('--'+'Package'.ljust(48), 'Self (ms)'.rjust(12))
+    for key, value in sorted(package_dict.items(), key=lambda item: -item[1])[0:number_module_startup]:
+      print('--'+key.ljust(48), '{:.2f}'.format(value*1.e3).rjust(12))
+    print('--'+'Module'.ljust(48), 'Self (ms)'.rjust(12), 'Cumul. (ms)'.rjust(12))
+    for key, value in sorted(self.time_dict.items(), key=lambda item: -item[1][0])[0:number_module_startup]:
+      print('--'+key.ljust(48), '{:.2f}'.format(value[0]*1.e3).rjust(12), '{:.2f}'.format(value[1]*1.e3).rjust(12))
+
+    return
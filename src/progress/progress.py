@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Progress report of the time integration
+
+import time as time
+
+# Dict key in config
+KEY_PROGRESS       = 'progress'
+KEY_FREQUENCY_STEP = 'frequency_step'
+KEY_INTERVAL_WALL  = 'interval_wall'
+KEY_FLAG_QUIET     = 'flag_quiet'
+
+# Default: every step is reported (same as the former per-step print)
+frequency_step_default = 1
+interval_wall_default  = 0.0
+
+
+class progress_reporter:
+  #
+  # Decides when a progress line is printed and counts steps and force evaluations for the final summary
+  # --frequency_step: a line every N steps (0: not used)
+  # --interval_wall: a line every T seconds of wall time (0: not used)
+  # --flag_quiet: no progress lines, only the final summary
+  #
+
+  def __init__(self, config):
+
+    config_progress = config.get(KEY_PROGRESS, None) or {}
+    self.frequency_step = int( config_progress.get(KEY_FREQUENCY_STEP, frequency_step_default) )
+    self.interval_wall  = float( config_progress.get(KEY_INTERVAL_WALL, interval_wall_default) )
+    self.flag_quiet     = config_progress.get(KEY_FLAG_QUIET, False)
+
+    self.number_step   = 0
+    self.number_force  = 0
+    self.number_output = 0
+    self.time_start    = time.perf_counter()
+    self.time_last     = self.time_start
+
+    return
+
+
+  def print_header(self, header):
+
+    if not self.flag_quiet :
+      print(header)
+
+    return
+
+
+  def count(self, number_step, number_force):
+
+    # Steps and force evaluations since the start
+    self.number_step  += number_step
+    self.number_force += number_force
+
+    return
+
+
+  def check_output(self):
+
+    # True when a progress line is due at this output
+    self.number_output += 1
+    if self.flag_quiet :
+      return False
+
+    if self.frequency_step > 0 and self.number_output % self.frequency_step == 0 :
+      self.time_last = time.perf_counter()
+      return True
+
+    if self.interval_wall > 0.0 :
+      time_now = time.perf_counter()
+      if time_now - self.time_last >= self.interval_wall :
+        self.time_last = time_now
+        return True
+
+    return False
+
+
+  def print_summary(self, label='Time integration'):
+
+    time_elapsed = max( time.perf_counter() - self.time_start, 1.e-12 )
+    print(label+': steps:', self.number_step, ', force evaluations:', self.number_force,
+          ', wall time (s):', '{:.3f}'.format(time_elapsed),
+          ', steps/s:', '{:.1f}'.format(self.number_step/time_elapsed),
+          ', force evaluations/s:', '{:.1f}'.format(self.number_force/time_elapsed) )
+
+    return
@@ -2,6 +2,9 @@
 
 import numpy as np
 import os as os
+import bisect as bisect
+import database_cache.database_cache as database_cache
+import shared_table.shared_table as shared_table
 
 # Dict key
 KEY_LENGTH   = 'characteristic_length'
@@ -9,14 +12,46 @@ KEY_AREA     = 'characteristic_area'
 KEY_MASS     = 'mass'
 KEY_DRAG     = 'drag_coefficient'
 
-KEY_KN      = 'Knudsen_number'
-KEY_CD_MEAN = 'CD_mean'
-KEY_ALT     = 'Altitude'
+KEY_AOA      = 'angle_of_attack'
+KEY_SDV      = 'aerodynamic_sdv_factor'
+
+KEY_KN        = 'Knudsen_number'
+KEY_ANGLE     = 'Angle_of_attack'
+KEY_CD_MEAN   = 'CD_mean'
+KEY_ALT       = 'Altitude'
+KEY_TABLE     = 'Table'
+KEY_TABLE_AOA = 'Table_angle_of_attack'
+
+# Columns of the aerodynamic file after Kn (CFx is kept as CD_mean)
+# --Force and moment coefficients in the body axes: x: axial (drag at AoA 0), y: side, z: normal (lift at AoA 0)
+LIST_COEFFICIENT = [KEY_CD_MEAN, 'CFy', 'CFz', 'CMx', 'CMy', 'CMz', 'SDV_CFx', 'SDV_CFy', 'SDV_CFz', 'SDV_CMx', 'SDV_CMy', 'SDV_CMz']
+INDEX_CFX     = 0
+INDEX_CFY     = 1
+INDEX_CFZ     = 2
+INDEX_SDV_CFX = 6
+INDEX_SDV_CFZ = 8
+# --Columns for the coefficients in the wind axes
+INDEX_WIND    = [INDEX_CFX, INDEX_CFY, INDEX_CFZ, INDEX_SDV_CFX, INDEX_SDV_CFZ]
 
 
 def initial_settings_satellite(config):
 
-  aerodynamic_dict = read_aerodynamic_file(config)
+  # Table published by the Monte-Carlo driver (read-only views shared by the case processes): no parse
+  aerodynamic_dict = shared_table.attach_table('aerodynamic', get_key_shared(config))
+  if aerodynamic_dict is not None :
+    aerodynamic_dict = set_aerodynamic_table(config, aerodynamic_dict)
+    return aerodynamic_dict
+
+  # Parsed table is read from the binary cache (cache: flag_cache) while the source file is unchanged
+  filename_cache   = database_cache.get_filename_cache(config, 'aerodynamic', get_filename_aerodynamic(config))
+  aerodynamic_dict = database_cache.read_cache(filename_cache)
+
+  if aerodynamic_dict is None :
+    aerodynamic_dict = read_aerodynamic_file(config)
+
+    database_cache.write_cache(filename_cache, aerodynamic_dict)
+
+  aerodynamic_dict = set_aerodynamic_table(config, aerodynamic_dict)
 
   return aerodynamic_dict
 
@@ -31,7 +66,22 @@ def set_satellite_property(config):
   return
 
 
-def read_aerodynamic_file(config):
+def get_key_shared(config):
+
+  # Parameters of the table to be checked by the case processes
+  return [ os.path.realpath( get_filename_aerodynamic(config) ) ]
+
+
+def publish_aerodynamic(config, aerodynamic_dict, directory):
+
+  # Arrays of the table for the case processes (shared_table)
+  data_dict = { key: aerodynamic_dict[key] for key in aerodynamic_dict if key not in [KEY_TABLE, KEY_TABLE_AOA] }
+  shared_table.publish_table(directory, 'aerodynamic', get_key_shared(config), data_dict)
+
+  return
+
+
+def get_filename_aerodynamic(config):
 
   script_directory = os.path.dirname(os.path.realpath(__file__))
   if config['satellite']['directory_path_specify'] == 'auto' or config['satellite']['directory_path_specify'] == 'default':
@@ -41,30 +91,46 @@ def read_aerodynamic_file(config):
   else :
     directory_path = script_directory + '/../../database/aerodynamice' 
 
-  filename_tmp = directory_path + '/' + config['satellite']['filename_aerodynamic']
+  return directory_path + '/' + config['satellite']['filename_aerodynamic']
+
+
+def read_aerodynamic_file(config):
+
+  filename_tmp = get_filename_aerodynamic(config)
   print('Reading aerodynamic model...:', filename_tmp)
 
-  # File open
-  delimiter = None
-  comments = '#'
-  skiprows = 3
-  data_input = np.loadtxt(filename_tmp, delimiter=delimiter, comments=comments, skiprows=skiprows)
-  kn_aero  = data_input[:,0]
-  cfx_mean = data_input[:,1]
-  cfy_mean = data_input[:,2]
-  cfz_mean = data_input[:,3]
-  cmx_mean = data_input[:,4]
-  cmy_mean = data_input[:,5]
-  cmz_mean = data_input[:,6]
-  cfx_std = data_input[:,7]
-  cfy_std = data_input[:,8]
-  cfz_std = data_input[:,9]
-  cmx_std = data_input[:,10]
-  cmy_std = data_input[:,11]
-  cmz_std = data_input[:,12]
-  alt_aero = data_input[:,13]
-
-  aerodynamic_dict = {KEY_KN:kn_aero, KEY_CD_MEAN:cfx_mean, KEY_ALT:alt_aero}
+  # Blocks headed by "AOA <deg>", each with the rows of Kn and the coefficients (AoA 0 when there is no header)
+  # --Rows of all blocks are kept in one table with the column of AoA
+  comments  = '#'
+  angle_tmp = 0.0
+  row_list   = []
+  angle_list = []
+  with open(filename_tmp) as file:
+    for line in file:
+      words = line.split(comments)[0].split()
+      if len(words) == 0 :
+        continue
+      if words[0].upper() == 'AOA' :
+        angle_tmp = float(words[1])
+        continue
+      try :
+        float(words[0])
+      except ValueError :
+        # Title and variables
+        continue
+      row_list.append(words)
+      angle_list.append(angle_tmp)
+
+  data_input = np.array(row_list, dtype=np.float64)
+  if data_input.ndim != 2 or data_input.shape[1] < len(LIST_COEFFICIENT) + 2 :
+    print('Columns of the aerodynamic file are incorrect:', filename_tmp)
+    print('Program stopped.')
+    exit()
+
+  aerodynamic_dict = {KEY_KN: data_input[:,0], KEY_ANGLE: np.array(angle_list, dtype=np.float64)}
+  for m in range(0, len(LIST_COEFFICIENT)):
+    aerodynamic_dict[ LIST_COEFFICIENT[m] ] = data_input[:,m+1]
+  aerodynamic_dict[KEY_ALT] = data_input[:,len(LIST_COEFFICIENT)+1]
 
   return aerodynamic_dict
 
@@ -87,3 +153,312 @@ def get_aerodynamic_coefficient(knudsen, knudsen_aerodynamic, cdmean_aerodynamic
   return cdmean
 
 
+def set_aerodynamic_table(config, aerodynamic_dict):
+
+  # Breakpoints and slopes are built only once here and reused by the solver at every stage
+  # --Table: drag coefficient at the lowest AoA of the file (CFx of AOA 0 for the file of one block)
+  print('Setting lookup table of aerodynamic model...')
+
+  table_aoa = aerodynamic_table_aoa(aerodynamic_dict[KEY_KN], aerodynamic_dict[KEY_ANGLE],
+                                    np.stack([ aerodynamic_dict[key] for key in LIST_COEFFICIENT ], axis=1))
+  aerodynamic_dict[KEY_TABLE_AOA] = table_aoa
+  aerodynamic_dict[KEY_TABLE]     = table_aoa.get_table(table_aoa.angle_aer[0])
+
+  return aerodynamic_dict
+
+
+def get_value_case(config, key, value_default):
+
+  # Value of the case in satellite (list as density_factor, so that it can be dispersed by Monte-Carlo simulation)
+  value = config['satellite'].get(key, None)
+  if value is None :
+    return value_default
+  if isinstance(value, list) :
+    value = value[0]
+
+  return float(value)
+
+
+def get_angle_of_attack(config):
+
+  # Angle of attack of the case, deg
+  return get_value_case(config, KEY_AOA, 0.0)
+
+
+def get_sdv_factor(config):
+
+  # Coefficients of the case: mean + factor * standard deviation (drawn by Monte-Carlo simulation)
+  return get_value_case(config, KEY_SDV, 0.0)
+
+
+def get_flag_lift(config):
+
+  # Lift and side force in addition to drag (aerodynamic model: fileread)
+  return config['satellite'].get('flag_lift', False) and config['satellite']['kind_aerodynamic_model'] == 'fileread'
+
+
+def get_table(config, aerodynamic_dict):
+
+  # Lookup table in Knudsen number of the case
+  # --Coefficients at the angle of attack and with the standard deviations of the case are blended once here
+  table_aoa  = aerodynamic_dict[KEY_TABLE_AOA]
+  angle      = get_angle_of_attack(config)
+  sdv_factor = get_sdv_factor(config)
+  if table_aoa.number_angle > 1 or angle != 0.0 or sdv_factor != 0.0 :
+    print('Aerodynamic table at angle of attack:', angle, 'deg, standard deviation factor:', sdv_factor)
+
+  return table_aoa.get_table(angle, sdv_factor)
+
+
+class aerodynamic_table:
+  #
+  # Linear interpolation of drag coefficient with respect to Knudsen number (same as interp1d, kind="linear")
+  # --Values are clamped to the end values outside of the table
+  # --Interval is found by binary search on the sorted breakpoints
+  #
+
+  def __init__(self, knudsen_aerodynamic, cdmean_aerodynamic, side_aerodynamic=None, lift_aerodynamic=None):
+
+    # side_aerodynamic, lift_aerodynamic: side force and lift coefficients for evaluate_vector (default: zero)
+    knudsen_aer = np.asarray(knudsen_aerodynamic, dtype=np.float64)
+    cdmean_aer  = np.asarray(cdmean_aerodynamic, dtype=np.float64)
+    side_aer    = np.zeros_like(knudsen_aer) if side_aerodynamic is None else np.asarray(side_aerodynamic, dtype=np.float64)
+    lift_aer    = np.zeros_like(knudsen_aer) if lift_aerodynamic is None else np.asarray(lift_aerodynamic, dtype=np.float64)
+    # --Sorted copies only when the breakpoints are not in ascending order (shared tables are used as they are)
+    if np.any( np.diff(knudsen_aer) < 0.0 ) :
+      index_sort  = np.argsort(knudsen_aer, kind='stable')
+      knudsen_aer = knudsen_aer[index_sort]
+      cdmean_aer  = cdmean_aer[index_sort]
+      side_aer    = side_aer[index_sort]
+      lift_aer    = lift_aer[index_sort]
+
+    self.num_interval = len(knudsen_aer) - 1
+    self.knudsen_aer  = knudsen_aer
+    self.cdmean_aer   = cdmean_aer
+    self.slope_aer    = np.diff(cdmean_aer)/np.diff(knudsen_aer)
+
+    # Python floats for the scalar routine
+    self.knudsen_list = knudsen_aer.tolist()
+    self.cdmean_list  = cdmean_aer.tolist()
+    self.slope_list   = self.slope_aer.tolist()
+    self.knudsen_min  = self.knudsen_list[0]
+    self.knudsen_max  = self.knudsen_list[-1]
+
+    # Side force and lift (evaluate_vector)
+    self.side_aer        = side_aer
+    self.lift_aer        = lift_aer
+    self.slope_side_aer  = np.diff(side_aer)/np.diff(knudsen_aer)
+    self.slope_lift_aer  = np.diff(lift_aer)/np.diff(knudsen_aer)
+    self.side_list       = side_aer.tolist()
+    self.lift_list       = lift_aer.tolist()
+    self.slope_side_list = self.slope_side_aer.tolist()
+    self.slope_lift_list = self.slope_lift_aer.tolist()
+
+    return
+
+
+  def evaluate(self, knudsen):
+
+    # Interpolate aerodynamic data from knudsen number of satellite
+
+    if knudsen < self.knudsen_min :
+      return self.cdmean_list[0]
+    elif knudsen > self.knudsen_max :
+      return self.cdmean_list[-1]
+
+    i = bisect.bisect_right(self.knudsen_list, knudsen) - 1
+    if i >= self.num_interval :
+      i = self.num_interval - 1
+
+    return self.cdmean_list[i] + self.slope_list[i]*( knudsen - self.knudsen_list[i] )
+
+
+  def evaluate_array(self, knudsen):
+
+    # Same as evaluate() for an array of Knudsen number
+
+    knudsen_clip = np.clip(np.asarray(knudsen, dtype=np.float64), self.knudsen_min, self.knudsen_max)
+    index = np.searchsorted(self.knudsen_aer, knudsen_clip, side='right') - 1
+    index = np.clip(index, 0, self.num_interval-1)
+
+    return self.cdmean_aer[index] + self.slope_aer[index]*( knudsen_clip - self.knudsen_aer[index] )
+
+
+  def evaluate_vector(self, knudsen):
+
+    # Drag, side force and lift coefficients at a Knudsen number (one binary search for the three)
+
+    if knudsen < self.knudsen_min :
+      return self.cdmean_list[0], self.side_list[0], self.lift_list[0]
+    elif knudsen > self.knudsen_max :
+      return self.cdmean_list[-1], self.side_list[-1], self.lift_list[-1]
+
+    i = bisect.bisect_right(self.knudsen_list, knudsen) - 1
+    if i >= self.num_interval :
+      i = self.num_interval - 1
+    delta = knudsen - self.knudsen_list[i]
+
+    return self.cdmean_list[i] + self.slope_list[i]*delta, self.side_list[i] + self.slope_side_list[i]*delta, \
+           self.lift_list[i] + self.slope_lift_list[i]*delta
+
+
+  def evaluate_vector_array(self, knudsen):
+
+    # Same as evaluate_vector() for an array of Knudsen number
+
+    knudsen_clip = np.clip(np.asarray(knudsen, dtype=np.float64), self.knudsen_min, self.knudsen_max)
+    index = np.searchsorted(self.knudsen_aer, knudsen_clip, side='right') - 1
+    index = np.clip(index, 0, self.num_interval-1)
+    delta = knudsen_clip - self.knudsen_aer[index]
+
+    return self.cdmean_aer[index] + self.slope_aer[index]*delta, self.side_aer[index] + self.slope_side_aer[index]*delta, \
+           self.lift_aer[index] + self.slope_lift_aer[index]*delta
+
+
+class aerodynamic_table_aoa:
+  #
+  # Bilinear interpolation of the force/moment coefficients and their standard deviations with respect to (AoA, Knudsen number)
+  # --Blocks of AoA are resampled on the union of their Knudsen breakpoints (exact for the piecewise linear blocks),
+  #   so that the table is a regular grid (AoA, Kn, coefficient) with the slopes in Kn built once here
+  # --Values are clamped to the end values outside of the table in both directions
+  # --Wind axes: drag D (opposite to the velocity), side force S (= CFy), lift L, by the rotation of AoA from the body axes
+  #     CD = CFx cos(AoA) + CFz sin(AoA),  CL = CFz cos(AoA) - CFx sin(AoA)
+  # --get_table(): lookup table in Kn (aerodynamic_table) at a constant AoA, used by the solver at every stage
+  #
+
+  def __init__(self, knudsen_aerodynamic, angle_aerodynamic, coefficient_aerodynamic):
+
+    # knudsen_aerodynamic, angle_aerodynamic: (M) rows of all blocks, coefficient_aerodynamic: (M, 12) columns of LIST_COEFFICIENT
+    knudsen_aer     = np.asarray(knudsen_aerodynamic, dtype=np.float64)
+    angle_row       = np.asarray(angle_aerodynamic, dtype=np.float64)
+    coefficient_row = np.asarray(coefficient_aerodynamic, dtype=np.float64)
+
+    self.angle_aer   = np.unique(angle_row)
+    self.knudsen_aer = np.unique(knudsen_aer)
+    self.number_angle = len(self.angle_aer)
+    self.num_interval = len(self.knudsen_aer) - 1
+    self.knudsen_min  = self.knudsen_aer[0]
+    self.knudsen_max  = self.knudsen_aer[-1]
+
+    # (AoA, Kn, coefficient) grid
+    value_aer = np.empty( (self.number_angle, len(self.knudsen_aer), coefficient_row.shape[1]) )
+    for n in range(0, self.number_angle):
+      flag_block  = ( angle_row == self.angle_aer[n] )
+      knudsen_tmp = knudsen_aer[flag_block]
+      index_sort  = np.argsort(knudsen_tmp, kind='stable')
+      for m in range(0, coefficient_row.shape[1]):
+        value_aer[n,:,m] = np.interp(self.knudsen_aer, knudsen_tmp[index_sort], coefficient_row[flag_block,m][index_sort])
+    self.value_aer = value_aer
+    self.slope_aer = np.diff(value_aer, axis=1)/np.diff(self.knudsen_aer)[None,:,None]
+    # --Columns of INDEX_WIND (evaluate_wind_array)
+    self.value_wind = np.ascontiguousarray(value_aer[:,:,INDEX_WIND])
+
+    return
+
+
+  def clip_angle(self, angle):
+
+    # AoA in the range of the table
+    angle_clip = np.clip(angle, self.angle_aer[0], self.angle_aer[-1])
+    if np.any(angle_clip != angle) :
+      print('--Angle of attack is out of the aerodynamic table (', self.angle_aer[0], '-', self.angle_aer[-1], 'deg): clipped')
+
+    return angle_clip
+
+
+  def get_weight(self, angle):
+
+    # Lower index and weight of the upper block for AoA (arrays or scalars)
+    angle = np.asarray(angle, dtype=np.float64)
+    if self.number_angle == 1 :
+      return np.zeros(angle.shape, dtype=np.int64), np.zeros(angle.shape)
+
+    angle_clip = np.clip(angle, self.angle_aer[0], self.angle_aer[-1])
+    index  = np.clip( np.searchsorted(self.angle_aer, angle_clip, side='right') - 1, 0, self.number_angle-2 )
+    weight = ( angle_clip - self.angle_aer[index] )/( self.angle_aer[index+1] - self.angle_aer[index] )
+
+    return index, weight
+
+
+  def get_wind_axis(self, value, cos_angle, sin_angle):
+
+    # Drag, side force and lift coefficients and the standard deviation of drag from the columns of INDEX_WIND in the body axes
+    cfx, cfy, cfz, cfx_sdv, cfz_sdv = np.moveaxis(value, -1, 0)
+    cdmean  = cfx*cos_angle + cfz*sin_angle
+    side    = cfy
+    lift    = cfz*cos_angle - cfx*sin_angle
+    cd_sdv  = np.sqrt( (cfx_sdv*cos_angle)**2 + (cfz_sdv*sin_angle)**2 )
+
+    return cdmean, side, lift, cd_sdv
+
+
+  def get_table(self, angle, sdv_factor=0.0):
+
+    # Lookup table in Kn at an AoA, deg, with CD = mean + sdv_factor * standard deviation
+    angle_clip    = float( self.clip_angle(angle) )
+    index, weight = self.get_weight(angle_clip)
+    index  = int(index)
+    weight = float(weight)
+    index_upper = min(index+1, self.number_angle-1)
+
+    value_tmp = (1.0 - weight)*self.value_wind[index] + weight*self.value_wind[index_upper]
+    angle_rad = np.radians(angle_clip)
+    cdmean, side, lift, cd_sdv = self.get_wind_axis(value_tmp, np.cos(angle_rad), np.sin(angle_rad))
+
+    return aerodynamic_table(self.knudsen_aer, cdmean + sdv_factor*cd_sdv, side, lift)
+
+
+  def evaluate(self, knudsen, angle):
+
+    # Coefficients of LIST_COEFFICIENT at a Knudsen number and an AoA (the solver uses get_table for a constant AoA)
+    return self.evaluate_array(np.array([knudsen]), np.array([angle]))[0]
+
+
+  def evaluate_array(self, knudsen, angle):
+
+    # (N, 12) coefficients at arrays (N) of Knudsen number and AoA (e.g., members of an ensemble)
+    knudsen_clip = np.clip(np.asarray(knudsen, dtype=np.float64), self.knudsen_min, self.knudsen_max)
+    index_kn = np.searchsorted(self.knudsen_aer, knudsen_clip, side='right') - 1
+    index_kn = np.clip(index_kn, 0, self.num_interval-1)
+    delta    = ( knudsen_clip - self.knudsen_aer[index_kn] )[:,None]
+
+    index, weight = self.get_weight( np.broadcast_to(angle, knudsen_clip.shape) )
+    index_upper = np.minimum(index+1, self.number_angle-1)
+    weight = weight[:,None]
+
+    value_lower = self.value_aer[index, index_kn]       + self.slope_aer[index, index_kn]*delta
+    value_upper = self.value_aer[index_upper, index_kn] + self.slope_aer[index_upper, index_kn]*delta
+
+    return (1.0 - weight)*value_lower + weight*value_upper
+
+
+  def evaluate_wind_array(self, knudsen, angle, sdv_factor=0.0):
+
+    # Arrays of drag (mean + sdv_factor * standard deviation), side force and lift coefficients
+    # --Same as get_table(angle[n], sdv_factor[n]).evaluate_vector(knudsen[n]) for each n:
+    #   coefficients in the wind axes at the two breakpoints of Kn are interpolated
+    knudsen_clip = np.clip(np.asarray(knudsen, dtype=np.float64), self.knudsen_min, self.knudsen_max)
+    index_kn = np.searchsorted(self.knudsen_aer, knudsen_clip, side='right') - 1
+    index_kn = np.clip(index_kn, 0, self.num_interval-1)
+    delta    = knudsen_clip - self.knudsen_aer[index_kn]
+    delta_kn = self.knudsen_aer[index_kn+1] - self.knudsen_aer[index_kn]
+
+    angle_clip = np.clip(np.broadcast_to(np.asarray(angle, dtype=np.float64), knudsen_clip.shape), self.angle_aer[0], self.angle_aer[-1])
+    index, weight = self.get_weight(angle_clip)
+    index_upper = np.minimum(index+1, self.number_angle-1)
+    weight = weight[:,None]
+    angle_rad = np.radians(angle_clip)
+    cos_angle = np.cos(angle_rad)
+    sin_angle = np.sin(angle_rad)
+
+    coefficient_list = []
+    for index_tmp in [index_kn, index_kn+1]:
+      # --Blocks of AoA are not blended for the table of one block (weight: 0)
+      if self.number_angle == 1 :
+        value_tmp = self.value_wind[0, index_tmp]
+      else :
+        value_tmp = (1.0 - weight)*self.value_wind[index, index_tmp] + weight*self.value_wind[index_upper, index_tmp]
+      cdmean, side, lift, cd_sdv = self.get_wind_axis(value_tmp, cos_angle, sin_angle)
+      coefficient_list.append( [ cdmean + sdv_factor*cd_sdv, side, lift ] )
+
+    return [ coefficient_list[0][m] + ( coefficient_list[1][m] - coefficient_list[0][m] )/delta_kn*delta for m in range(0, 3) ]
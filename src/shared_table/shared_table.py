@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# Tables shared by the processes of Monte-Carlo cases (kind_execution: subprocess)
+# --The driver builds the atmosphere and aerodynamic tables once and writes their arrays in .npy files
+# --The case processes find the directory by the environment variable and map the files read-only (numpy.load, mmap_mode='r'),
+#   so that the pages are shared by all processes and the parse and the spline are skipped
+# --A table is used only when its key (source file, characteristic_length, ...) is the same as that of the case
+
+import numpy as np
+import os as os
+import json as json
+
+# Environment variable of the directory of the shared tables
+ENV_SHARED_TABLE = 'TACODE_SHARED_TABLE'
+
+
+def publish_table(directory, kind, key, data_dict):
+
+  # Arrays in data_dict are written in .npy, the others (int, float, str) in .json with the key
+  os.makedirs(directory, exist_ok=True)
+
+  array_dict  = {}
+  scalar_dict = {}
+  for name in data_dict:
+    if isinstance(data_dict[name], np.ndarray) :
+      filename_tmp = kind + '_' + str(len(array_dict)) + '.npy'
+      np.save(directory + '/' + filename_tmp, np.ascontiguousarray(data_dict[name]), allow_pickle=False)
+      array_dict[name] = filename_tmp
+    else :
+      scalar_dict[name] = data_dict[name]
+
+  with open(directory + '/' + kind + '.json', 'w') as file:
+    json.dump({'key': key, 'array': array_dict, 'scalar': scalar_dict}, file, indent=2)
+
+  print('--Publishing shared table...:', directory + '/' + kind + '.json')
+
+  return
+
+
+def attach_table(kind, key):
+
+  # Dict of read-only views of the shared table (None when there is no table for this key)
+  directory = os.environ.get(ENV_SHARED_TABLE, '')
+  if directory == '' or not os.path.exists(directory + '/' + kind + '.json') :
+    return None
+
+  with open(directory + '/' + kind + '.json') as file:
+    meta_dict = json.load(file)
+  if meta_dict['key'] != key :
+    print('--Shared table of', kind, 'is not used: different parameters from the case')
+    return None
+
+  print('--Attaching shared table...:', directory + '/' + kind + '.json')
+  data_dict = dict(meta_dict['scalar'])
+  for name, filename_tmp in meta_dict['array'].items():
+    data_dict[name] = np.load(directory + '/' + filename_tmp, mmap_mode='r')
+
+  return data_dict
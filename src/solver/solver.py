@@ -8,19 +8,53 @@ import atmosphere.atmosphere as atmosphere
 import coordinate_system.coordinate_system as coordinate_system
 import force_term.force_term as force_term
 import satellite.satellite as satellite
+import trajectory.trajectory as trajectory_module
+import progress.progress as progress
+import checkpoint.checkpoint as checkpoint
+import event.event as event
+import profiler.profiler as profiler_module
 from orbital.orbital import orbital
 
 # Constants
 one_sixth = 1.0/6.0
+KEY_DENSITY_FACTOR = 'density_factor'
+KEY_SOLAR_ACTIVITY = 'solar_activity'
 fact_rk   = [0.5, 0.5, 1.0, 0.0]
 fact_up   = [1.0, 2.0, 2.0, 1.0]
 
-
-
-def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velocity_dict, trajectory_dict, atmosphere_dict, aerodynamic_dict):
+# Dormand-Prince 5(4) coefficients (Hairer, Norsett and Wanner, Solving ODE I)
+dp_c = [0.0, 1.0/5.0, 3.0/10.0, 4.0/5.0, 8.0/9.0, 1.0, 1.0]
+dp_a = [ [],
+         [1.0/5.0],
+         [3.0/40.0, 9.0/40.0],
+         [44.0/45.0, -56.0/15.0, 32.0/9.0],
+         [19372.0/6561.0, -25360.0/2187.0, 64448.0/6561.0, -212.0/729.0],
+         [9017.0/3168.0, -355.0/33.0, 46732.0/5247.0, 49.0/176.0, -5103.0/18656.0],
+         [35.0/384.0, 0.0, 500.0/1113.0, 125.0/192.0, -2187.0/6784.0, 11.0/84.0] ]
+# --5th-order weights are the last row of dp_a (FSAL), error weights are the difference between 5th and 4th orders
+dp_e = [71.0/57600.0, 0.0, -71.0/16695.0, 71.0/1920.0, -17253.0/339200.0, 22.0/525.0, -1.0/40.0]
+# --Dense output
+dp_d = [-12715105075.0/11282082432.0, 0.0, 87487479700.0/32700410799.0, -10690763975.0/1880347072.0,
+        701980252875.0/199316789632.0, -1453857185.0/822651844.0, 69997945.0/29380423.0]
+# --Step size control
+dp_safety  = 0.9
+dp_fac_min = 0.2
+dp_fac_max = 10.0
+
+# Console header of the progress lines
+header_progress = 'Time elapsed (s):, Longitude (deg.), Latitude (deg.), Altitude (km), Velocity Mag. (m/s)'
+
+
+
+def solve_equation_motion(config, iteration, time_elapsed, trajectory, atmosphere_dict, aerodynamic_dict, profiler=None, reporter=None, checkpointer=None):
   
   print( 'Start calculation of equation of motion...' )
 
+  # Timing of the phases (profile: flag_profile, the functions are used as they are when disabled)
+  if profiler is None :
+    profiler = profiler_module.stage_profiler(config)
+  convert_geodetic = profiler.wrap(profiler_module.KEY_GEODETIC, coordinate_system.convert_cartesian_geodetic)
+
   # Mass-point properties
   mass_satellite      = config['satellite']['mass']
   area_satellite      = config['satellite']['characteristic_area']
@@ -37,6 +71,8 @@ def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velo
     density_atmosphere     = atmosphere_dict['Mass_density']
     temperature_atmosphere = atmosphere_dict['Temperature_neutral']
     knudsen_atmosphere     = atmosphere_dict['Knudsen_number']
+    atmosphere_interp      = atmosphere.get_interpolator(config, atmosphere_dict)
+    evaluate_atmosphere    = profiler.wrap(profiler_module.KEY_ATMOSPHERE, atmosphere_interp.evaluate)
   else :
     print('kind_atmosphere_model in config is incorrect.')
     print('Program stopped.')
@@ -50,38 +86,93 @@ def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velo
     knudsen_aerodynamic  = aerodynamic_dict['Knudsen_number']
     cdmean_aerodynamic   = aerodynamic_dict['CD_mean']
     altitude_aerodynamic = aerodynamic_dict['Altitude']
+    aerodynamic_lookup   = satellite.get_table(config, aerodynamic_dict)
   else :
     print('kind_aerodynamic_model in config is incorrect.')
     print('Program stopped.')
     exit()
 
-  # Force setting
-  force = force_term.force_initialsettings(config)
+  # Force setting (planet constants and satellite properties are bound once)
+  force_model  = force_term.force_model(config)
+  acceleration = profiler.wrap(profiler_module.KEY_FORCE, force_model.acceleration)
+
+  # Drag coefficient, or (drag, side force, lift) with satellite: flag_lift
+  if kind_aerodynamic_model == 'fileread' :
+    if force_model.flag_lift :
+      evaluate_aerodynamic = profiler.wrap(profiler_module.KEY_AERODYNAMIC, aerodynamic_lookup.evaluate_vector)
+    else :
+      evaluate_aerodynamic = profiler.wrap(profiler_module.KEY_AERODYNAMIC, aerodynamic_lookup.evaluate)
 
   # Calculation parameter settings
   kind_time_scheme = config['time_integration']['kind_time_scheme']
   delta_time       = config['time_integration']['timestep_constant']
-
-  # Position and velocity
-  coordinate_cart = coordinate_dict['cartesian']
-  coordinate_geod = coordinate_dict['geodetic']
-  velocity_cart   = velocity_dict['cartesian']
-  velocity_pola   = velocity_dict['polar']
-
-  # Trajectory properties
-  density_traj     = trajectory_dict['density']
-  temperature_traj = trajectory_dict['temperature']
-  knudsen_traj     = trajectory_dict['knudsen']
-
-
-  print('Time elapsed (s):, Longitude (deg.), Latitude (deg.), Altitude (km), Velocity Mag. (m/s)')
+  flag_deferred    = trajectory.flag_deferred
+  radius_equat2    = config['planet']['radius']**2
+  if kind_time_scheme == 'runge_kutta' :
+    number_force_step = 4
+  else :
+    number_force_step = 1
+
+  # Progress lines and final summary (reporter: counts of the steps and force evaluations read by the caller)
+  if reporter is None :
+    reporter = progress.progress_reporter(config)
+
+  # Periodic and signal-triggered checkpoints
+  # --On a signal, the loop ends after the checkpoint, and the caller closes the outputs and exits (checkpointer.exit_signal)
+  if checkpointer is None :
+    checkpointer = checkpoint.checkpoint_manager(config)
+
+  def get_stage_property(coord):
+    # Cartesian --> Geodetic system and atmosphere/aerodynamic properties at coord
+    coord_geod   = convert_geodetic(config, coord)
+    altitude_tmp = coord_geod[2] * orbital.m2km
+    if kind_atmosphere_model == 'fileread' :
+      density, temperature, knudsen = evaluate_atmosphere(altitude_tmp)
+    else :
+      # Knudsen number is not defined for the constant atmosphere (continuum side of the aerodynamic table is used)
+      density, temperature, knudsen = density_atmosphere, temperature_atmosphere, 0.0
+    if kind_aerodynamic_model == 'fileread' :
+      cdmean = evaluate_aerodynamic(knudsen)
+    else :
+      cdmean = cdmean_aerodynamic
+    return coord_geod, density, temperature, knudsen, cdmean
+
+  # Position and velocity (state at the latest sample)
+  index_last = len(trajectory) - 1
+  coord_tmp = trajectory.get(trajectory_module.KEY_COORDINATE_CARTESIAN)[index_last].copy()
+  veloc_tmp = trajectory.get(trajectory_module.KEY_VELOCITY_CARTESIAN)[index_last].copy()
+
+  # Trajectory properties of the latest sample (those of the restart data are kept)
+  coord_geod, density, temperature, knudsen, cdmean = get_stage_property(coord_tmp)
+  if np.isnan( trajectory.get(trajectory_module.KEY_DENSITY)[index_last] ) :
+    trajectory.set_property(index_last, density, temperature, knudsen)
+
+
+  # Impact, altitude/Knudsen number crossings and maximum dynamic pressure
+  detector = event.event_detector(config, get_stage_property, force_model)
+  check_event      = profiler.wrap(profiler_module.KEY_EVENT, detector.check)
+  write_checkpoint = profiler.wrap(profiler_module.KEY_CHECKPOINT, checkpointer.write)
+
+  # Adaptive time step with embedded error estimation
+  if kind_time_scheme == 'dormand_prince' :
+    return solve_dormandprince(config, iteration, time_elapsed, trajectory, get_stage_property, force_model, reporter, checkpointer, detector, profiler)
+
+  # Functions of the step loop (timed wrappers with profile: flag_profile)
+  update_eulerexplicit = profiler.wrap(profiler_module.KEY_UPDATE, solve_eulerexplicit)
+  update_rungekutta    = profiler.wrap(profiler_module.KEY_UPDATE, solve_rungekutta)
+  convert_post         = profiler.wrap(profiler_module.KEY_CONVERSION, coordinate_system.convert_cartesian_geodetic)
+  set_angle_polar      = profiler.wrap(profiler_module.KEY_CONVERSION, coordinate_system.set_angle_polar)
+  convert_polar        = profiler.wrap(profiler_module.KEY_CONVERSION, coordinate_system.convert_carteasian_polar)
+  append_trajectory    = profiler.wrap(profiler_module.KEY_STORE, trajectory.append)
+  print_state_timed    = profiler.wrap(profiler_module.KEY_LOGGING, print_state)
+
+  reporter.print_header(header_progress)
+  checkpointer.install_signal()
+  detector.initialize(time_elapsed, np.concatenate([coord_tmp, veloc_tmp]), flag_restart=trajectory.index_start > 0)
 
   # Main routine
   while time_elapsed <= config['computational_setup']['time_elapsed_maximum'] :
 
-    coord_tmp = coordinate_cart[iteration]
-    veloc_tmp = velocity_cart[iteration]
-
     v_res = 0.0
     r_res = 0.0
 
@@ -89,27 +180,24 @@ def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velo
     # Euler explicit 
 
       # Cartesian --> Geodetic system
-      coord_geod = coordinate_system.convert_cartesian_geodetic(config, coord_tmp)
+      coord_geod = convert_geodetic(config, coord_tmp)
 
       # Recalculate atmosphere status
       altitude_tmp = coord_geod[2] * orbital.m2km
       if kind_atmosphere_model == 'fileread' :
-        density, temperature, knudsen = atmosphere.get_atmosphere_property(altitude_tmp, altitude_atmosphere, density_atmosphere, temperature_atmosphere, knudsen_atmosphere)
+        density, temperature, knudsen = evaluate_atmosphere(altitude_tmp)
 
       # Aerodynamic coefficient
       if kind_aerodynamic_model == 'fileread' :
-        cdmean = satellite.get_aerodynamic_coefficient(knudsen, knudsen_aerodynamic, cdmean_aerodynamic)
+        cdmean = evaluate_aerodynamic(knudsen)
 
       # Calculate force
-      force = force_term.force_routine(config, coord_tmp, veloc_tmp,   \
-                                       mass_satellite, area_satellite, \
-                                       cdmean, density_factor, density, force)
+      force_total = np.array( acceleration(coord_tmp.tolist(), veloc_tmp.tolist(), cdmean, density) )
       #"density factor" added by Tomoki Sakai 2023/2/3
-      force_total = force[0,:]
  
       # Update solution and Calculate residual
       coord_tmp, veloc_tmp, \
-      r_res, v_res =  solve_eulerexplicit(delta_time, mass_satellite, force_total, \
+      r_res, v_res =  update_eulerexplicit(delta_time, mass_satellite, force_total, \
                                           coord_tmp, veloc_tmp, \
                                           r_res, v_res)
 
@@ -126,16 +214,16 @@ def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velo
       # R.K. 1st - 4th stages
       for m in range(0, 4):
         # Cartesian --> Geodetic system
-        coord_geod = coordinate_system.convert_cartesian_geodetic(config, r_virtual)
+        coord_geod = convert_geodetic(config, r_virtual)
 
         # Recalculate atmosphere status
         altitude_tmp = coord_geod[2] * orbital.m2km
         if kind_atmosphere_model == 'fileread' :
-          density, temperature, knudsen = atmosphere.get_atmosphere_property(altitude_tmp, altitude_atmosphere, density_atmosphere, temperature_atmosphere, knudsen_atmosphere)
+          density, temperature, knudsen = evaluate_atmosphere(altitude_tmp)
 
         # Aerodynamic coefficient
         if kind_aerodynamic_model == 'fileread' :
-          cdmean = satellite.get_aerodynamic_coefficient(knudsen, knudsen_aerodynamic, cdmean_aerodynamic)
+          cdmean = evaluate_aerodynamic(knudsen)
 
         # External force (but "Delta V" is given here)
         # --Not yet
@@ -146,16 +234,13 @@ def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velo
         #convert_coordinate_rz(-longitude_tmp,externalforce_tmp)
 
         # Calculate force
-        force = force_term.force_routine(config, r_virtual, v_virtual, \
-                                         mass_satellite, area_satellite, \
-                                         cdmean, density_factor, density, force)
+        force_total = np.array( acceleration(r_virtual.tolist(), v_virtual.tolist(), cdmean, density) )
         #"density factor" added by Tomoki Sakai 2023/2/3
-        force_total = force[0,:]
  
         # Update solution and Calculate residual
         coord_tmp, veloc_tmp, \
         r_virtual, v_virtual, \
-        r_res, v_res = solve_rungekutta(m, delta_time, mass_satellite, \
+        r_res, v_res = update_rungekutta(m, delta_time, mass_satellite, \
                                         force_total, \
                                         coord_tmp, veloc_tmp, \
                                         r_virtual, v_virtual, \
@@ -171,36 +256,316 @@ def solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velo
     v_res = np.sqrt(v_res)
     r_res = np.sqrt(r_res)
 
+    time_elapsed = time_elapsed + delta_time
+    iteration    = iteration + 1
+    reporter.count(1, number_force_step)
+
+    # Events in this step (the step is cut at the impact time)
+    flag_impact = False
+    if detector.flag_detection :
+      state_impact = check_event(time_elapsed, np.concatenate([coord_tmp, veloc_tmp]))
+      if state_impact is not None :
+        flag_impact = True
+        time_elapsed, y_impact = state_impact
+        coord_tmp = y_impact[0:3]
+        veloc_tmp = y_impact[3:6]
+        coord_geod, density, temperature, knudsen, cdmean = get_stage_property(coord_tmp)
+
+    if flag_deferred :
+      # Update (geodetic and polar values are derived from the cartesian state at output)
+      append_trajectory(time_elapsed, coord_tmp, veloc_tmp, None, None, density, temperature, knudsen)
+
+      if checkpointer.check(iteration-1, iteration) :
+        write_checkpoint( get_checkpoint_dict(kind_time_scheme, iteration, time_elapsed, trajectory) )
+        if checkpointer.signal_received is not None :
+          break
+
+      # Geodetic altitude is positive outside the sphere of the equatorial radius, and is solved only inside it
+      coord_geodetic = None
+      flag_ground    = flag_impact
+      if np.dot(coord_tmp, coord_tmp) <= radius_equat2 :
+        coord_geodetic = convert_post(config, coord_tmp)
+        flag_ground    = coord_geodetic[2] <= 0.0 or flag_impact
+
+      if reporter.check_output() or flag_ground :
+        print_state_timed(config, time_elapsed, coord_tmp, veloc_tmp, coord_geodetic)
+
+      if flag_ground :
+        break
+      continue
+
     # Convert
-    coord_geodetic = coordinate_system.convert_cartesian_geodetic(config, coord_tmp)
-    coord_polar = coordinate_system.set_angle_polar(config, coord_tmp)
+    coord_geodetic = convert_post(config, coord_tmp)
+    coord_polar = set_angle_polar(config, coord_tmp)
     angle_beta  = coord_polar[1]
     angle_alpha = coord_polar[2]
-    veloc_polar = coordinate_system.convert_carteasian_polar(config, veloc_tmp, angle_alpha, angle_beta)
+    veloc_polar = convert_polar(config, veloc_tmp, angle_alpha, angle_beta)
 
     # Update
-    coordinate_cart.append( coord_tmp )
-    coordinate_geod.append( coord_geodetic )
-    #coordinate_pola.append( coord_polar )
-    velocity_cart.append( veloc_tmp )
-    velocity_pola.append( veloc_polar )
-
-    density_traj.append( density )
-    temperature_traj.append( temperature )
-    knudsen_traj.append( knudsen )
+    append_trajectory(time_elapsed, coord_tmp, veloc_tmp, coord_geodetic, veloc_polar, density, temperature, knudsen)
 
-    time_elapsed = time_elapsed + delta_time
-    iteration    = iteration + 1
+    if checkpointer.check(iteration-1, iteration) :
+      write_checkpoint( get_checkpoint_dict(kind_time_scheme, iteration, time_elapsed, trajectory) )
+      if checkpointer.signal_received is not None :
+        break
 
-    coord_geodetic_display = np.multiply(coord_geodetic, orbital.unit_convert_geoditic)
-    veloc_polar_mag = np.linalg.norm(veloc_polar)
-    #print("Time elapsed:", time_elapsed, 'Longitude:', coord_geodetic_display[0], 'Latitude:', coord_geodetic_display[1], 'Altitude:', coord_geodetic_display[2], 'Velocity (Mag.)',veloc_polar_mag )
-    print('{:.1f}'.format(time_elapsed)+', '+'{:.3f}'.format(coord_geodetic_display[0])+', '+'{:.3f}'.format(coord_geodetic_display[1])+', '+'{:.3f}'.format(coord_geodetic_display[2])+', '+'{:.3f}'.format(veloc_polar_mag) )
+    flag_ground = coord_geodetic[2] <= 0.0 or flag_impact
+    if reporter.check_output() or flag_ground :
+      print_state_timed(config, time_elapsed, coord_tmp, veloc_tmp, coord_geodetic)
 
-    if coord_geodetic_display[2] <= 0.0 :
+    if flag_ground :
       break
 
-  return iteration, coordinate_dict, velocity_dict, trajectory_dict
+  # Checkpoint of the final state (already written on a signal)
+  if checkpointer.signal_received is None :
+    write_checkpoint( get_checkpoint_dict(kind_time_scheme, iteration, time_elapsed, trajectory) )
+  checkpointer.restore_signal()
+  detector.close()
+
+  reporter.print_summary()
+  trajectory.print_memory()
+
+  return iteration, trajectory
+
+
+def get_checkpoint_dict(kind_time_scheme, iteration, time_elapsed, trajectory, state_scheme=None):
+
+  # Restart data: latest sample in the trajectory and internal state of the time scheme
+  index_last = len(trajectory) - 1
+  checkpoint_dict = {checkpoint.KEY_ITERATION: iteration, checkpoint.KEY_TIME: time_elapsed, checkpoint.KEY_SCHEME: kind_time_scheme,
+                     checkpoint.KEY_SAMPLE: trajectory.index_start + trajectory.get_number_sample() - 1,
+                     checkpoint.KEY_COORDINATE:  trajectory.get(trajectory_module.KEY_COORDINATE_CARTESIAN)[index_last],
+                     checkpoint.KEY_VELOCITY:    trajectory.get(trajectory_module.KEY_VELOCITY_CARTESIAN)[index_last],
+                     checkpoint.KEY_DENSITY:     trajectory.get(trajectory_module.KEY_DENSITY)[index_last],
+                     checkpoint.KEY_TEMPERATURE: trajectory.get(trajectory_module.KEY_TEMPERATURE)[index_last],
+                     checkpoint.KEY_KNUDSEN:     trajectory.get(trajectory_module.KEY_KNUDSEN)[index_last]}
+  if state_scheme is not None :
+    checkpoint_dict[checkpoint.KEY_STATE_SCHEME] = state_scheme
+
+  return checkpoint_dict
+
+
+def solve_dormandprince(config, iteration, time_elapsed, trajectory, get_stage_property, force_model, reporter, checkpointer, detector, profiler):
+  #
+  # Dormand-Prince 5(4) with adaptive time step
+  # --The step size is controlled by tolerance_relative and tolerance_absolute in config
+  # --The last stage is reused as the first stage of the next step (FSAL)
+  # --Solutions are stored every timestep_constant by dense output, so that the output keeps a uniform time axis
+  # --Events are found on each accepted step, and the impact state is stored as the last sample
+  #
+
+  config_time  = config['time_integration']
+  delta_output = config_time['timestep_constant']
+  rtol         = config_time.get('tolerance_relative', 1.e-9)
+  atol         = config_time.get('tolerance_absolute', 1.e-3)
+  delta_max    = config_time.get('timestep_maximum', 0.0)
+  time_maximum = config['computational_setup']['time_elapsed_maximum']
+  if delta_max <= 0.0 :
+    delta_max = np.inf
+
+  # Functions of the step loop (timed wrappers with profile: flag_profile)
+  # --Stages and step control of the scheme are not wrapped (Others in the profile)
+  acceleration      = profiler.wrap(profiler_module.KEY_FORCE, force_model.acceleration)
+  set_angle_polar   = profiler.wrap(profiler_module.KEY_CONVERSION, coordinate_system.set_angle_polar)
+  convert_polar     = profiler.wrap(profiler_module.KEY_CONVERSION, coordinate_system.convert_carteasian_polar)
+  append_trajectory = profiler.wrap(profiler_module.KEY_STORE, trajectory.append)
+  print_state_timed = profiler.wrap(profiler_module.KEY_LOGGING, print_state)
+  check_event       = profiler.wrap(profiler_module.KEY_EVENT, detector.check)
+  write_checkpoint  = profiler.wrap(profiler_module.KEY_CHECKPOINT, checkpointer.write)
+
+  def evaluate_rhs(y):
+    # y: [x, y, z, u, v, w], returns dy/dt
+    coord_geod, density, temperature, knudsen, cdmean = get_stage_property(y[0:3])
+    force_total = acceleration(y[0:3].tolist(), y[3:6].tolist(), cdmean, density)
+    return np.array( [ y[3], y[4], y[5], force_total[0], force_total[1], force_total[2] ] )
+
+  def store_sample(time_sample, coord_tmp, veloc_tmp, flag_impact=False):
+    # Sample at time_sample in the trajectory, returns True below the ground (or at impact)
+
+    # Convert
+    coord_geodetic, density, temperature, knudsen, cdmean = get_stage_property(coord_tmp)
+    if trajectory.flag_deferred :
+      veloc_polar = None
+    else :
+      coord_polar = set_angle_polar(config, coord_tmp)
+      angle_beta  = coord_polar[1]
+      angle_alpha = coord_polar[2]
+      veloc_polar = convert_polar(config, veloc_tmp, angle_alpha, angle_beta)
+
+    # Update
+    append_trajectory(time_sample, coord_tmp, veloc_tmp, coord_geodetic, veloc_polar, density, temperature, knudsen)
+
+    flag_ground = coord_geodetic[2] <= 0.0 or flag_impact
+    if reporter.check_output() or flag_ground :
+      print_state_timed(config, time_sample, coord_tmp, veloc_tmp, coord_geodetic)
+
+    return flag_ground
+
+  def output_dense(r_cont, time_cont, delta_cont, time_end, iteration, time_elapsed, time_output):
+    # Solutions at the output times up to time_end by the dense output of the step from time_cont
+    flag_ground = False
+    while time_output <= time_end and time_elapsed <= time_maximum :
+      theta  = (time_output - time_cont)/delta_cont
+      y_out  = r_cont[0] + theta*( r_cont[1] + (1.0-theta)*( r_cont[2] + theta*( r_cont[3] + (1.0-theta)*r_cont[4] ) ) )
+
+      time_elapsed = time_output
+      time_output  = time_output + delta_output
+      iteration    = iteration + 1
+
+      flag_ground = store_sample(time_elapsed, y_out[0:3], y_out[3:6])
+      if flag_ground :
+        break
+
+    return iteration, time_elapsed, time_output, flag_ground
+
+  reporter.print_header(header_progress)
+
+  index_last = len(trajectory) - 1
+  y_tmp = np.concatenate( [ trajectory.get(trajectory_module.KEY_COORDINATE_CARTESIAN)[index_last], trajectory.get(trajectory_module.KEY_VELOCITY_CARTESIAN)[index_last] ] )
+  k_stage = [None]*7
+  r_cont     = None
+  time_cont  = 0.0
+  delta_cont = 0.0
+  flag_ground = False
+  checkpoint_dict = trajectory.checkpoint_dict
+  if checkpoint_dict is not None and checkpoint_dict[checkpoint.KEY_SCHEME] == 'dormand_prince' and checkpoint.KEY_STATE_SCHEME in checkpoint_dict :
+    # Resume from the last accepted step of the restart data (get_state_dormandprince)
+    state_scheme  = checkpoint_dict[checkpoint.KEY_STATE_SCHEME]
+    y_tmp         = state_scheme[0:6].copy()
+    k_stage[0]    = state_scheme[6:12].copy()
+    time_tmp      = float(state_scheme[12])
+    delta_time    = float(state_scheme[13])
+    time_output   = float(state_scheme[14])
+    number_accept = int(state_scheme[15])
+    number_reject = int(state_scheme[16])
+    number_rhs    = int(state_scheme[17])
+    # --Output times left in the last step (stopped by time_elapsed_maximum)
+    if not np.isnan(state_scheme[20]) :
+      r_cont     = state_scheme[20:50].reshape(5,6).copy()
+      time_cont  = float(state_scheme[18])
+      delta_cont = float(state_scheme[19])
+      iteration, time_elapsed, time_output, flag_ground = output_dense(r_cont, time_cont, delta_cont, time_tmp, iteration, time_elapsed, time_output)
+  else :
+    k_stage[0] = evaluate_rhs(y_tmp)
+    number_rhs = 1
+    number_accept = 0
+    number_reject = 0
+    time_tmp    = time_elapsed
+    time_output = time_elapsed + delta_output
+    delta_time  = min(delta_output, delta_max)
+
+  checkpointer.install_signal()
+  detector.initialize(time_tmp, y_tmp, k_stage[0], flag_restart=trajectory.index_start > 0)
+  while time_elapsed <= time_maximum and not flag_ground :
+
+    # Stages
+    for m in range(1,7):
+      y_stage = y_tmp.copy()
+      for j in range(0,m):
+        if dp_a[m][j] != 0.0 :
+          y_stage += delta_time*dp_a[m][j]*k_stage[j]
+      if m == 6 :
+        y_new = y_stage
+      k_stage[m] = evaluate_rhs(y_stage)
+    number_rhs += 6
+
+    # Error estimation
+    y_err = np.zeros(6)
+    for j in range(0,7):
+      if dp_e[j] != 0.0 :
+        y_err += delta_time*dp_e[j]*k_stage[j]
+    y_scale  = atol + rtol*np.maximum( np.abs(y_tmp), np.abs(y_new) )
+    err_norm = np.sqrt( np.mean( (y_err/y_scale)**2 ) )
+
+    if err_norm > 1.0 :
+      # Rejected: retry with smaller step (the first stage is kept)
+      number_reject += 1
+      delta_time = delta_time*max(dp_fac_min, dp_safety*err_norm**(-0.2))
+      continue
+
+    number_accept += 1
+    time_new = time_tmp + delta_time
+
+    # Events in this step (outputs are stopped at the impact time)
+    state_impact = None
+    if detector.flag_detection :
+      state_impact = check_event(time_new, y_new, k_stage[6])
+    time_end = time_new if state_impact is None else state_impact[0]
+
+    # Dense output on the uniform time axis
+    r_cont = None
+    if time_output <= time_new :
+      r_cont = np.zeros( (5,6) )
+      r_cont[0] = y_tmp
+      r_cont[1] = y_new - y_tmp
+      r_cont[2] = delta_time*k_stage[0] - r_cont[1]
+      r_cont[3] = r_cont[1] - delta_time*k_stage[6] - r_cont[2]
+      for j in range(0,7):
+        if dp_d[j] != 0.0 :
+          r_cont[4] += delta_time*dp_d[j]*k_stage[j]
+      time_cont  = time_tmp
+      delta_cont = delta_time
+
+    iteration_previous = iteration
+    if r_cont is not None :
+      iteration, time_elapsed, time_output, flag_ground = output_dense(r_cont, time_cont, delta_cont, time_end, iteration, time_elapsed, time_output)
+
+    # Impact state as the last sample
+    if state_impact is not None and not flag_ground :
+      time_elapsed, y_impact = state_impact
+      iteration   = iteration + 1
+      flag_ground = store_sample(time_elapsed, y_impact[0:3], y_impact[3:6], flag_impact=True)
+
+    # Next step (FSAL)
+    y_tmp      = y_new
+    k_stage[0] = k_stage[6]
+    time_tmp   = time_new
+    delta_time = min( delta_max, delta_time*min(dp_fac_max, dp_safety*max(err_norm, 1.e-10)**(-0.2)) )
+
+    if checkpointer.check(iteration_previous, iteration) :
+      write_checkpoint( get_checkpoint_dict('dormand_prince', iteration, time_elapsed, trajectory,
+                                              get_state_dormandprince(y_tmp, k_stage[0], time_tmp, delta_time, time_output, number_accept, number_reject, number_rhs,
+                                                                      time_cont, delta_cont, r_cont)) )
+      if checkpointer.signal_received is not None :
+        break
+
+  # Checkpoint of the final state (already written on a signal)
+  if checkpointer.signal_received is None :
+    write_checkpoint( get_checkpoint_dict('dormand_prince', iteration, time_elapsed, trajectory,
+                                            get_state_dormandprince(y_tmp, k_stage[0], time_tmp, delta_time, time_output, number_accept, number_reject, number_rhs,
+                                                                    time_cont, delta_cont, r_cont)) )
+  checkpointer.restore_signal()
+  detector.close()
+
+  print('Dormand-Prince steps, accepted:', number_accept, ', rejected:', number_reject, ', RHS evaluations:', number_rhs)
+  reporter.count(number_accept, number_rhs)
+  reporter.print_summary()
+  trajectory.print_memory()
+
+  return iteration, trajectory
+
+
+def print_state(config, time_elapsed, coord_tmp, veloc_tmp, coord_geodetic=None):
+
+  # Console line: time, geodetic coordinate and velocity magnitude (same in cartesian and polar coordinates)
+  if coord_geodetic is None :
+    coord_geodetic = coordinate_system.convert_cartesian_geodetic(config, coord_tmp)
+  coord_geodetic_display = np.multiply(coord_geodetic, orbital.unit_convert_geoditic)
+  veloc_mag = np.linalg.norm(veloc_tmp)
+  #print("Time elapsed:", time_elapsed, 'Longitude:', coord_geodetic_display[0], 'Latitude:', coord_geodetic_display[1], 'Altitude:', coord_geodetic_display[2], 'Velocity (Mag.)',veloc_mag )
+  print('{:.1f}'.format(time_elapsed)+', '+'{:.3f}'.format(coord_geodetic_display[0])+', '+'{:.3f}'.format(coord_geodetic_display[1])+', '+'{:.3f}'.format(coord_geodetic_display[2])+', '+'{:.3f}'.format(veloc_mag) )
+
+  return
+
+
+def get_state_dormandprince(y_tmp, k_first, time_tmp, delta_time, time_output, number_accept, number_reject, number_rhs, time_cont, delta_cont, r_cont):
+
+  # Internal state of Dormand-Prince method in one float64 array (restart data)
+  # --[y(6), first stage(6), time, time step, next output time, counts(3), dense output of the last step: start time, time step, coefficients(5x6)]
+  # --Coefficients are NaN when the last step has no output time
+  if r_cont is None :
+    r_cont = np.full( (5,6), np.nan )
+  return np.concatenate( [ y_tmp, k_first, [time_tmp, delta_time, time_output, number_accept, number_reject, number_rhs, time_cont, delta_cont], r_cont.ravel() ] )
 
 
 def solve_eulerexplicit(dt, mass, force, coord_tmp, veloc_tmp, r_res, v_res):
@@ -238,4 +603,180 @@ def solve_rungekutta(m, dt, mass, force, coord_tmp, veloc_tmp, r_virtual, v_virt
   v_res = v_res + np.linalg.norm(dv)**2
   r_res = r_res + np.linalg.norm(dr)**2
  
-  return coord_tmp, veloc_tmp, r_virtual, v_virtual, r_res, v_res
\ No newline at end of file
+  return coord_tmp, veloc_tmp, r_virtual, v_virtual, r_res, v_res
+
+
+def solve_equation_motion_ensemble(config, coordinate_cart, velocity_cart, satellite_dict, atmosphere_dict, aerodynamic_dict):
+  #
+  # N trajectories are integrated in lockstep as (N,3) arrays by the same scheme as solve_equation_motion
+  # --coordinate_cart, velocity_cart: (N,3) initial state in cartesian coordinate
+  # --satellite_dict: (N) arrays of mass, characteristic_area, drag_coefficient and density_factor of each member
+  #   (and solar_activity for the multi-profile atmosphere, angle_of_attack and aerodynamic_sdv_factor for the aerodynamic table)
+  # --Each member stops when it reaches zero altitude
+  #
+
+  number_member = len(coordinate_cart)
+  print( 'Start calculation of equation of motion (ensemble)...: ', number_member, 'members' )
+
+  # Mass-point properties
+  mass_satellite = np.asarray(satellite_dict[satellite.KEY_MASS], dtype=np.float64)
+  area_satellite = np.asarray(satellite_dict[satellite.KEY_AREA], dtype=np.float64)
+  density_factor = np.asarray(satellite_dict[KEY_DENSITY_FACTOR], dtype=np.float64)
+  aero_fact      = 0.50*density_factor*area_satellite/mass_satellite
+
+  # Atmosphere model
+  kind_atmosphere_model = config['atmosphere']['kind_atmosphere_model']
+  if kind_atmosphere_model == 'constant' :
+    density_atmosphere     = config['atmosphere']['density']
+    temperature_atmosphere = config['atmosphere']['temperature']
+  elif kind_atmosphere_model == 'fileread' :
+    atmosphere_interp      = atmosphere_dict['Interpolator']
+    # --Multi-profile atmosphere: solar activity of each member
+    flag_profile_atm       = isinstance(atmosphere_interp, atmosphere.atmosphere_interpolator_profile)
+    if flag_profile_atm :
+      solar_activity = np.asarray(satellite_dict[KEY_SOLAR_ACTIVITY], dtype=np.float64)
+  else :
+    print('kind_atmosphere_model in config is incorrect.')
+    print('Program stopped.')
+    exit()
+
+  # Aerodynamic model
+  kind_aerodynamic_model = config['satellite']['kind_aerodynamic_model']
+  if kind_aerodynamic_model == 'constant' :
+    cdmean_aerodynamic   = np.asarray(satellite_dict[satellite.KEY_DRAG], dtype=np.float64)
+  elif kind_aerodynamic_model == 'fileread' :
+    # --Angle of attack and standard deviation factor of each member
+    #   (lookup table in Kn when they are the same for all members)
+    aerodynamic_lookup   = aerodynamic_dict[satellite.KEY_TABLE_AOA]
+    angle_attack         = aerodynamic_lookup.clip_angle( np.asarray(satellite_dict[satellite.KEY_AOA], dtype=np.float64) )
+    sdv_factor           = np.asarray(satellite_dict[satellite.KEY_SDV], dtype=np.float64)
+    flag_table_member    = np.any(angle_attack != angle_attack[0]) or np.any(sdv_factor != sdv_factor[0])
+    if not flag_table_member :
+      aerodynamic_lookup = aerodynamic_lookup.get_table(angle_attack[0], sdv_factor[0])
+  else :
+    print('kind_aerodynamic_model in config is incorrect.')
+    print('Program stopped.')
+    exit()
+
+  # Force setting
+  force_model = force_term.force_model(config)
+
+  # Progress lines and final summary (force evaluations are counted for all active members)
+  reporter = progress.progress_reporter(config)
+
+  # Calculation parameter settings
+  kind_time_scheme = config['time_integration']['kind_time_scheme']
+  delta_time       = config['time_integration']['timestep_constant']
+  time_maximum     = config['computational_setup']['time_elapsed_maximum']
+  if kind_time_scheme == 'explicit_euler' :
+    number_stage = 1
+  elif kind_time_scheme == 'runge_kutta' :
+    number_stage = 4
+  else :
+    print('kind_time_scheme in config is incorrect.')
+    print('Program stopped.')
+    exit()
+
+  # State of all members
+  coordinate_cart = np.array(coordinate_cart, dtype=np.float64)
+  velocity_cart   = np.array(velocity_cart, dtype=np.float64)
+  time_member     = np.zeros(number_member)
+  iteration       = np.zeros(number_member, dtype=np.int64)
+  flag_active     = np.ones(number_member, dtype=bool)
+  flag_ground     = np.zeros(number_member, dtype=bool)
+  density_member     = np.zeros(number_member)
+  temperature_member = np.zeros(number_member)
+  knudsen_member     = np.zeros(number_member)
+
+  time_elapsed = 0.0
+  while time_elapsed <= time_maximum and flag_active.any() :
+
+    index_active = np.flatnonzero(flag_active)
+    coord_tmp    = coordinate_cart[index_active]
+    veloc_tmp    = velocity_cart[index_active]
+    aero_tmp     = aero_fact[index_active]
+
+    r_virtual = coord_tmp
+    v_virtual = veloc_tmp
+    r_virprev = r_virtual
+    v_virprev = v_virtual
+    v_res = 0.0
+    r_res = 0.0
+
+    for m in range(0, number_stage):
+      # Cartesian --> Geodetic system
+      coord_geod   = coordinate_system.convert_cartesian_geodetic_array(config, r_virtual)
+      altitude_tmp = coord_geod[:,2] * orbital.m2km
+
+      # Recalculate atmosphere status
+      if kind_atmosphere_model == 'fileread' :
+        if flag_profile_atm :
+          density, temperature, knudsen = atmosphere_interp.evaluate_array(altitude_tmp, solar_activity[index_active])
+        else :
+          density, temperature, knudsen = atmosphere_interp.evaluate_array(altitude_tmp)
+      else :
+        # Knudsen number is not defined for the constant atmosphere (continuum side of the aerodynamic table is used)
+        density     = np.full(len(index_active), density_atmosphere)
+        temperature = np.full(len(index_active), temperature_atmosphere)
+        knudsen     = np.zeros(len(index_active))
+
+      # Aerodynamic coefficient
+      side = lift = None
+      if kind_aerodynamic_model == 'fileread' :
+        if not flag_table_member and not force_model.flag_lift :
+          cdmean = aerodynamic_lookup.evaluate_array(knudsen)
+        elif not flag_table_member :
+          cdmean, side, lift = aerodynamic_lookup.evaluate_vector_array(knudsen)
+        else :
+          cdmean, side, lift = aerodynamic_lookup.evaluate_wind_array(knudsen, angle_attack[index_active], sdv_factor[index_active])
+          if not force_model.flag_lift :
+            side = lift = None
+      else :
+        cdmean = cdmean_aerodynamic[index_active]
+
+      # Calculate force
+      force_total = force_model.acceleration_array(r_virtual, v_virtual, cdmean, density, aero_tmp, side, lift)
+
+      # Update solution
+      if kind_time_scheme == 'explicit_euler' :
+        coord_tmp, veloc_tmp, \
+        r_res, v_res = solve_eulerexplicit(delta_time, mass_satellite, force_total, \
+                                           coord_tmp, veloc_tmp, \
+                                           r_res, v_res)
+      else :
+        coord_tmp, veloc_tmp, \
+        r_virtual, v_virtual, \
+        r_res, v_res = solve_rungekutta(m, delta_time, mass_satellite, \
+                                        force_total, \
+                                        coord_tmp, veloc_tmp, \
+                                        r_virtual, v_virtual, \
+                                        r_virprev, v_virprev, \
+                                        r_res, v_res)
+
+    coordinate_cart[index_active] = coord_tmp
+    velocity_cart[index_active]   = veloc_tmp
+    density_member[index_active]     = density
+    temperature_member[index_active] = temperature
+    knudsen_member[index_active]     = knudsen
+
+    time_elapsed = time_elapsed + delta_time
+    time_member[index_active] = time_elapsed
+    iteration[index_active]  += 1
+    reporter.count(1, number_stage*len(index_active))
+
+    # Members reaching the ground are stopped
+    altitude_new = coordinate_system.convert_cartesian_geodetic_array(config, coord_tmp)[:,2]
+    index_ground = index_active[ altitude_new <= 0.0 ]
+    if len(index_ground) > 0 :
+      flag_active[index_ground] = False
+      flag_ground[index_ground] = True
+      print('Time elapsed (s):', '{:.1f}'.format(time_elapsed), ', Members reaching the ground:', len(index_ground), ', Remaining:', np.count_nonzero(flag_active))
+    elif reporter.check_output() :
+      print('Time elapsed (s):', '{:.1f}'.format(time_elapsed), ', Active members:', len(index_active))
+
+  reporter.print_summary('Time integration (ensemble)')
+
+  ensemble_dict = {'time': time_member, 'iteration': iteration, 'cartesian': coordinate_cart, 'velocity': velocity_cart,
+                   'density': density_member, 'temperature': temperature_member, 'knudsen': knudsen_member, 'flag_ground': flag_ground}
+
+  return ensemble_dict
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# Benchmark of hot paths in Tacode
+# --Microbenchmarks and end-to-end runs of the testcases, written to JSON with the machine information
+# --Regressions against a stored baseline: -baseline baseline.json (after the run, or with -result result.json only)
+
+from orbital.orbital import orbital
+import benchmark.benchmark as benchmark
+
+
+def main():
+
+  # 設定ファイルの読み込み
+  file_control_default = orbital.file_control_default
+  arg                  = benchmark.argument(file_control_default)
+  file_control         = arg.file
+  config               = orbital.read_config_yaml(file_control)
+
+  config_benchmark     = config.get(benchmark.KEY_BENCHMARK, None) or {}
+  threshold_regression = config_benchmark.get('threshold_regression', benchmark.threshold_regression_default)
+  if arg.threshold is not None :
+    threshold_regression = arg.threshold
+
+  # Benchmark
+  if arg.result is None :
+    result_dict = benchmark.run_benchmark(config, arg.kind)
+    filename_output = arg.output
+    if filename_output is None :
+      filename_output = config_benchmark.get('filename_output', benchmark.filename_output_default)
+    benchmark.write_result(filename_output, result_dict)
+  else :
+    result_dict = benchmark.read_result(arg.result)
+
+  # Comparison with the baseline
+  flag_regression = False
+  if arg.baseline is not None :
+    baseline_dict   = benchmark.read_result(arg.baseline)
+    flag_regression = benchmark.compare_result(result_dict, baseline_dict, threshold_regression)
+
+  return flag_regression
+
+
+if __name__ == '__main__':
+
+  print('Initializing Tacode-Benchmark')
+
+  # Calling classes
+  orbital = orbital()
+
+  # Main
+  flag_regression = main()
+
+  print('Finalizing Tacode-Benchmark')
+
+  # Exit status 1 when a regression is found
+  exit( 1 if flag_regression else 0 )
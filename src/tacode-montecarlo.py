@@ -1,5 +1,11 @@
 #!/usr/bin/env python3
 
+import sys as sys
+import profiler.profiler as profiler_module
+
+# Import time of each module (--profile-startup): the finder is set before the other imports
+startup_profiler = profiler_module.import_profiler( profiler_module.OPTION_STARTUP in sys.argv )
+
 import numpy as np
 import os as os
 import shutil as shutil
@@ -18,6 +24,9 @@ def main():
   # Initial setting
   montecarlo.initial_settings(config)
 
+  # Import time until the start of the cases
+  startup_profiler.output()
+
   # Monte-Carlo simulation
   montecarlo.montecarlo_routine(config)
 
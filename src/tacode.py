@@ -8,12 +8,19 @@
 # Date: 2024/01/10
 
 
+import sys as sys
+import profiler.profiler as profiler_module
+
+# Import time of each module (--profile-startup): the finder is set before the other imports
+startup_profiler = profiler_module.import_profiler( profiler_module.OPTION_STARTUP in sys.argv )
+
 import numpy as np
 from orbital.orbital import orbital
 import atmosphere.atmosphere as atmosphere
 import satellite.satellite as satellite
 import solver.solver as solver
-import output_gpsdata.output_gpsdata as output_gpsdata
+import checkpoint.checkpoint as checkpoint
+import trajectory_sink.trajectory_sink as trajectory_sink
 
 
 def main():
@@ -34,19 +41,44 @@ def main():
   orbital.make_directory_output(config)
 
   # Initial setting
-  iteration, time_elapsed, coordinate_dict, velocity_dict, trajectory_dict = orbital.initial_settings(config)
+  iteration, time_elapsed, trajectory = orbital.initial_settings(config)
+
+  # Orbit-averaged lifetime phase down to the handoff altitude (from the initial condition only)
+  # --time_elapsed_maximum of the time integration is counted from the handoff
+  flag_integration = True
+  if config['computational_setup']['flag_initial'] and config.get('lifetime', {}).get('flag_lifetime', False) :
+    import lifetime.lifetime as lifetime
+    iteration, time_elapsed, trajectory, flag_integration = lifetime.solve_lifetime(config, iteration, time_elapsed, trajectory, atmosphere_dict, aerodynamic_dict)
+    config['computational_setup']['time_elapsed_maximum'] += time_elapsed
+
+  # Output : Tecplot, KML, GPX and statistics are written in chunks during the integration
+  # --Writers are imported only when enabled (trajectory_sink.registry_sink)
+  # --Restart: the files of the previous run are appended from the sample of the checkpoint
+  trajectory.set_sink( trajectory_sink.get_sink_list(config, trajectory.index_start) )
+
+  # Import time until the start of the integration
+  startup_profiler.output()
+
+  # Timing of the phases of the time integration and the output writers (profile: flag_profile)
+  profiler = profiler_module.stage_profiler(config)
+  profiler.wrap_sink(trajectory)
+  profiler.start()
 
   # Main routine
-  iteration, coordinate_dict, velocity_dict, trajectory_dict = solver.solve_equation_motion(config, iteration, time_elapsed, coordinate_dict, velocity_dict, trajectory_dict, atmosphere_dict, aerodynamic_dict)
+  # --Restart data are written by the solver (every restart_process: frequency_output steps and at the end)
+  # --On SIGTERM/SIGINT the solver stops after the checkpoint, and the outputs are closed before the exit
+  checkpointer = checkpoint.checkpoint_manager(config)
+  if flag_integration :
+    iteration, trajectory = solver.solve_equation_motion(config, iteration, time_elapsed, trajectory, atmosphere_dict, aerodynamic_dict, profiler, checkpointer=checkpointer)
 
-  # Output : Geodetic data
-  output_gpsdata.output_routine(config, iteration, coordinate_dict, velocity_dict)
+  # Output : Remaining samples
+  trajectory.close()
 
-  # Output : Tecplot
-  orbital.output_tecplot(config, iteration, time_elapsed, coordinate_dict, velocity_dict, trajectory_dict)
+  # Profile table (and JSON)
+  profiler.output(config)
 
-  # Output restart
-  orbital.output_restart(config, iteration, time_elapsed, coordinate_dict['cartesian'], velocity_dict['cartesian'])
+  # Exit status 128+signal
+  checkpointer.exit_signal()
 
   return
 
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+# Trajectory storage of Tacode
+
+import numpy as np
+import coordinate_system.coordinate_system as coordinate_system
+
+# Dict key
+KEY_TIME                 = 'time'
+KEY_COORDINATE_CARTESIAN = 'coordinate_cartesian'
+KEY_VELOCITY_CARTESIAN   = 'velocity_cartesian'
+KEY_COORDINATE_GEODETIC  = 'coordinate_geodetic'
+KEY_VELOCITY_POLAR       = 'velocity_polar'
+KEY_DENSITY              = 'density'
+KEY_TEMPERATURE          = 'temperature'
+KEY_KNUDSEN              = 'knudsen'
+
+# Number of components of each field
+DICT_FIELD = {KEY_TIME: 1, KEY_COORDINATE_CARTESIAN: 3, KEY_VELOCITY_CARTESIAN: 3, KEY_COORDINATE_GEODETIC: 3, KEY_VELOCITY_POLAR: 3,
+              KEY_DENSITY: 1, KEY_TEMPERATURE: 1, KEY_KNUDSEN: 1}
+
+# Fields derived from the cartesian state (not stored with flag_deferred_conversion)
+FIELD_DERIVED = [KEY_COORDINATE_GEODETIC, KEY_VELOCITY_POLAR]
+
+capacity_default = 1024
+
+# Samples passed to the sinks at once
+number_sample_chunk_default = 10000
+
+
+class trajectory_store:
+  #
+  # Trajectory stored in contiguous float64 arrays, one array per field
+  # --The capacity is doubled when the arrays are full (amortized O(1) append)
+  # --get() returns zero-copy views of the stored samples
+  # --With flag_deferred_conversion in config, only time, cartesian state and atmosphere properties are stored,
+  #   and geodetic coordinate and polar velocity are computed for all samples at once when requested
+  # --Sinks (set_sink) receive the samples in chunks of number_sample_chunk during the integration
+  # --With flag_history: False in config, only the samples not yet passed to the sinks and the latest sample are kept,
+  #   so that the memory does not grow with the number of steps
+  #
+
+  def __init__(self, capacity=capacity_default, config=None):
+
+    self.size     = 0
+    self.capacity = max(int(capacity), 1)
+    self.config   = config
+    self.flag_deferred = config is not None and config['computational_setup'].get('flag_deferred_conversion', False)
+    self.flag_history  = config is None or config['computational_setup'].get('flag_history', True)
+    self.derived_dict  = {}
+    # Sinks, global index of the first stored sample, and number of stored samples already passed to the sinks
+    self.sink_list     = []
+    self.index_offset  = 0
+    self.index_flushed = 0
+    # Global index of the first sample of this run (sample of the checkpoint on restart)
+    self.index_start   = 0
+    self.number_sample_chunk = number_sample_chunk_default
+    if config is not None :
+      self.number_sample_chunk = int( config['post_process'].get('number_sample_chunk', number_sample_chunk_default) )
+    # Restart data (internal state of the time scheme) when started from a checkpoint
+    self.checkpoint_dict = None
+    self.array_dict = {}
+    for key in DICT_FIELD:
+      if self.flag_deferred and key in FIELD_DERIVED :
+        continue
+      self.array_dict[key] = np.full( self.get_shape(key, self.capacity), np.nan )
+
+    return
+
+
+  def __len__(self):
+    return self.size
+
+
+  def get_shape(self, key, capacity):
+
+    if DICT_FIELD[key] == 1 :
+      return (capacity,)
+    else :
+      return (capacity, DICT_FIELD[key])
+
+
+  def reserve(self, capacity):
+
+    # Reallocate the arrays when the capacity is not enough
+    if capacity <= self.capacity :
+      return
+    for key in self.array_dict:
+      array_new = np.full( self.get_shape(key, capacity), np.nan )
+      array_new[0:self.size] = self.array_dict[key][0:self.size]
+      self.array_dict[key] = array_new
+    self.capacity = capacity
+
+    return
+
+
+  def append(self, time, coordinate_cartesian, velocity_cartesian, coordinate_geodetic, velocity_polar, density, temperature, knudsen):
+
+    if self.size == self.capacity :
+      self.reserve(2*self.capacity)
+
+    n = self.size
+    array_dict = self.array_dict
+    array_dict[KEY_TIME][n]                 = time
+    array_dict[KEY_COORDINATE_CARTESIAN][n] = coordinate_cartesian
+    array_dict[KEY_VELOCITY_CARTESIAN][n]   = velocity_cartesian
+    if not self.flag_deferred :
+      array_dict[KEY_COORDINATE_GEODETIC][n]  = coordinate_geodetic
+      array_dict[KEY_VELOCITY_POLAR][n]       = velocity_polar
+    array_dict[KEY_DENSITY][n]              = density
+    array_dict[KEY_TEMPERATURE][n]          = temperature
+    array_dict[KEY_KNUDSEN][n]              = knudsen
+    self.size = n + 1
+
+    if self.size - self.index_flushed > self.number_sample_chunk :
+      self.flush()
+
+    return
+
+
+  def extend(self, time, coordinate_cartesian, velocity_cartesian, coordinate_geodetic, velocity_polar, density, temperature, knudsen):
+
+    # Append N samples at once: time (N), vectors (N,3), properties (N) or scalar
+    number_sample = len(time)
+    if self.size + number_sample > self.capacity :
+      self.reserve( max(2*self.capacity, self.size + number_sample) )
+
+    n0 = self.size
+    n1 = self.size + number_sample
+    array_dict = self.array_dict
+    array_dict[KEY_TIME][n0:n1]                 = time
+    array_dict[KEY_COORDINATE_CARTESIAN][n0:n1] = coordinate_cartesian
+    array_dict[KEY_VELOCITY_CARTESIAN][n0:n1]   = velocity_cartesian
+    if not self.flag_deferred :
+      array_dict[KEY_COORDINATE_GEODETIC][n0:n1]  = coordinate_geodetic
+      array_dict[KEY_VELOCITY_POLAR][n0:n1]       = velocity_polar
+    array_dict[KEY_DENSITY][n0:n1]              = density
+    array_dict[KEY_TEMPERATURE][n0:n1]          = temperature
+    array_dict[KEY_KNUDSEN][n0:n1]              = knudsen
+    self.size = n1
+
+    if self.size - self.index_flushed > self.number_sample_chunk :
+      self.flush()
+
+    return
+
+
+  def set_property(self, n, density, temperature, knudsen):
+
+    # Atmosphere properties of the n-th sample (e.g., the initial state)
+    self.array_dict[KEY_DENSITY][n]     = density
+    self.array_dict[KEY_TEMPERATURE][n] = temperature
+    self.array_dict[KEY_KNUDSEN][n]     = knudsen
+
+    return
+
+
+  def get(self, key):
+
+    # Zero-copy view of the stored samples
+    if self.flag_deferred and key in FIELD_DERIVED :
+      return self.get_derived(key)
+    return self.array_dict[key][0:self.size]
+
+
+  def get_derived(self, key):
+
+    # Geodetic coordinate and polar velocity of all samples (computed again only when samples are added)
+    if self.derived_dict.get('size') != self.size :
+      self.derived_dict = {'size': self.size}
+      self.derived_dict[KEY_COORDINATE_GEODETIC], self.derived_dict[KEY_VELOCITY_POLAR] = self.convert_derived(0, self.size)
+
+    return self.derived_dict[key]
+
+
+  def convert_derived(self, n0, n1):
+
+    # Geodetic coordinate and polar velocity of the samples n0 to n1-1
+    coordinate_cartesian = self.array_dict[KEY_COORDINATE_CARTESIAN][n0:n1]
+    velocity_cartesian   = self.array_dict[KEY_VELOCITY_CARTESIAN][n0:n1]
+    polar_coord = coordinate_system.set_angle_polar_array(self.config, coordinate_cartesian)
+    coordinate_geodetic = coordinate_system.convert_cartesian_geodetic_array(self.config, coordinate_cartesian)
+    velocity_polar      = coordinate_system.convert_carteasian_polar_array(self.config, velocity_cartesian, polar_coord[:,2], polar_coord[:,1])
+
+    return coordinate_geodetic, velocity_polar
+
+
+  def get_dict(self, n0=0, n1=None):
+
+    # Views in the form of coordinate_dict, velocity_dict and trajectory_dict used by the output routines (samples n0 to n1-1)
+    if n1 is None :
+      n1 = self.size
+    if self.flag_deferred :
+      coordinate_geodetic, velocity_polar = self.convert_derived(n0, n1)
+    else :
+      coordinate_geodetic = self.array_dict[KEY_COORDINATE_GEODETIC][n0:n1]
+      velocity_polar      = self.array_dict[KEY_VELOCITY_POLAR][n0:n1]
+    array_dict = self.array_dict
+    coordinate_dict = {'geodetic': coordinate_geodetic, 'cartesian': array_dict[KEY_COORDINATE_CARTESIAN][n0:n1]}
+    velocity_dict   = {'cartesian': array_dict[KEY_VELOCITY_CARTESIAN][n0:n1], 'polar': velocity_polar}
+    trajectory_dict = {'time': array_dict[KEY_TIME][n0:n1], 'density': array_dict[KEY_DENSITY][n0:n1],
+                       'temperature': array_dict[KEY_TEMPERATURE][n0:n1], 'knudsen': array_dict[KEY_KNUDSEN][n0:n1]}
+
+    return coordinate_dict, velocity_dict, trajectory_dict
+
+
+  def set_sink(self, sink_list):
+
+    # Sinks receiving the samples (those of the stored samples not yet flushed included)
+    self.sink_list = list(sink_list)
+
+    return
+
+
+  def flush(self, flag_final=False):
+
+    # Samples not yet flushed are passed to the sinks, except the latest one (the state of the next step)
+    # --flag_final: the latest sample is also passed (end of the run)
+    # --Sinks receive the global index of the samples (from 0 at the initial condition) for their decimation
+    n0 = self.index_flushed
+    n1 = self.size if flag_final else self.size - 1
+    if n1 > n0 and len(self.sink_list) > 0 :
+      index_global = np.arange(self.index_start+self.index_offset+n0, self.index_start+self.index_offset+n1)
+      coordinate_dict, velocity_dict, trajectory_dict = self.get_dict(n0, n1)
+      for sink in self.sink_list:
+        sink.write(index_global, coordinate_dict, velocity_dict, trajectory_dict)
+    self.index_flushed = max(n0, n1)
+
+    # Flushed samples are dropped without history (the latest sample is moved to the top and kept as the final state)
+    number_drop = min(self.index_flushed, self.size-1)
+    if not self.flag_history and number_drop > 0 :
+      for key in self.array_dict:
+        self.array_dict[key][0:self.size-number_drop] = self.array_dict[key][number_drop:self.size]
+      self.index_offset  = self.index_offset + number_drop
+      self.size          = self.size - number_drop
+      self.index_flushed = self.index_flushed - number_drop
+      self.derived_dict  = {}
+
+    return
+
+
+  def close(self):
+
+    # Remaining samples (the latest one included) are passed to the sinks, and the sinks are closed
+    self.flush(flag_final=True)
+    for sink in self.sink_list:
+      sink.close()
+    self.sink_list = []
+
+    return
+
+
+  def get_number_sample(self):
+
+    # Number of samples in this run (those dropped without history included)
+    return self.index_offset + self.size
+
+
+  def get_memory(self):
+
+    # Allocated memory (byte)
+    memory = 0
+    for key in self.array_dict:
+      memory = memory + self.array_dict[key].nbytes
+
+    return memory
+
+
+  def print_memory(self):
+
+    print('Trajectory storage: samples:', self.get_number_sample(), ', stored:', self.size, ', capacity:', self.capacity, ', memory (MB):', '{:.3f}'.format(self.get_memory()/1.e6))
+
+    return
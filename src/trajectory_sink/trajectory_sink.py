@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+
+# Sinks of the trajectory: output files written in chunks during the integration
+# --Each sink has write(index_global, coordinate_dict, velocity_dict, trajectory_dict) for a chunk of samples and close()
+# --index_global: index of the samples from the initial condition (used for the decimation by frequency_output)
+# --index_start: global index of the first sample of this run (sample of the checkpoint on restart)
+#   Restart: the rows of the samples before index_start are kept in the files of the previous run, and the rows are appended
+#   (KML and statistics: written to new files with the suffix of index_start)
+
+import numpy as np
+import os as os
+import zipfile as zipfile
+import importlib as importlib
+from orbital.orbital import orbital
+
+newline_code = '\n'
+blank_code   = ' '
+
+# Width of the number of points in the Tecplot zone header (written at close)
+width_number_point = 20
+
+# Registry of the output writers: name --> [module, class]
+# --The module of a writer is imported only when it is enabled in post_process (get_sink_name_list)
+registry_sink = {'tecplot':    ['trajectory_sink.trajectory_sink', 'tecplot_sink'],
+                 'binary':     ['trajectory_sink.trajectory_sink', 'binary_sink'],
+                 'kml':        ['output_gpsdata.output_gpsdata',   'kml_sink'],
+                 'gpx':        ['output_gpsdata.output_gpsdata',   'gpx_sink'],
+                 'statistics': ['trajectory_sink.trajectory_sink', 'statistics_sink']}
+
+
+def register_sink(name, module_name, class_name):
+
+  # Writer class with __init__(config, index_start), write(index_global, coordinate_dict, velocity_dict, trajectory_dict) and close()
+  registry_sink[name] = [module_name, class_name]
+
+  return
+
+
+def load_sink(name):
+
+  # Writer class (its module is imported here)
+  module_name, class_name = registry_sink[name]
+
+  return getattr( importlib.import_module(module_name), class_name )
+
+
+def get_sink_name_list(config):
+
+  # Names of the output writers enabled in post_process
+  config_post = config['post_process']
+  name_list = []
+
+  if config_post['tecplot']['flag_output'] :
+    format_output = config_post['tecplot'].get('format_output', 'ascii')
+    if format_output == 'ascii' :
+      name_list.append('tecplot')
+    elif format_output == 'binary' :
+      name_list.append('binary')
+    else :
+      print('format_output of tecplot in config is incorrect.')
+      print('Program stopped.')
+      exit()
+
+  if config_post['kml']['flag_output'] :
+    name_list.append('kml')
+
+  if config_post['flag_output_gpx'] :
+    name_list.append('gpx')
+
+  if config_post.get('statistics', {}).get('flag_output', False) :
+    name_list.append('statistics')
+
+  return name_list
+
+
+def get_sink_list(config, index_start=0):
+
+  # Sinks of the output files enabled in post_process
+  sink_list = []
+  for name in get_sink_name_list(config):
+    sink_list.append( load_sink(name)(config, index_start) )
+
+  return sink_list
+
+
+def get_filename_restart(config, filename, index_start):
+
+  # File name with the suffix of the first sample on restart (file name as it is from the initial condition)
+  if index_start <= 0 :
+    return filename
+  file_name, file_ext = os.path.splitext(filename)
+
+  return file_name + '_' + str(index_start).zfill( config['restart_process']['digid_step'] ) + file_ext
+
+
+def truncate_restart(filename, number_header, number_row=None, check_row=None):
+
+  # Output file of the run before a restart: the header and the rows up to number_row are kept, and the rest is removed
+  # --check_row(line): False for the first line not kept (footer, or rows after the restart)
+  # --Lines cut by a crash (without newline) are removed
+  # --Returns the number of rows kept, or None without the file or its header (written from the restart)
+  if not os.path.exists(filename) :
+    print('--Output file before the restart is not found:', filename)
+    return None
+
+  offset     = 0
+  number_tmp = -number_header
+  with open(filename, 'r+b') as file:
+    for line in file:
+      if not line.endswith(b'\n') :
+        break
+      if number_tmp >= 0 and ( number_tmp == number_row or ( check_row is not None and not check_row(line) ) ) :
+        break
+      offset     += len(line)
+      number_tmp += 1
+    if number_tmp < 0 :
+      print('--Header is incomplete in the output file before the restart:', filename)
+      return None
+    file.truncate(offset)
+
+  if number_row is not None and number_tmp < number_row :
+    print('--Rows before the restart are missing:', number_row - number_tmp, ', file:', filename)
+
+  return number_tmp
+
+
+def get_tecplot_variable(index_global, coordinate_dict, velocity_dict, trajectory_dict, frequency_output):
+
+  # (N,14) array of the output points in a chunk (every frequency_output sample)
+  index_output = np.flatnonzero( index_global % frequency_output == 0 )
+
+  coordinate_cart = coordinate_dict['cartesian'][index_output]
+  coordinate_geod = coordinate_dict['geodetic'][index_output]
+  velocity_pola   = velocity_dict['polar'][index_output]
+
+  variable_array = np.column_stack( [ trajectory_dict['time'][index_output], coordinate_cart*orbital.m2km, coordinate_geod*orbital.unit_convert_geoditic,
+                                      velocity_pola, np.linalg.norm(velocity_pola, axis=1),
+                                      trajectory_dict['density'][index_output], trajectory_dict['temperature'][index_output], trajectory_dict['knudsen'][index_output] ] )
+
+  return variable_array
+
+
+class tecplot_sink:
+  #
+  # Tecplot ASCII file (point format, 17 significant digits)
+  # --The number of points in the zone header is written at close
+  #
+
+  def __init__(self, config, index_start=0):
+
+    config_tecplot = config['post_process']['tecplot']
+    self.filename         = config['post_process']['directory_output'] + '/' + config_tecplot['filename_output']
+    self.frequency_output = config_tecplot['frequency_output']
+    self.variable_list    = orbital.variable_tecplot
+    self.format_row       = blank_code.join( ['%.16e']*len(self.variable_list) ) + newline_code
+    self.number_point     = 0
+
+    # Restart: points before index_start are kept (header: 3 lines)
+    number_row = None
+    if index_start > 0 :
+      number_row = truncate_restart(self.filename, 3, -( -index_start//self.frequency_output ))
+    if number_row is not None :
+      print('Appending Tecplot file... ', self.filename)
+      with open(self.filename, 'rb') as file:
+        self.position_number = len( file.readline() ) + len( file.readline() ) + len('zone t=time i= ')
+      self.file = open(self.filename, 'r+')
+      self.file.seek(0, os.SEEK_END)
+      self.number_point = number_row
+      return
+
+    print('Writing Tecplot file... ', self.filename)
+    self.file = open(self.filename, 'w')
+    self.file.write('# Tecplot data: Tacode' + newline_code)
+    self.file.write('Variables = ' + ','.join(self.variable_list) + newline_code)
+    self.file.write('zone t=time i= ')
+    self.position_number = self.file.tell()
+    self.file.write(blank_code*width_number_point + ' f=point' + newline_code)
+    self.file.flush()
+
+    return
+
+
+  def write(self, index_global, coordinate_dict, velocity_dict, trajectory_dict):
+
+    variable_array = get_tecplot_variable(index_global, coordinate_dict, velocity_dict, trajectory_dict, self.frequency_output)
+    self.file.write( (self.format_row*len(variable_array)) % tuple( variable_array.ravel().tolist() ) )
+    self.file.flush()
+    self.number_point += len(variable_array)
+
+    return
+
+
+  def close(self):
+
+    self.file.seek(self.position_number)
+    self.file.write( str(self.number_point).ljust(width_number_point) )
+    self.file.close()
+
+    return
+
+
+class binary_sink:
+  #
+  # Raw float64 columns named by the Tecplot variables in .npz (numpy.load)
+  # --Rows are appended to filename.part during the integration (numpy.fromfile(...).reshape(-1,14) after a stop),
+  #   and are written as the columns of .npz at close
+  #
+
+  def __init__(self, config, index_start=0):
+
+    config_tecplot = config['post_process']['tecplot']
+    self.filename         = os.path.splitext( config['post_process']['directory_output'] + '/' + config_tecplot['filename_output'] )[0] + '.npz'
+    self.filename_part    = self.filename + '.part'
+    self.frequency_output = config_tecplot['frequency_output']
+    self.variable_list    = orbital.variable_tecplot
+
+    # Restart: rows before index_start are copied from the .part (after a crash) or .npz of the previous run
+    number_variable = len(self.variable_list)
+    variable_array  = None
+    if index_start > 0 :
+      number_row = -( -index_start//self.frequency_output )
+      if os.path.exists(self.filename_part) :
+        variable_array = np.fromfile(self.filename_part, dtype=np.float64)
+        variable_array = variable_array[0:len(variable_array)//number_variable*number_variable].reshape(-1, number_variable)[0:number_row]
+      elif os.path.exists(self.filename) :
+        with np.load(self.filename, allow_pickle=False) as data:
+          variable_array = np.column_stack( [ data[name][0:number_row] for name in self.variable_list ] )
+      else :
+        print('--Output file before the restart is not found:', self.filename)
+      if variable_array is not None and len(variable_array) < number_row :
+        print('--Rows before the restart are missing:', number_row - len(variable_array), ', file:', self.filename)
+
+    print('Writing Tecplot data (binary)... ', self.filename)
+    self.file = open(self.filename_part, 'wb')
+    if variable_array is not None :
+      variable_array.tofile(self.file)
+      self.file.flush()
+
+    return
+
+
+  def write(self, index_global, coordinate_dict, velocity_dict, trajectory_dict):
+
+    variable_array = get_tecplot_variable(index_global, coordinate_dict, velocity_dict, trajectory_dict, self.frequency_output)
+    variable_array.tofile(self.file)
+    self.file.flush()
+
+    return
+
+
+  def close(self):
+
+    self.file.close()
+
+    # Columns are copied from the memory-mapped rows (same layout as numpy.savez)
+    number_variable = len(self.variable_list)
+    if os.path.getsize(self.filename_part) > 0 :
+      variable_array = np.memmap(self.filename_part, dtype=np.float64, mode='r').reshape(-1, number_variable)
+    else :
+      variable_array = np.zeros( (0, number_variable) )
+    with zipfile.ZipFile(self.filename, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as file_zip:
+      for m in range(0, number_variable):
+        with file_zip.open(self.variable_list[m] + '.npy', 'w', force_zip64=True) as file:
+          np.lib.format.write_array(file, variable_array[:,m], allow_pickle=False)
+    del variable_array
+    os.remove(self.filename_part)
+
+    return
+
+
+class statistics_sink:
+  #
+  # Running extrema of the trajectory: altitude, velocity, density and dynamic pressure (all samples)
+  #
+
+  def __init__(self, config, index_start=0):
+
+    # Restart: extrema of the samples from index_start (new file with the suffix of index_start)
+    config_statistics = config['post_process']['statistics']
+    self.filename = get_filename_restart( config, config['post_process']['directory_output'] + '/' + config_statistics['filename_output'], index_start )
+
+    self.number_sample = 0
+    self.time_range    = [np.nan, np.nan]
+    # [value, time, altitude (km)] of each extremum
+    self.extremum_dict = {'Altitude min. (km)': [np.inf, np.nan, np.nan], 'Altitude max. (km)': [-np.inf, np.nan, np.nan],
+                          'Velocity max. (m/s)': [-np.inf, np.nan, np.nan], 'Density max. (kg/m3)': [-np.inf, np.nan, np.nan],
+                          'Dynamic pressure max. (Pa)': [-np.inf, np.nan, np.nan]}
+
+    return
+
+
+  def write(self, index_global, coordinate_dict, velocity_dict, trajectory_dict):
+
+    time_tmp     = trajectory_dict['time']
+    altitude_tmp = coordinate_dict['geodetic'][:,2]*orbital.m2km
+    velocity_tmp = np.linalg.norm(velocity_dict['polar'], axis=1)
+    density_tmp  = trajectory_dict['density']
+    if len(time_tmp) == 0 :
+      return
+
+    if self.number_sample == 0 :
+      self.time_range[0] = time_tmp[0]
+    self.time_range[1] = time_tmp[-1]
+    self.number_sample += len(time_tmp)
+
+    value_dict = {'Altitude min. (km)': altitude_tmp, 'Altitude max. (km)': altitude_tmp, 'Velocity max. (m/s)': velocity_tmp,
+                  'Density max. (kg/m3)': density_tmp, 'Dynamic pressure max. (Pa)': 0.5*density_tmp*velocity_tmp**2}
+    for key in value_dict:
+      value_tmp = value_dict[key]
+      if np.isnan(value_tmp).all() :
+        continue
+      if key == 'Altitude min. (km)' :
+        n = np.nanargmin(value_tmp)
+        flag_update = value_tmp[n] < self.extremum_dict[key][0]
+      else :
+        n = np.nanargmax(value_tmp)
+        flag_update = value_tmp[n] > self.extremum_dict[key][0]
+      if flag_update :
+        self.extremum_dict[key] = [value_tmp[n], time_tmp[n], altitude_tmp[n]]
+
+    return
+
+
+  def close(self):
+
+    print('Writing statistics file... ', self.filename)
+    file = open(self.filename, 'w')
+    file.write('# Statistics of trajectory: Tacode' + newline_code)
+    file.write('Samples: ' + str(self.number_sample) + newline_code)
+    file.write('Time (s): ' + '{:.6e}'.format(self.time_range[0]) + ' - ' + '{:.6e}'.format(self.time_range[1]) + newline_code)
+    for key in self.extremum_dict:
+      value, time_tmp, altitude_tmp = self.extremum_dict[key]
+      file.write(key + ': ' + '{:.6e}'.format(value) + ', at time (s): ' + '{:.6e}'.format(time_tmp) + ', altitude (km): ' + '{:.6e}'.format(altitude_tmp) + newline_code)
+    file.close()
+
+    return